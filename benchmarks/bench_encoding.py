@@ -0,0 +1,67 @@
+"""Benchmark encoding detection on large Japanese-header logger files.
+
+Compares the previous decode-retry approach (decoding every line with each
+candidate until one succeeds) with ``file_loader.detect_encoding``.
+
+Usage:
+    python benchmarks/bench_encoding.py [n_rows]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.file_loader import detect_encoding
+
+ENCODINGS = ['utf-8', 'cp932', 'shift_jis']
+
+
+def make_graphtec_csv(n_rows, n_channels=10, late_japanese=False):
+    lines = ["Model,GL840", "測定間隔,0.1s", "測定値",
+             "番号,日付 時間,ms," + ",".join(f"CH{i + 1}" for i in range(n_channels)),
+             "NO.,Time,ms," + ",".join("degC" for _ in range(n_channels))]
+    if late_japanese:
+        # ヘッダーはASCIIのみで、日本語は末尾のみ
+        lines = [line.encode('ascii', 'ignore').decode() for line in lines]
+    row = ",".join(f"{20 + c * 0.1:+.2f}" for c in range(n_channels))
+    lines += [f"{i + 1},2024/01/01 00:00:00,0,{row}" for i in range(n_rows)]
+    if late_japanese:
+        lines.append("コメント,終了")
+    return ("\r\n".join(lines) + "\r\n").encode('cp932')
+
+
+def decode_retry(raw):
+    for encoding in ENCODINGS:
+        try:
+            lines = [line.decode(encoding) for line in raw.splitlines(keepends=True)]
+            return encoding, lines
+        except UnicodeDecodeError:
+            continue
+    return None, None
+
+
+def measure(func, raw, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(raw)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for late_japanese in [False, True]:
+        raw = make_graphtec_csv(n_rows, late_japanese=late_japanese)
+        old_time, (old_encoding, _) = measure(decode_retry, raw)
+        new_time, new_encoding = measure(lambda r: detect_encoding(r, ENCODINGS), raw)
+        label = "日本語は末尾のみ" if late_japanese else "日本語ヘッダー"
+        print(f"{label}: {len(raw) / 1e6:.1f} MB")
+        print(f"  decode-retry    : {old_time:.3f} s ({old_encoding})")
+        print(f"  detect_encoding : {new_time:.3f} s ({new_encoding})")
+        print(f"  speedup         : {old_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
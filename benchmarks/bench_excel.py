@@ -0,0 +1,66 @@
+"""Benchmark Excel ingestion of a large logger workbook.
+
+Compares ``pd.read_excel`` with ``excel_loader.load_excel_streaming`` (read-only
+row iteration with batched conversion) on the whole sheet and on a cell range.
+Workbooks written by openpyxl in write-only mode have no ``<dimension>``
+element, so opening them read-only includes one extra scan of the sheet; files
+saved by Excel or the loggers' software do not pay this cost.
+
+Usage:
+    python benchmarks/bench_excel.py [n_rows]
+"""
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.excel_loader import load_excel_streaming
+
+
+def make_workbook(n_rows, n_channels=8):
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('データ')
+    worksheet.append(['経過時間(sec)'] + [f"CH{i + 1}" for i in range(n_channels)] + ['備考'])
+    for i in range(n_rows):
+        worksheet.append([i * 0.01] + [20 + c * 0.1 + (i % 100) * 0.001 for c in range(n_channels)] + ['OK'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def measure(func):
+    start = time.perf_counter()
+    df = func()
+    elapsed = time.perf_counter() - start
+    # tracemalloc は処理を遅くするため、ピークメモリは別に測定する
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6, df
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    raw = make_workbook(n_rows)
+    print(f"{n_rows} rows, {len(raw) / 1e6:.1f} MB")
+
+    cases = [
+        ("read_excel", lambda: pd.read_excel(io.BytesIO(raw))),
+        ("load_excel_streaming", lambda: load_excel_streaming(io.BytesIO(raw))),
+        ("read_excel (A1:C1000)", lambda: pd.read_excel(io.BytesIO(raw), usecols="A:C", nrows=999)),
+        ("load_excel_streaming (A1:C1000)", lambda: load_excel_streaming(io.BytesIO(raw), cell_range="A1:C1000")),
+    ]
+    for label, func in cases:
+        elapsed, peak, df = measure(func)
+        print(f"  {label:32s}: {elapsed:.2f} s, peak {peak:.0f} MB, {df.shape}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark multi-threaded FFT on wide GRAPHTEC-like recordings.
+
+Times ``compute_fft_segments``, ``compute_stft`` and ``compute_welch_psd`` with
+1, 2, 4, ... worker threads up to the number of CPU cores and prints the
+speedup over a single worker.
+
+Usage:
+    python benchmarks/bench_fft_workers.py [n_rows] [n_channels]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.data_processing import compute_fft_segments, compute_stft, compute_welch_psd
+
+
+def make_recording(n_rows, n_channels):
+    rng = np.random.default_rng(0)
+    data = {f"CH{i + 1}": rng.standard_normal(n_rows) for i in range(n_channels)}
+    data['経過時間(sec)'] = np.arange(n_rows) * 0.001
+    return pd.DataFrame(data)
+
+
+def measure(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_channels = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    df = make_recording(n_rows, n_channels)
+    cores = os.cpu_count() or 1
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= cores:
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != cores:
+        worker_counts.append(cores)
+
+    cases = [
+        ("compute_fft_segments (1024)", lambda w: compute_fft_segments(df, 1024, workers=w)),
+        ("compute_stft (1024, 75%)", lambda w: compute_stft(df, 1024, hop=256, workers=w)),
+        ("compute_welch_psd (4096, 50%)", lambda w: compute_welch_psd(df, 4096, workers=w)),
+    ]
+    print(f"{n_rows} rows x {n_channels} channels, {cores} cores")
+    for label, func in cases:
+        baseline = measure(lambda: func(1))
+        print(label)
+        for workers in worker_counts:
+            elapsed = baseline if workers == 1 else measure(lambda: func(workers))
+            print(f"  workers={workers:3d}: {elapsed:.3f} s (x{baseline / elapsed:.2f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark line-chart construction for many-channel logger files.
+
+Compares the per-channel ``px.line`` figure with the batched traces of
+``build_line_traces`` (SVG and WebGL) for 10, 50 and 200 channels. Prints the
+figure build time, the JSON size and hints about the browser-side rendering
+cost: SVG traces become one DOM path per trace, WebGL traces are drawn on a
+shared canvas per subplot.
+
+Usage:
+    python benchmarks/bench_plot_traces.py [n_rows]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import streamlit as st
+
+from modules.plot import build_line_traces
+
+
+def make_recording(n_rows, n_channels):
+    rng = np.random.default_rng(0)
+    data = {f"CH{i + 1}": rng.standard_normal(n_rows).cumsum() for i in range(n_channels)}
+    data['経過時間(sec)'] = np.arange(n_rows) * 0.1
+    return pd.DataFrame(data)
+
+
+def measure(func, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def render_hint(fig):
+    types = {trace.type for trace in fig.data}
+    if types == {'scattergl'}:
+        return "WebGL: 1 canvas"
+    return f"SVG: {len(fig.data)} paths"
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    for n_channels in [10, 50, 200]:
+        df = make_recording(n_rows, n_channels)
+        y_cols = [col for col in df.columns if col.startswith('CH')]
+        lines = [(col, df['経過時間(sec)'], df[col]) for col in y_cols]
+
+        def batched(webgl_min_points):
+            st.session_state['webgl_min_points'] = webgl_min_points
+            return go.Figure(data=build_line_traces(lines, '経過時間(sec)'))
+
+        cases = [
+            ("px.line", lambda: px.line(df, x='経過時間(sec)', y=y_cols, color_discrete_sequence=px.colors.qualitative.Light24)),
+            ("batched SVG", lambda: batched(10 ** 12)),
+            ("batched WebGL", lambda: batched(0)),
+        ]
+        print(f"{n_rows} rows x {n_channels} channels")
+        for label, build in cases:
+            elapsed, fig = measure(build)
+            serialize, payload = measure(fig.to_json)
+            colors = {trace.line.color for trace in fig.data}
+            print(f"  {label:14s}: build {elapsed:.3f} s, to_json {serialize:.3f} s, "
+                  f"{len(payload) / 1024:.0f} KB, {len(colors)} colors, {render_hint(fig)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from modules.file_loader import detect_encoding, detect_csv_layout, parse_csv_layout
+
+# 一括読み込みでファイルを識別する列名
+BATCH_KEY_COLUMN = 'ファイル'
+
+
+def parse_logger_file(path):
+    """
+    Parse one GRAPHTEC/NR600 file for batch ingestion.
+
+    Uses the same format detection as ``load_csv_with_dynamic_start`` but never
+    asks the user for a header row, so it can run in a worker process.
+
+    Args:
+    path (str): Path of the CSV file.
+
+    Returns:
+    dict: ``df``, ``measurement_interval``, ``data_type``, ``bytes`` and ``seconds``, or ``error``.
+    """
+    start = time.perf_counter()
+    size = os.path.getsize(path)
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            encoding = detect_encoding(mapped)
+            layout = detect_csv_layout(mapped, encoding)
+            if layout is None:
+                raise ValueError("GRAPHTEC/NR600形式ではありません。")
+            df, measurement_interval = parse_csv_layout(mapped, layout, encoding)
+            data_type = layout['data_type']
+    except Exception as e:
+        return {'df': None, 'error': str(e), 'bytes': size, 'seconds': time.perf_counter() - start}
+    return {
+        'df': df,
+        'measurement_interval': measurement_interval,
+        'data_type': data_type,
+        'bytes': size,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def load_logger_batch(paths, max_workers=None):
+    """
+    Parse several logger files concurrently with a process pool.
+
+    Args:
+    paths (list): Paths of the CSV files.
+    max_workers (int): Number of worker processes. Defaults to the number of CPU cores.
+
+    Returns:
+    tuple: ``(df, file_info, throughput)`` where ``df`` concatenates all parsed files with a
+    ``ファイル`` key column, ``file_info`` holds the interval, data type, row count and error of
+    each file, and ``throughput`` reports files per second, MB per second and the number of
+    workers actually used (1 when the files are parsed serially).
+    """
+    start = time.perf_counter()
+    max_workers = max_workers or os.cpu_count() or 1
+    # 実際に使うワーカー数（ファイル数より多くは起動しない）
+    workers = max(1, min(max_workers, len(paths)))
+    if workers == 1:
+        results = [parse_logger_file(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(parse_logger_file, paths))
+    elapsed = time.perf_counter() - start
+
+    frames = []
+    file_info = []
+    for path, result in zip(paths, results):
+        name = os.path.basename(path)
+        df = result['df']
+        if df is not None:
+            df = df.copy()
+            df[BATCH_KEY_COLUMN] = name
+            frames.append(df)
+        file_info.append({
+            BATCH_KEY_COLUMN: name,
+            'data_type': result.get('data_type'),
+            'measurement_interval': result.get('measurement_interval'),
+            'rows': 0 if df is None else len(df),
+            'MB': result['bytes'] / 1e6,
+            'seconds': result['seconds'],
+            'error': result.get('error'),
+        })
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if BATCH_KEY_COLUMN in df.columns:
+        df[BATCH_KEY_COLUMN] = df[BATCH_KEY_COLUMN].astype('category')
+    total_mb = sum(result['bytes'] for result in results) / 1e6
+    throughput = {
+        'files': len(paths),
+        'seconds': elapsed,
+        'files_per_sec': len(paths) / elapsed if elapsed > 0 else float('inf'),
+        'mb_per_sec': total_mb / elapsed if elapsed > 0 else float('inf'),
+        'workers': workers,
+    }
+    return df, pd.DataFrame(file_info), throughput
@@ -0,0 +1,384 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# パーサーの出力形式が変わったらキャッシュを無効化するためのバージョン
+CACHE_FORMAT_VERSION = 1
+
+# ディスクキャッシュの既定の容量上限（バイト）
+DEFAULT_DISK_CACHE_BYTES = 2 * 1024 ** 3
+
+# メモリキャッシュの既定の容量上限（バイト）
+DEFAULT_MEMORY_CACHE_BYTES = 1024 ** 3
+
+# ハッシュ計算で一度に読むバイト数
+DIGEST_BLOCK_BYTES = 1 << 20
+
+# データの指紋に含める行数（等間隔に抜き出す）
+FINGERPRINT_SAMPLE_ROWS = 4096
+
+# 書き込み途中のまま残ったディレクトリを削除するまでの時間（秒）
+STALE_ENTRY_SECONDS = 3600
+
+
+def file_digest(source, *extra):
+    """
+    Compute a content hash of a file.
+
+    Args:
+    source (bytes, mmap.mmap or file-like): Raw file content or a seekable binary file.
+    *extra: Additional values (e.g. loader options) mixed into the hash.
+
+    Returns:
+    str: Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        digest.update(source)
+    else:
+        source.seek(0)
+        while True:
+            block = source.read(DIGEST_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+        source.seek(0)
+    for value in (CACHE_FORMAT_VERSION,) + extra:
+        digest.update(repr(value).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def frame_fingerprint(df, sample_rows=FINGERPRINT_SAMPLE_ROWS):
+    """
+    Compute a cheap fingerprint of a DataFrame for keying derived results.
+
+    Hashes the shape, column names, dtypes, the values of up to ``sample_rows``
+    evenly spaced rows and the sum of every numeric column. The column sums
+    cost one vectorized pass, so a change anywhere in the numeric data is
+    detected without hashing the full buffers.
+
+    Args:
+    df (pd.DataFrame): Input data.
+    sample_rows (int): Number of rows whose values are hashed.
+
+    Returns:
+    str: Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((df.shape, df.columns.to_list(), [str(dtype) for dtype in df.dtypes])).encode('utf-8'))
+    if len(df):
+        rows = np.unique(np.linspace(0, len(df) - 1, min(sample_rows, len(df))).astype(np.int64))
+        for i in range(df.shape[1]):
+            column = df.iloc[:, i]
+            if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biufcmM':
+                values = column.to_numpy()
+                if values.dtype.kind in 'mM':
+                    values = values.view(np.int64)
+                digest.update(np.ascontiguousarray(values[rows]).tobytes())
+                digest.update(np.asarray(np.nansum(values)).tobytes())
+            else:
+                digest.update(repr(column.iloc[rows].tolist()).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def make_temp_dir(parent):
+    """
+    Create a temporary directory under ``parent`` to write a cache entry into.
+
+    Returns:
+    str: Path of the new directory.
+    """
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = os.path.join(parent, f'.tmp-{uuid.uuid4().hex}')
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def publish_dir(tmp_dir, entry_dir):
+    """
+    Move a finished temporary directory into place as ``entry_dir``.
+
+    When another writer has already published the same entry, its result is
+    kept and ``tmp_dir`` is removed.
+
+    Returns:
+    bool: True if ``tmp_dir`` became the entry.
+    """
+    if os.path.isdir(entry_dir) and not os.path.exists(os.path.join(entry_dir, 'meta.json')):
+        # 以前に中断された書き込みの残り
+        shutil.rmtree(entry_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, entry_dir)
+        return True
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+
+
+def estimate_nbytes(value):
+    """
+    Estimate the memory held by a cached value.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class MemoryLRUCache:
+    """
+    In-process LRU cache bounded by the estimated size of its values.
+
+    The cache is shared by all sessions of the server process and is guarded by
+    a lock. Hit and miss counters are kept for monitoring.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, nbytes=None):
+        """
+        Store ``value`` under ``key``. Values larger than ``max_bytes`` are not stored.
+        """
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            self._evict()
+
+    def get_or_compute(self, key, compute, nbytes=None):
+        """
+        Return the cached value for ``key``, computing and storing it on a miss.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value, nbytes)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.total_bytes -= nbytes
+
+    def stats(self):
+        """
+        Return hit/miss counters and the current size of the cache.
+        """
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'entries': len(self._entries),
+            'total_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+class DiskFrameCache:
+    """
+    On-disk cache of parsed DataFrames.
+
+    Each entry is a directory holding one ``.npy`` file per column and a
+    ``meta.json`` with the column names, dtypes and loader metadata such as
+    ``data_type`` and ``measurement_interval``. Columns are read back with
+    ``np.load(mmap_mode='r')``, so a hit costs only the metadata read and pages
+    are loaded on demand. Entries are evicted in least-recently-used order once
+    the total size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_DISK_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """
+        Return ``(df, metadata)`` for a cached entry, or None on a miss.
+        """
+        meta_path = os.path.join(self._entry_dir(key), 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        columns = {}
+        for i, (name, dtype) in enumerate(zip(meta['columns'], meta['dtypes'])):
+            values = np.load(os.path.join(self._entry_dir(key), f'col_{i:04d}.npy'), mmap_mode='r')
+            if dtype in ('str', 'object', 'category'):
+                column = pd.Series(values, dtype=str)
+                mask_path = os.path.join(self._entry_dir(key), f'na_{i:04d}.npy')
+                if os.path.exists(mask_path):
+                    column = column.where(~np.load(mask_path))
+                if dtype == 'category':
+                    column = column.astype('category')
+                values = column
+            columns[name] = values
+        df = pd.DataFrame(columns, columns=meta['columns'], copy=False)
+
+        # LRUのためにアクセス時刻を更新
+        os.utime(meta_path)
+        return df, meta['metadata']
+
+    def put(self, key, df, metadata):
+        """
+        Store a DataFrame under ``key``.
+
+        Frames with non-string column names, duplicated column names or a
+        non-default index are not cached.
+
+        Returns:
+        bool: True if the entry was written.
+        """
+        if not all(isinstance(name, str) for name in df.columns) or df.columns.has_duplicates:
+            return False
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            return False
+
+        tmp_dir = make_temp_dir(self.cache_dir)
+        try:
+            dtypes = []
+            for i, name in enumerate(df.columns):
+                column = df[name]
+                if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biufcmM':
+                    dtypes.append(str(column.dtype))
+                    values = column.to_numpy()
+                else:
+                    # 文字列などは固定長のUnicode配列として保存（欠損値はマスクで保持）
+                    dtypes.append('category' if isinstance(column.dtype, pd.CategoricalDtype) else 'str')
+                    mask = column.isna().to_numpy()
+                    values = column.astype(object).where(~mask, '').to_numpy(dtype=str)
+                    if mask.any():
+                        np.save(os.path.join(tmp_dir, f'na_{i:04d}.npy'), mask)
+                np.save(os.path.join(tmp_dir, f'col_{i:04d}.npy'), values, allow_pickle=False)
+
+            meta = {
+                'columns': df.columns.to_list(),
+                'dtypes': dtypes,
+                'rows': len(df),
+                'metadata': metadata,
+                'created': time.time(),
+            }
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        # 同じキーは同じ内容なので、先に書き込まれたエントリがあればそれを残す
+        publish_dir(tmp_dir, self._entry_dir(key))
+
+        self.evict()
+        return True
+
+    def entries(self):
+        """
+        Return ``(key, last_access, size_bytes)`` for every entry, oldest first.
+        """
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            meta_path = os.path.join(entry_dir, 'meta.json')
+            if key.startswith('.') or not os.path.exists(meta_path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            entries.append((key, os.path.getmtime(meta_path), size))
+        entries.sort(key=lambda entry: entry[1])
+        return entries
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in ``max_bytes``.
+        """
+        self._remove_stale()
+        entries = self.entries()
+        total = sum(size for _, _, size in entries)
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+
+    def _remove_stale(self):
+        """
+        Remove temporary directories left by interrupted writes.
+
+        Only ``.tmp-*`` directories are removed, because other caches (such as
+        spectrograms and pyramids) may keep their own directories under the
+        same root.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        now = time.time()
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir() or not entry.name.startswith('.tmp-'):
+                continue
+            # 他のセッションが書き込み中のディレクトリは残す
+            if now - entry.stat().st_mtime > STALE_ENTRY_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
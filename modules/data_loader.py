@@ -1,7 +1,338 @@
+import os
+
 import streamlit as st
 import pandas as pd
 from modules.sample_data import load_simple_sample_data, load_timeseries_sample_data, load_histogram_sample_data, load_scatter_plot_sample_data, load_heatmap_sample_data
-from modules.file_loader import load_csv_with_dynamic_start
+from modules.file_loader import load_csv_with_dynamic_start, load_csv_from_path, CsvTailFollower
+from modules.excel_loader import load_excel_streaming, list_excel_sheets
+from modules.cache import DiskFrameCache, MemoryLRUCache, file_digest, frame_fingerprint
+from modules.batch_loader import load_logger_batch
+from modules.state_manager import get_cache_dir
+from modules.data_processing import compact_dtypes, compute_spectrogram_chunked
+from modules.downsampling import MinMaxPyramid
+
+# ディスクキャッシュの対象とするデータタイプ（ユーザーがヘッダーを選んだものは対象外）
+CACHEABLE_DATA_TYPES = ['GRAPHTEC', 'NR600', 'Excel']
+
+# ディスク上のスペクトログラムを計算するときに一度に読む行数
+SPECTROGRAM_CHUNK_ROWS = 1 << 18
+
+# 再実行のたびにファイルを読み直さないためのメモ（プロセス内の全セッションで共有）
+frame_memo = MemoryLRUCache()
+
+def get_disk_cache():
+    max_bytes = int(st.session_state.get('disk_cache_max_mb', 2048)) * 1024 * 1024
+    return DiskFrameCache(get_cache_dir(), max_bytes=max_bytes)
+
+def get_file_name(uploaded_file):
+    # サーバー側のファイルはパスで渡される
+    if isinstance(uploaded_file, str):
+        return os.path.basename(uploaded_file)
+    return uploaded_file.name
+
+def get_upload_key(uploaded_file):
+    """
+    Return the key ``(file_id, size, digest)`` identifying an uploaded file.
+
+    The content digest is computed once per upload and kept in session state.
+    For a server-side file the path is the file id and the size also carries the
+    modification time, so an updated file is parsed again.
+
+    Args:
+        uploaded_file (file-like or str): The file uploaded by the user, or the path of a server-side file.
+
+    Returns:
+        tuple: ``(file_id, size, digest)``.
+    """
+    kind = 'csv' if get_file_name(uploaded_file).lower().endswith('.csv') else 'xlsx'
+    if isinstance(uploaded_file, str):
+        stat = os.stat(uploaded_file)
+        file_id, size = uploaded_file, (stat.st_size, stat.st_mtime_ns)
+    else:
+        file_id = getattr(uploaded_file, 'file_id', uploaded_file.name)
+        size = getattr(uploaded_file, 'size', None)
+    previous = st.session_state.get('upload_key')
+    if previous is not None and tuple(previous[:2]) == (file_id, size):
+        return previous
+
+    if isinstance(uploaded_file, str):
+        with open(uploaded_file, 'rb') as f:
+            digest = file_digest(f, kind)
+    else:
+        digest = file_digest(uploaded_file, kind)
+    key = (file_id, size, digest)
+    st.session_state['upload_key'] = key
+    return key
+
+def is_excel_file(uploaded_file):
+    """
+    Return whether a single uploaded file or server-side path is an Excel workbook.
+    """
+    if uploaded_file is None or isinstance(uploaded_file, list):
+        return False
+    return get_file_name(uploaded_file).lower().endswith('.xlsx')
+
+def list_uploaded_sheets(uploaded_file):
+    """
+    Return the sheet names of an uploaded Excel file, opening the workbook once per upload.
+
+    Args:
+        uploaded_file (file-like or str): The uploaded workbook, or the path of a server-side file.
+
+    Returns:
+        list: Sheet names in workbook order. Empty when the workbook cannot be opened
+        (the error is shown when the data is loaded).
+    """
+    def read_sheets():
+        try:
+            return list_excel_sheets(uploaded_file)
+        except Exception:
+            return []
+
+    return frame_memo.get_or_compute(('sheets',) + get_upload_key(uploaded_file), read_sheets)
+
+def parse_uploaded_file(uploaded_file, digest, excel_options=()):
+    """
+    Parse an uploaded CSV or Excel file, reusing the on-disk cache when possible.
+
+    Args:
+        uploaded_file (file-like or str): The file uploaded by the user, or the path of a server-side file.
+        digest (str): Content digest of the file used as the disk cache key.
+        excel_options (tuple): ``(sheet_name, cell_range)`` used for an Excel file.
+
+    Returns:
+        tuple: ``(df, measurement_interval, data_type)``.
+    """
+    is_csv = get_file_name(uploaded_file).lower().endswith('.csv')
+    if not is_csv and excel_options:
+        # シートやセル範囲ごとに別のキャッシュエントリとする
+        digest = file_digest(digest.encode('ascii'), *excel_options)
+    use_cache = st.session_state.get('use_disk_cache', True)
+    if use_cache:
+        disk_cache = get_disk_cache()
+        cached = disk_cache.get(digest)
+        if cached is not None:
+            df, metadata = cached
+            return df, metadata['measurement_interval'], metadata['data_type']
+
+    if is_csv and isinstance(uploaded_file, str):
+        # サーバー側のファイルはmmapで開き、コピーせずに解析する
+        df, measurement_interval, data_type = load_csv_from_path(uploaded_file)
+    elif is_csv:
+        df, measurement_interval, data_type = load_csv_with_dynamic_start(uploaded_file)
+    else:
+        # 読み取り専用モードで行を逐次読み出す
+        sheet_name, cell_range = excel_options or (None, None)
+        df = load_excel_streaming(uploaded_file, sheet_name=sheet_name, cell_range=cell_range)
+        measurement_interval, data_type = None, 'Excel'
+
+    if use_cache and data_type in CACHEABLE_DATA_TYPES:
+        try:
+            disk_cache.put(digest, df, {'data_type': data_type, 'measurement_interval': measurement_interval})
+        except Exception as e:
+            st.warning(f"キャッシュの保存に失敗しました: {e}")
+    return df, measurement_interval, data_type
+
+def load_uploaded_file(uploaded_file, excel_options=(), compact=False):
+    """
+    Load an uploaded file, parsing it only once across Streamlit reruns.
+
+    When a different file (or another sheet of an Excel file) is loaded, the memo
+    entry of the previous one is invalidated.
+
+    Args:
+        uploaded_file (file-like or str): The file uploaded by the user, or the path of a server-side file.
+        excel_options (tuple): ``(sheet_name, cell_range)`` used for an Excel file.
+        compact (bool): Keep the data in compact dtypes (see ``data_processing.compact_dtypes``).
+
+    Returns:
+        tuple: ``(df, measurement_interval, data_type)``.
+    """
+    frame_memo.resize(int(st.session_state.get('memory_cache_max_mb', 1024)) * 1024 * 1024)
+    upload_key = get_upload_key(uploaded_file)
+    key = ('upload',) + upload_key + tuple(excel_options) + (('compact',) if compact else ())
+    previous = st.session_state.get('upload_memo_key')
+    if previous is not None and previous != key:
+        frame_memo.invalidate(previous)
+    st.session_state['upload_memo_key'] = key
+    result = frame_memo.get(key)
+    if result is None:
+        result = parse_uploaded_file(uploaded_file, upload_key[-1], excel_options)
+        if compact:
+            result = (compact_dtypes(result[0]),) + tuple(result[1:])
+        if result[2] in CACHEABLE_DATA_TYPES:
+            frame_memo.put(key, result)
+    # ヘッダーをユーザーが選ぶ形式は同じファイルでも内容が変わるため識別子を持たない
+    st.session_state['df_origin_key'] = key if result[2] in CACHEABLE_DATA_TYPES else None
+    return result
+
+def load_batch_files(paths, compact=False):
+    """
+    Load several server-side logger files in parallel, once per set of files.
+
+    Args:
+        paths (list): Paths of the CSV files.
+        compact (bool): Keep the data in compact dtypes.
+
+    Returns:
+        tuple: ``(df, file_info, throughput, data_type)``. ``data_type`` is the common
+        data type of the files, or ``'一括'`` when they differ.
+    """
+    frame_memo.resize(int(st.session_state.get('memory_cache_max_mb', 1024)) * 1024 * 1024)
+    stats = [os.stat(path) for path in paths]
+    key = ('batch', compact) + tuple((path, stat.st_size, stat.st_mtime_ns) for path, stat in zip(paths, stats))
+
+    def compute():
+        df, file_info, throughput = load_logger_batch(paths)
+        return (compact_dtypes(df) if compact else df), file_info, throughput
+
+    df, file_info, throughput = frame_memo.get_or_compute(key, compute)
+    st.session_state['df_origin_key'] = key
+    data_types = file_info['data_type'].dropna().unique()
+    data_type = data_types[0] if len(data_types) == 1 else '一括'
+    return df, file_info, throughput, data_type
+
+def load_live_file(path, compact=False):
+    """
+    Read the rows appended to a growing server-side CSV file since the previous rerun.
+
+    The follower keeps the byte offset and layout of the file in session state,
+    so only the new rows are parsed.
+
+    Args:
+        path (str): Path of the CSV file.
+        compact (bool): Keep the data in compact dtypes (only the new rows are converted on each call).
+
+    Returns:
+        tuple: ``(df, measurement_interval, data_type, new_rows)``.
+    """
+    follower = st.session_state.get('live_follower')
+    if follower is None or follower.path != path or follower.compact != compact:
+        # 省メモリモードでは追記された行だけを変換する
+        follower = CsvTailFollower(path, compact=compact)
+        st.session_state['live_follower'] = follower
+    new_rows = follower.poll()
+    # 追記で行数が増えても同じ識別子とし、ピラミッドなどは増えた行だけを追加する
+    st.session_state['df_origin_key'] = ('live', path, compact)
+    return follower.frame(), follower.measurement_interval, follower.data_type, new_rows
+
+def load_spectrogram_on_disk(df, sample_size, hop=None, window='boxcar', scaling='amplitude', workers=None):
+    """
+    Compute a spectrogram into memory-mapped files under the cache directory.
+
+    The input is transformed chunk by chunk with ``compute_spectrogram_chunked``.
+    The result directory is keyed by the data fingerprint and the parameters,
+    so reruns reopen it instead of recomputing. Old results are evicted with
+    the disk cache budget.
+
+    Args:
+        df (pd.DataFrame): Channels to transform, optionally with a time column.
+        sample_size (int): Number of samples per segment.
+        hop (int): Samples between segment starts. Defaults to ``sample_size``.
+        window (str): Window function.
+        scaling (str): ``'amplitude'`` or ``'energy'``.
+        workers (int): Number of FFT threads (``-1`` uses all cores).
+
+    Returns:
+        tuple: ``(freqs, times, spec_dict, interval)`` with ``np.memmap`` views in ``spec_dict``.
+    """
+    key = file_digest(frame_fingerprint(df).encode('ascii'), sample_size, hop, window, scaling)
+    spectrogram_dir = os.path.join(get_cache_dir(), 'spectrogram')
+    chunks = (df.iloc[start:start + SPECTROGRAM_CHUNK_ROWS] for start in range(0, len(df), SPECTROGRAM_CHUNK_ROWS))
+    result = compute_spectrogram_chunked(chunks, sample_size, os.path.join(spectrogram_dir, key),
+                                         hop=hop, window=window, scaling=scaling, workers=workers)
+    max_bytes = int(st.session_state.get('disk_cache_max_mb', 2048)) * 1024 * 1024
+    DiskFrameCache(spectrogram_dir, max_bytes=max_bytes).evict()
+    return result
+
+def load_pyramid(df, x_col, columns, identity=None, persist=True):
+    """
+    Return the min/max/mean pyramid of ``columns`` over ``x_col``, building it only once.
+
+    With ``identity`` (``df_origin_key`` or a key derived from it) the pyramid
+    is found again without reading the data, so a rerun costs a dictionary
+    lookup. A live file (``identity[0] == 'live'``) keeps one in-memory pyramid
+    that is extended with the appended rows. Otherwise the level arrays are
+    written under the cache directory and reopened memory-mapped on later runs.
+    Data that changes with a setting such as the rotation angle is passed with
+    ``persist=False``: only the latest pyramid of the session is kept in memory.
+
+    Args:
+        df (pd.DataFrame): Plotted data.
+        x_col (str): Column used for the X axis. It must be sorted.
+        columns (list): Columns drawn as lines.
+        identity (tuple): Identity of the loaded data. The data fingerprint is used when None.
+        persist (bool): Write the pyramid to the cache directory and keep it in the shared memory cache.
+
+    Returns:
+        MinMaxPyramid or None: None when the X column is not sorted numbers or naive datetimes.
+    """
+    columns = [col for col in dict.fromkeys(columns) if col != x_col]
+    if x_col not in df.columns or any(col not in df.columns for col in columns):
+        return None
+    x = df[x_col]
+    if not (pd.api.types.is_numeric_dtype(x.dtype) or pd.api.types.is_datetime64_dtype(x.dtype)) \
+            or pd.api.types.is_bool_dtype(x.dtype):
+        return None
+
+    live = identity is not None and identity[0] == 'live'
+    if live:
+        memo_key = ('pyramid', identity, x_col, tuple(columns))
+    else:
+        # 行数も含め、同じ識別子で内容の異なるデータを取り違えないようにする
+        source = frame_fingerprint(df[[x_col] + columns]) if identity is None else repr((identity, len(df), columns))
+        memo_key = ('pyramid', file_digest(source.encode('utf-8'), x_col))
+    if not persist:
+        # 設定を変えるたびに作り直すため、ディスクにも共有のキャッシュにも置かず直近の1つだけを残す
+        latest = st.session_state.get('unsaved_pyramid')
+        if latest is not None and latest[0] == memo_key and len(latest[1].x) == len(df):
+            return latest[1]
+        if not x.is_monotonic_increasing:
+            return None
+        pyramid = MinMaxPyramid.build(x.to_numpy(), {col: df[col] for col in columns})
+        st.session_state['unsaved_pyramid'] = (memo_key, pyramid)
+        return pyramid
+    pyramid = frame_memo.get(memo_key)
+    # 並んでいないX軸は結果を False として覚え、毎回調べ直さない
+    if pyramid is False:
+        return None
+    if pyramid is not None and len(pyramid.x) == len(df):
+        return pyramid
+
+    values = {col: df[col] for col in columns}
+    n_built = 0 if pyramid is None else len(pyramid.x)
+    if live and 0 < n_built < len(df) and x.iloc[n_built - 1] == pyramid.x[-1] and x.iloc[n_built - 1:].is_monotonic_increasing:
+        # 追記された行だけを既存のピラミッドに加える
+        pyramid = pyramid.extend(x.to_numpy(), values)
+    elif not x.is_monotonic_increasing:
+        frame_memo.put(memo_key, False, 0)
+        return None
+    elif live:
+        pyramid = MinMaxPyramid.build(x.to_numpy(), values)
+    else:
+        pyramid_dir = os.path.join(get_cache_dir(), 'pyramid')
+        out_dir = os.path.join(pyramid_dir, memo_key[1])
+        pyramid = MinMaxPyramid.open(out_dir, x.to_numpy(), values)
+        if pyramid is None:
+            MinMaxPyramid.build(x.to_numpy(), values).save(out_dir)
+            max_bytes = int(st.session_state.get('disk_cache_max_mb', 2048)) * 1024 * 1024
+            DiskFrameCache(pyramid_dir, max_bytes=max_bytes).evict()
+            # 段の配列をメモリに残さず、書き出したファイルをmmapで開き直す
+            pyramid = MinMaxPyramid.open(out_dir, x.to_numpy(), values)
+            if pyramid is None:
+                return None
+    # X と値の float64 コピー、段の配列の大きさでメモリの上限に数える
+    frame_memo.put(memo_key, pyramid, pyramid.nbytes)
+    return pyramid
+
+def load_sample_frame(name, loader, compact=False):
+    """
+    Return a sample DataFrame, generating it only once per process.
+    """
+    st.session_state['df_origin_key'] = ('sample', name, compact)
+    if compact:
+        return frame_memo.get_or_compute(('sample', name, 'compact'), lambda: compact_dtypes(loader()))
+    return frame_memo.get_or_compute(('sample', name), loader)
 
 def process_uploaded_file():
     uploaded_file = st.file_uploader("ファイルをアップロード", type=["csv", "xlsx"])
@@ -28,31 +359,61 @@ def load_sample_data():
             return load_timeseries_sample_data()
     return None
 
-def load_data(uploaded_file):
+def load_data(uploaded_file, excel_options=()):
     """
     Load data from the uploaded file or provide sample data.
     
     Args:
-        uploaded_file (file-like): The file uploaded by the user.
+        uploaded_file (file-like, str or list): The file uploaded by the user, the path of a file in the
+            server-side data directory, or a list of paths loaded together.
+        excel_options (tuple): ``(sheet_name, cell_range)`` chosen with ``ui_components.excel_range_selector``
+            for an Excel file.
 
     Returns:
         pd.DataFrame or None: The loaded data as a DataFrame.
     """
+    # 省メモリモード（測定チャンネルをfloat32、文字列をカテゴリ型で保持する）
+    compact = st.toggle("省メモリモード（float32・カテゴリ型で保持）", value=st.session_state.get('compact_dtypes', False), key='compact_dtypes_toggle')
+    st.session_state['compact_dtypes'] = compact
+    # 読み込んだデータの識別子（各読み込み関数が設定する）
+    st.session_state['df_origin_key'] = None
+
+    # サーバーのフォルダから複数ファイルを一括で読み込む場合
+    if isinstance(uploaded_file, list):
+        try:
+            st.session_state['df_origin'] = None
+            st.session_state['df_origin'], file_info, throughput, st.session_state['data_type'] = load_batch_files(uploaded_file, compact)
+            st.write(f"{throughput['files']} files were loaded with {throughput['workers']} workers "
+                     f"({throughput['files_per_sec']:.2f} files/sec, {throughput['mb_per_sec']:.1f} MB/sec).")
+            st.write(f"Type of data is {st.session_state['data_type']}")
+            st.dataframe(file_info)
+        except Exception as e:
+            st.error(f"ファイルの読み込み中にエラーが発生しました: {e}")
+
     # ファイルアップロードが存在する場合
-    if uploaded_file is not None:
+    elif uploaded_file is not None:
         try:
             st.session_state['df_origin'] = None
 
+            file_name = get_file_name(uploaded_file)
+
+            # 追記中のCSVファイルをライブ更新する場合
+            if isinstance(uploaded_file, str) and file_name.lower().endswith('.csv') and st.session_state.get('live_follow_toggle', False):
+                st.session_state['df_origin'], measurement_interval, st.session_state['data_type'], new_rows = load_live_file(uploaded_file, compact)
+                st.write(f"{file_name} is followed live ({new_rows} new rows, {len(st.session_state['df_origin'])} rows in total).")
+                st.write(f"Type of data is {st.session_state['data_type']}")
+                st.write(f"Measurement interval is {measurement_interval} sec")
+
             # CSVファイルの場合
-            if uploaded_file.name.lower().endswith('.csv'):
-                st.write(f"{uploaded_file.name} was uploaded.")
-                st.session_state['df_origin'], measurement_interval, st.session_state['data_type'] = load_csv_with_dynamic_start(uploaded_file)
+            elif file_name.lower().endswith('.csv'):
+                st.write(f"{file_name} was uploaded.")
+                st.session_state['df_origin'], measurement_interval, st.session_state['data_type'] = load_uploaded_file(uploaded_file, compact=compact)
                 st.write(f"Type of data is {st.session_state['data_type']}")
                 st.write(f"Measurement interval is {measurement_interval} sec")
 
             # Excelファイルの場合
-            elif uploaded_file.name.lower().endswith('.xlsx'):
-                st.session_state['df_origin'] = pd.read_excel(uploaded_file)
+            elif file_name.lower().endswith('.xlsx'):
+                st.session_state['df_origin'], _, _ = load_uploaded_file(uploaded_file, tuple(excel_options), compact)
 
         except Exception as e:
             st.error(f"ファイルの読み込み中にエラーが発生しました: {e}")
@@ -68,16 +429,19 @@ def load_data(uploaded_file):
 
         # サンプルデータの生成
         if use_sample_data == "単純データ":
-            st.session_state['df_origin'] = load_simple_sample_data()
+            st.session_state['df_origin'] = load_sample_frame('単純データ', load_simple_sample_data, compact)
         elif use_sample_data == "時系列データ":
-            st.session_state['df_origin'] = load_timeseries_sample_data()
+            st.session_state['df_origin'] = load_sample_frame('時系列データ', load_timeseries_sample_data, compact)
         elif use_sample_data == "ヒストグラム用データ":
-            st.session_state['df_origin'] = load_histogram_sample_data()
+            st.session_state['df_origin'] = load_sample_frame('ヒストグラム用データ', load_histogram_sample_data, compact)
         elif use_sample_data == "散布図用データ":
-            st.session_state['df_origin'] = load_scatter_plot_sample_data()            
+            st.session_state['df_origin'] = load_sample_frame('散布図用データ', load_scatter_plot_sample_data, compact)            
         elif use_sample_data == "ヒートマップ用データ":
-            st.session_state['df_origin'] = load_heatmap_sample_data()
+            st.session_state['df_origin'] = load_sample_frame('ヒートマップ用データ', load_heatmap_sample_data, compact)
         
         st.write('Sample data is ' + use_sample_data)
 
+    if st.session_state.get('df_origin') is not None:
+        st.caption(f"Memory usage: {st.session_state['df_origin'].memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
     return st.session_state.get('df_origin', None)
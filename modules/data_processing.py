@@ -1,13 +1,98 @@
+import json
+import os
+import shutil
+
 import pandas as pd
 import numpy as np
+import scipy.fft
 import streamlit as st
 
+from modules.cache import MemoryLRUCache, frame_fingerprint, make_temp_dir, publish_dir
+
+# 時間軸として扱う列名（省メモリモードでも元の精度のまま保持する）
+TIME_COLUMNS = ["Time", "経過時間(sec)", "time(sec)"]
+
+# 省メモリモードでカテゴリ型にする文字列列の、行数に対する種類数の上限
+MAX_CATEGORY_RATIO = 0.5
+
+# ズームFFTで計算する周波数ビン数の上限（チャープZ変換の作業配列がこの長さに比例する）
+MAX_ZOOM_FFT_BINS = 1 << 22
+
+# compute_fft で一度に変換する配列のサンプル数の上限（列をこの大きさまでまとめる）
+FFT_BLOCK_SAMPLES = 1 << 24
+
+# FFT結果のキャッシュの既定の容量上限（バイト）
+DEFAULT_SPECTRUM_CACHE_BYTES = 256 * 1024 ** 2
+
+# FFT結果のキャッシュ（プロセス内の全セッションで共有）
+spectrum_cache = MemoryLRUCache(DEFAULT_SPECTRUM_CACHE_BYTES)
+
+# 移動窓・角度スイープの評価値のキャッシュの容量上限（バイト）
+DEFAULT_METRICS_CACHE_BYTES = 64 * 1024 ** 2
+
+# 加速度の評価値のキャッシュ（プロセス内の全セッションで共有）
+metrics_cache = MemoryLRUCache(DEFAULT_METRICS_CACHE_BYTES)
+
 def preprocess_data(df):
     # データの前処理をここに記述
     df = df.dropna()  # 例: 欠損値の削除
     return df
 
 
+def as_float(series: pd.Series) -> pd.Series:
+    """Return ``series`` as floating point, keeping float32 data in float32."""
+    if series.dtype == np.float32:
+        return series
+    return series.astype(float)
+
+
+def compact_dtypes(df: pd.DataFrame, time_columns=TIME_COLUMNS, max_category_ratio: float = MAX_CATEGORY_RATIO) -> pd.DataFrame:
+    """Store a loaded table in compact dtypes.
+
+    Measurement channels are downcast to float32, integer columns to the
+    smallest integer type and low-cardinality text columns to categoricals.
+    Time columns keep their float64/int64 base so that elapsed times and the
+    inferred sampling interval are unchanged. Besides ``time_columns``, any
+    strictly increasing float column is treated as a time axis, so a time
+    column chosen later (e.g. ``accel_time_col``) keeps its precision.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Loaded table.
+    time_columns : list, optional
+        Columns left untouched.
+    max_category_ratio : float, optional
+        Text columns whose number of unique values is at most this ratio of the
+        row count are converted to categoricals.
+
+    Returns
+    -------
+    pd.DataFrame
+        A new DataFrame with the same columns and index.
+    """
+    compact = df.copy(deep=False)
+    for i, col in enumerate(df.columns):
+        if col in time_columns:
+            continue
+        series = df.iloc[:, i]
+        dtype = series.dtype
+        if isinstance(dtype, np.dtype) and dtype.kind == "f" and dtype.itemsize > 4:
+            if not _is_time_axis(series):
+                compact.isetitem(i, series.astype(np.float32))
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iu":
+            compact.isetitem(i, pd.to_numeric(series, downcast="integer" if dtype.kind == "i" else "unsigned"))
+        elif pd.api.types.is_string_dtype(dtype) or pd.api.types.is_object_dtype(dtype):
+            if series.nunique() <= max_category_ratio * len(series):
+                compact.isetitem(i, series.astype("category"))
+    return compact
+
+
+def _is_time_axis(series: pd.Series) -> bool:
+    """Return whether a float column increases monotonically, as a time axis does."""
+    return len(series) > 1 and series.is_monotonic_increasing and series.iloc[0] < series.iloc[-1]
+
+
 def rotate_xy(df: pd.DataFrame, x_col: str, y_col: str, angle_deg: float) -> pd.DataFrame:
     """Rotate X and Y columns by the given angle.
 
@@ -24,12 +109,15 @@ def rotate_xy(df: pd.DataFrame, x_col: str, y_col: str, angle_deg: float) -> pd.
     -------
     pd.DataFrame
         DataFrame with two columns ``x_rot`` and ``y_rot`` containing the rotated values.
+        float32 inputs stay float32.
     """
     angle_rad = np.deg2rad(angle_deg)
-    x = df[x_col].astype(float)
-    y = df[y_col].astype(float)
-    x_rot = x * np.cos(angle_rad) - y * np.sin(angle_rad)
-    y_rot = x * np.sin(angle_rad) + y * np.cos(angle_rad)
+    x = as_float(df[x_col])
+    y = as_float(df[y_col])
+    # Pythonのfloatにしてfloat32の列がfloat64に昇格しないようにする
+    cos, sin = float(np.cos(angle_rad)), float(np.sin(angle_rad))
+    x_rot = x * cos - y * sin
+    y_rot = x * sin + y * cos
     return pd.DataFrame({"x_rot": x_rot, "y_rot": y_rot})
 
 
@@ -51,9 +139,293 @@ def calc_accel_metrics(series: pd.Series) -> dict:
     }
 
 
+def rolling_accel_metrics(df: pd.DataFrame, window: int, columns=None, step: int = 1) -> pd.DataFrame:
+    """Calculate RMS, max, min and peak-to-peak over a sliding window.
+
+    RMS uses cumulative sums of squares, and max/min use the block
+    decomposition of van Herk and Gil-Werman (prefix and suffix maxima within
+    blocks of ``window`` samples). All columns are processed together, and the
+    cost is linear in the record length whatever the window size.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Acceleration dataframe.
+    window : int
+        Window length in samples.
+    columns : list, optional
+        Columns to evaluate. Numeric non-time columns are used by default.
+    step : int, optional
+        Return every ``step``-th window, e.g. ``window`` for non-overlapping windows.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per window, labelled with the time (or index) of its last
+        sample as in ``DataFrame.rolling``. Columns are ``<col>_rms``,
+        ``<col>_max``, ``<col>_min`` and ``<col>_p2p``. Missing values are
+        ignored, and a window without valid samples gives NaN.
+    """
+    if columns is None:
+        columns = [col for col in df.select_dtypes(include=[float, int]).columns if col not in TIME_COLUMNS]
+    window = int(window)
+    n_windows = len(df) - window + 1
+    if window < 1 or n_windows <= 0 or not columns:
+        return pd.DataFrame(columns=[f"{col}_{name}" for col in columns for name in ["rms", "max", "min", "p2p"]])
+
+    matrix = np.stack([df[col].to_numpy(dtype=float) for col in columns])
+    valid = np.isfinite(matrix)
+    ends = np.arange(window - 1, len(df))[::step]
+    starts = ends - window + 1
+
+    # 二乗和と有効サンプル数の累積和から窓ごとの実効値を求める
+    squares = np.zeros((len(columns), len(df) + 1))
+    np.cumsum(np.where(valid, matrix * matrix, 0.0), axis=1, out=squares[:, 1:])
+    counts = np.zeros((len(columns), len(df) + 1))
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+    count = counts[:, ends + 1] - counts[:, starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rms = np.sqrt(np.maximum(squares[:, ends + 1] - squares[:, starts], 0) / count)
+
+    max_val = _sliding_max(np.where(valid, matrix, -np.inf), window)[:, starts]
+    min_val = -_sliding_max(np.where(valid, -matrix, -np.inf), window)[:, starts]
+    empty = count == 0
+    max_val[empty] = np.nan
+    min_val[empty] = np.nan
+
+    result = {}
+    for i, col in enumerate(columns):
+        result[f"{col}_rms"] = rms[i]
+        result[f"{col}_max"] = max_val[i]
+        result[f"{col}_min"] = min_val[i]
+        result[f"{col}_p2p"] = max_val[i] - min_val[i]
+    time_col = next((col for col in TIME_COLUMNS if col in df.columns), None)
+    index = df[time_col].to_numpy()[ends] if time_col else df.index[ends]
+    return pd.DataFrame(result, index=pd.Index(index, name=time_col))
+
+
+def _sliding_max(matrix: np.ndarray, window: int) -> np.ndarray:
+    """Return the maximum of each window starting at column ``i``, for every row of ``matrix``."""
+    n_rows, n = matrix.shape
+    n_blocks = -(-n // window)
+    padded = np.full((n_rows, n_blocks * window), -np.inf)
+    padded[:, :n] = matrix
+    blocks = padded.reshape(n_rows, n_blocks, window)
+    prefix = np.maximum.accumulate(blocks, axis=2).reshape(n_rows, -1)
+    suffix = np.maximum.accumulate(blocks[..., ::-1], axis=2)[..., ::-1].reshape(n_rows, -1)
+    # 窓 [i, i+window) はブロック境界で二分され、後半の prefix と前半の suffix の最大値になる
+    n_windows = n - window + 1
+    return np.maximum(suffix[:, :n_windows], prefix[:, window - 1:window - 1 + n_windows])
+
+
+# 角度スイープで一度に射影する要素数（角度数×サンプル数）
+SWEEP_BLOCK_ELEMENTS = 1 << 22
+
+
+def principal_angle(df: pd.DataFrame, x_col: str, y_col: str) -> float:
+    """Return the rotation angle that maximises the RMS of the rotated X axis.
+
+    The mean square of ``x cos - y sin`` is a quadratic form of the second
+    moments of X and Y, so its maximum has a closed form.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Source dataframe containing X and Y columns.
+    x_col, y_col : str
+        Column names corresponding to X and Y axes.
+
+    Returns
+    -------
+    float
+        Angle in degrees within ``(-90, 90]``, with the sign convention of ``rotate_xy``.
+    """
+    return _principal_angle(*_second_moments(*_xy_values(df, x_col, y_col)))
+
+
+def sweep_rotation_angles(df: pd.DataFrame, x_col: str, y_col: str, angles=None, step: float = 0.1,
+                          angle_range=(-90.0, 90.0)) -> pd.DataFrame:
+    """Evaluate the metrics of ``calc_accel_metrics`` for a grid of rotation angles.
+
+    RMS follows from the second moments of X and Y for every angle at once.
+    The maximum of a projection is attained on the convex hull of the XY
+    points, so peaks are obtained by projecting only the hull vertices for all
+    angles in one matrix product.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Source dataframe containing X and Y columns.
+    x_col, y_col : str
+        Column names corresponding to X and Y axes.
+    angles : array-like, optional
+        Angles in degrees. Built from ``angle_range`` and ``step`` when omitted.
+    step : float, optional
+        Angle step in degrees.
+    angle_range : tuple, optional
+        ``(start, stop)`` of the angle grid in degrees, both inclusive.
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed by angle, with columns ``X_rms``, ``X_max``, ``X_min``, ``X_p2p`` and
+        the same for ``Y``. ``attrs["principal_angle"]`` holds the result of
+        ``principal_angle``.
+    """
+    if angles is None:
+        start, stop = angle_range
+        angles = np.arange(round((stop - start) / step) + 1) * step + start
+    angles = np.asarray(angles, dtype=float)
+    x, y = _xy_values(df, x_col, y_col)
+    sxx, syy, sxy = _second_moments(x, y)
+
+    rad = np.deg2rad(angles)
+    cos, sin = np.cos(rad), np.sin(rad)
+    # 回転後の X = x cos - y sin, Y = x sin + y cos
+    directions = {"X": np.stack([cos, -sin]), "Y": np.stack([sin, cos])}
+    points = _hull_points(x, y)
+
+    result = {}
+    for axis, (a, b) in directions.items():
+        mean_square = a * a * sxx + 2 * a * b * sxy + b * b * syy
+        max_val, min_val = _projection_extrema(points, directions[axis])
+        result[f"{axis}_rms"] = np.sqrt(np.maximum(mean_square, 0))
+        result[f"{axis}_max"] = max_val
+        result[f"{axis}_min"] = min_val
+        result[f"{axis}_p2p"] = max_val - min_val
+
+    sweep_df = pd.DataFrame(result, index=pd.Index(angles, name="angle"))
+    sweep_df.attrs["principal_angle"] = _principal_angle(sxx, syy, sxy)
+    return sweep_df
+
+
+def _xy_values(df: pd.DataFrame, x_col: str, y_col: str):
+    x = df[x_col].to_numpy(dtype=float)
+    y = df[y_col].to_numpy(dtype=float)
+    # 欠損のある行は除く
+    valid = np.isfinite(x) & np.isfinite(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+    return x, y
+
+
+def _second_moments(x: np.ndarray, y: np.ndarray):
+    if len(x) == 0:
+        return np.nan, np.nan, np.nan
+    return float(np.dot(x, x)) / len(x), float(np.dot(y, y)) / len(y), float(np.dot(x, y)) / len(x)
+
+
+def _principal_angle(sxx: float, syy: float, sxy: float) -> float:
+    # 平均二乗値 (sxx+syy)/2 + (sxx-syy)/2 cos2θ - sxy sin2θ が最大になる角度
+    angle = float(np.rad2deg(0.5 * np.arctan2(-2 * sxy, sxx - syy)))
+    return 90.0 if angle == -90.0 else angle
+
+
+def _hull_points(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Return the XY points that can attain a projection extremum, as a ``(2, k)`` array."""
+    points = np.stack([x, y])
+    if points.shape[1] < 3:
+        return points
+    from scipy.spatial import ConvexHull, QhullError
+
+    try:
+        return points[:, ConvexHull(points.T).vertices]
+    except QhullError:
+        # 点が一直線上に並ぶ場合などは全点を射影する
+        return points
+
+
+def _projection_extrema(points: np.ndarray, direction: np.ndarray):
+    n_angles = direction.shape[1]
+    if points.shape[1] == 0:
+        return np.full(n_angles, np.nan), np.full(n_angles, np.nan)
+    max_val = np.full(n_angles, -np.inf)
+    min_val = np.full(n_angles, np.inf)
+    block = max(1, SWEEP_BLOCK_ELEMENTS // n_angles) if n_angles else points.shape[1]
+    for start in range(0, points.shape[1], block):
+        projection = points[:, start:start + block].T @ direction
+        np.maximum(max_val, projection.max(axis=0), out=max_val)
+        np.minimum(min_val, projection.min(axis=0), out=min_val)
+    return max_val, min_val
+
+
+def calc_channel_stats_chunked(chunks, columns=None) -> pd.DataFrame:
+    """Calculate per-channel statistics over an iterator of DataFrame chunks.
+
+    Only one chunk is resident at a time. Means and variances are merged with
+    the pairwise update of Chan et al., so the result matches a single pass over
+    the full table.
+
+    Parameters
+    ----------
+    chunks : iterable of pd.DataFrame
+        Chunks such as those yielded by ``file_loader.open_csv_chunks``.
+    columns : list, optional
+        Columns to summarise. Numeric columns of the first chunk are used by default.
+
+    Returns
+    -------
+    pd.DataFrame
+        Index of column names with ``count``, ``mean``, ``std``, ``rms``, ``min``,
+        ``max`` and ``p2p`` columns.
+    """
+    count = mean = m2 = sumsq = min_val = max_val = None
+    for chunk in chunks:
+        if columns is None:
+            columns = chunk.select_dtypes(include="number").columns.to_list()
+        values = chunk[columns].to_numpy(dtype=float)
+        n = np.sum(~np.isnan(values), axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            chunk_mean = np.where(n > 0, np.nansum(values, axis=0) / np.maximum(n, 1), 0.0)
+        chunk_m2 = np.nansum((values - chunk_mean) ** 2, axis=0)
+        chunk_sumsq = np.nansum(values ** 2, axis=0)
+        chunk_min = np.nanmin(np.where(np.isnan(values), np.inf, values), axis=0)
+        chunk_max = np.nanmax(np.where(np.isnan(values), -np.inf, values), axis=0)
+        if count is None:
+            count, mean, m2, sumsq = n, chunk_mean, chunk_m2, chunk_sumsq
+            min_val, max_val = chunk_min, chunk_max
+            continue
+        total = count + n
+        delta = chunk_mean - mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(total > 0, mean + delta * n / np.maximum(total, 1), 0.0)
+            m2 = m2 + chunk_m2 + delta ** 2 * count * n / np.maximum(total, 1)
+        sumsq = sumsq + chunk_sumsq
+        count = total
+        min_val = np.minimum(min_val, chunk_min)
+        max_val = np.maximum(max_val, chunk_max)
+
+    if count is None:
+        return pd.DataFrame(columns=["count", "mean", "std", "rms", "min", "max", "p2p"])
+
+    valid = count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats = pd.DataFrame(
+            {
+                "count": count,
+                "mean": np.where(valid, mean, np.nan),
+                "std": np.where(valid, np.sqrt(m2 / count), np.nan),
+                "rms": np.where(valid, np.sqrt(sumsq / count), np.nan),
+                "min": np.where(valid, min_val, np.nan),
+                "max": np.where(valid, max_val, np.nan),
+            },
+            index=columns,
+        )
+    stats["p2p"] = stats["max"] - stats["min"]
+    return stats
+
+
+def _rfft(values: np.ndarray, axis: int = -1, workers: int = None, n: int = None) -> np.ndarray:
+    """Batched real FFT. ``workers`` threads share the independent transforms (-1 uses all cores).
+
+    ``n`` zero-pads (or crops) the transformed axis as in ``scipy.fft.rfft``.
+    """
+    return scipy.fft.rfft(values, n=n, axis=axis, workers=workers)
+
+
 def _infer_sampling_interval(df: pd.DataFrame) -> float:
     """Infer sampling interval from known time columns."""
-    for col in ["Time", "経過時間(sec)", "time(sec)"]:
+    for col in TIME_COLUMNS:
         if col in df.columns and len(df[col]) > 1:
             try:
                 return float(df[col].iloc[1]) - float(df[col].iloc[0])
@@ -62,57 +434,169 @@ def _infer_sampling_interval(df: pd.DataFrame) -> float:
     return 1.0
 
 
-def compute_fft(df: pd.DataFrame, start_sec: float, sample_size: int):
+def _fft_window(df: pd.DataFrame, start_sec: float, sample_size: int):
+    """Return ``(interval, start_index, end_index)`` of the FFT window, moved back at the end of the data."""
+    interval = _infer_sampling_interval(df)
+    start_index = int(start_sec / interval)
+    end_index = start_index + int(sample_size)
+    if end_index > len(df):
+        end_index = len(df)
+        start_index = max(0, end_index - int(sample_size))
+    return interval, start_index, end_index
+
+
+def compute_fft_spectra(df: pd.DataFrame, start_sec: float, sample_size: int, workers: int = None, pad: bool = False):
+    """Compute the scaled complex spectra behind ``compute_fft``.
+
+    ``np.abs`` of each spectrum is the amplitude spectrum of ``compute_fft``.
+    Because the transform is linear, spectra of rotated channels can be
+    derived from these without another FFT (see ``rotate_spectra``).
+
+    Parameters
+    ----------
+    df, start_sec, sample_size, workers, pad
+        As in ``compute_fft``.
+
+    Returns
+    -------
+    tuple
+        ``(freqs, spectra, interval, attrs)`` where ``spectra`` maps column names
+        to complex arrays and ``attrs`` is the metadata stored in ``amp_df.attrs``
+        by ``compute_fft``.
+    """
+    interval, start_index, end_index = _fft_window(df, start_sec, sample_size)
+    n = end_index - start_index
+    if n <= 0:
+        return np.array([]), {}, interval, {}
+
+    columns = [col for col in df.select_dtypes(include=[float, int]).columns if col not in TIME_COLUMNS]
+    n_fft = scipy.fft.next_fast_len(n, real=True) if pad else n
+    freqs = np.fft.rfftfreq(n_fft, d=interval)
+
+    # 複数列をまとめて1回で変換し、workers のスレッドで分担させる（表全体の float64 コピーは作らない）
+    spectra = {}
+    block = max(1, FFT_BLOCK_SAMPLES // n_fft)
+    for first in range(0, len(columns), block):
+        block_cols = columns[first:first + block]
+        dtype = np.float32 if all(df[col].dtype == np.float32 for col in block_cols) else float
+        matrix = np.empty((len(block_cols), n), dtype=dtype)
+        for i, col in enumerate(block_cols):
+            matrix[i] = df[col].to_numpy()[start_index:end_index]
+        spectrum = _rfft(matrix, workers=workers, n=n_fft)
+        del matrix
+        # 振幅スペクトルの計算（ゼロ詰めしてもサンプル数で正規化する）
+        spectrum *= 2 / n
+        spectrum[:, 0] /= 2        # DC成分は元に戻す
+        # ナイキスト成分の処理（FFT長が偶数の場合）
+        if n_fft % 2 == 0:
+            spectrum[:, -1] /= 2
+        spectra.update(zip(block_cols, spectrum))
+
+    attrs = {
+        "start_sec": start_index * interval,
+        "n_samples": n,
+        "n_fft": n_fft,
+        "resolution": 1 / (n * interval),
+        "bin_spacing": 1 / (n_fft * interval),
+    }
+    return freqs, spectra, interval, attrs
+
+
+def compute_fft(df: pd.DataFrame, start_sec: float, sample_size: int, workers: int = None, pad: bool = False):
     """Compute FFT for acceleration dataframe.
 
+    Any ``sample_size`` is accepted. The channels are copied into one array in
+    blocks of at most ``FFT_BLOCK_SAMPLES`` samples and each block is
+    transformed in one call, so ``workers`` threads share the channels and no
+    float64 copy of the whole table is made. Time columns are not transformed.
+
     Parameters
     ----------
     df : pd.DataFrame
         DataFrame containing at least acceleration columns (e.g. ``X``, ``Y``, ``Z``)
         and optionally a time column.
     start_sec : float
-        Start time in seconds for FFT calculation.
+        Start time in seconds for FFT calculation. When the window would run past
+        the end of the data it is moved back; ``amp_df.attrs["start_sec"]`` holds
+        the start actually used.
     sample_size : int
-        Number of samples to use for FFT. Should be a power of two.
+        Number of samples to use for FFT.
+    workers : int, optional
+        Number of threads for the FFT (``-1`` uses all cores). Single-threaded by default.
+    pad : bool, optional
+        Zero-pad the segment to the next fast FFT length
+        (``scipy.fft.next_fast_len``). The amplitude is still normalised by the
+        number of samples, so peak heights are unchanged.
 
     Returns
     -------
     tuple
-        ``(freqs, amp_df)`` where ``freqs`` is a numpy array of frequency bins and
+        ``(freqs, amp_df, interval)`` where ``freqs`` is a numpy array of frequency bins and
         ``amp_df`` is a DataFrame containing amplitude spectra for each column.
+        ``amp_df.attrs`` holds ``start_sec``, ``n_samples``, ``n_fft``,
+        ``resolution`` (``1 / (n_samples * interval)``, the physical resolution)
+        and ``bin_spacing`` (``1 / (n_fft * interval)``).
     """
-
-    interval = _infer_sampling_interval(df)
-    start_index = int(start_sec / interval)
-    end_index = start_index + sample_size
-    if end_index > len(df):
-        end_index = len(df)
-        start_index = max(0, end_index - sample_size)
-    segment = df.iloc[start_index:end_index]
-    n = len(segment)
-    if n == 0:
-        return np.array([]), pd.DataFrame()
-
-    data_values = segment.select_dtypes(include=[float, int]).values
-    # サンプル数で正規化を行う。
-    fft_vals = np.fft.rfft(data_values, axis=0)
-    freqs = np.fft.rfftfreq(n, d=interval)
-    
-    # 振幅スペクトルの計算
-    amplitude = np.abs(fft_vals) * 2 / n  # 2/n で正規化
-    amplitude[0] = amplitude[0] / 2       # DC成分は元に戻す
-    
-    # ナイキスト成分の処理（サンプル数が偶数の場合）
-    if n % 2 == 0:
-        amplitude[-1] = amplitude[-1] / 2
-    
-    amp_df = pd.DataFrame(amplitude, columns=segment.select_dtypes(include=[float, int]).columns)
+    freqs, spectra, interval, attrs = compute_fft_spectra(df, start_sec, sample_size, workers=workers, pad=pad)
+    if len(freqs) == 0:
+        return freqs, pd.DataFrame(), interval
+    amp_df = pd.DataFrame({col: np.abs(spectrum) for col, spectrum in spectra.items()}, columns=list(spectra), copy=False)
+    amp_df.attrs.update(attrs)
     return freqs, amp_df, interval
 
 
-def compute_fft_segments(df: pd.DataFrame, sample_size: int):
+def rotate_spectra(spectra: dict, angle_deg: float, x_col: str = "X_raw", y_col: str = "Y_raw") -> dict:
+    """Derive amplitude spectra of the XY-rotated channels from complex spectra.
+
+    The FFT is linear, so the spectra of ``x cos - y sin`` and ``x sin + y cos``
+    are the same combination of the complex spectra of ``x`` and ``y``. Changing
+    the angle therefore costs one elementwise pass instead of a new transform.
+
+    Parameters
+    ----------
+    spectra : dict
+        Complex spectra from ``compute_fft_spectra`` or ``compute_stft_spectra``.
+    angle_deg : float
+        Rotation angle in degrees. Positive is counter-clockwise, as in ``rotate_xy``.
+    x_col, y_col : str
+        Keys of the unrotated X and Y spectra.
+
+    Returns
+    -------
+    dict
+        Amplitude spectra with the rotated ``X`` and ``Y`` first, followed by the
+        magnitudes of the other channels (e.g. ``Z``).
+    """
+    angle_rad = np.deg2rad(angle_deg)
+    cos, sin = float(np.cos(angle_rad)), float(np.sin(angle_rad))
+    x, y = spectra[x_col], spectra[y_col]
+    amplitudes = {"X": np.abs(x * cos - y * sin), "Y": np.abs(x * sin + y * cos)}
+    for col, spectrum in spectra.items():
+        if col not in (x_col, y_col, "X", "Y"):
+            amplitudes[col] = np.abs(spectrum)
+    return amplitudes
+
+
+def _channel_matrix(df: pd.DataFrame, columns, n_rows: int) -> np.ndarray:
+    """Copy the first ``n_rows`` of ``columns`` into one contiguous ``(channels, samples)`` array."""
+    matrix = np.empty((len(columns), n_rows))
+    for i, col in enumerate(columns):
+        matrix[i] = df[col].iloc[:n_rows].to_numpy(dtype=float)
+    return matrix
+
+
+def _segment_view(matrix: np.ndarray, segment_size: int, hop: int) -> np.ndarray:
+    """Return a strided ``(channels, segments, segment_size)`` view of ``matrix`` without copying."""
+    return np.lib.stride_tricks.sliding_window_view(matrix, segment_size, axis=-1)[:, ::hop]
+
+
+def compute_fft_segments(df: pd.DataFrame, sample_size: int, workers: int = None):
     """Compute FFT repeatedly over segments of ``sample_size``.
 
+    All channels are copied once into a contiguous matrix, split into
+    segments with a strided view and transformed with a single batched FFT.
+    Time columns are not transformed.
+
     Parameters
     ----------
     df : pd.DataFrame
@@ -120,6 +604,8 @@ def compute_fft_segments(df: pd.DataFrame, sample_size: int):
         optional for inferring the sampling interval.
     sample_size : int
         Number of samples per FFT segment.
+    workers : int, optional
+        Number of threads for the FFT (``-1`` uses all cores). Single-threaded by default.
 
     Returns
     -------
@@ -138,19 +624,458 @@ def compute_fft_segments(df: pd.DataFrame, sample_size: int):
     freqs = np.fft.rfftfreq(sample_size, d=interval)
     times = np.arange(n_segments) * sample_size * interval
 
-    spec_dict = {}
-    numeric_cols = df.select_dtypes(include=[float, int]).columns
-    for col in numeric_cols:
-        spectra = []
-        for i in range(n_segments):
-            seg = df[col].iloc[i * sample_size : (i + 1) * sample_size].astype(float).values
-            fft_vals = np.fft.rfft(seg)
-            amplitude = np.abs(fft_vals) * 2 / sample_size
-            amplitude[0] /= 2
-            if sample_size % 2 == 0:
-                amplitude[-1] /= 2
-            spectra.append(amplitude)
-        spec_dict[col] = np.column_stack(spectra)
+    numeric_cols = [col for col in df.select_dtypes(include=[float, int]).columns if col not in TIME_COLUMNS]
+    if not numeric_cols:
+        return freqs, times, {}, interval
+
+    matrix = _channel_matrix(df, numeric_cols, n_segments * sample_size)
+    segments = _segment_view(matrix, sample_size, sample_size)
+    # (チャンネル, セグメント, サンプル) をまとめて変換する
+    amplitude = np.abs(_rfft(segments, workers=workers)) * 2 / sample_size
+    amplitude[..., 0] /= 2
+    if sample_size % 2 == 0:
+        amplitude[..., -1] /= 2
+
+    spec_dict = {col: amplitude[i].T for i, col in enumerate(numeric_cols)}
+    return freqs, times, spec_dict, interval
+
+
+# 窓関数の表示名と scipy.signal.get_window の名前の対応
+WINDOW_FUNCTIONS = {
+    "矩形": "boxcar",
+    "Hann": "hann",
+    "Hamming": "hamming",
+    "Flat-top": "flattop",
+}
+
+# Welch法で一度に変換するサンプル数の上限（オーバーラップ時のメモリを抑える）
+WELCH_BLOCK_SAMPLES = 1 << 22
+
+
+def _window(window: str, size: int) -> np.ndarray:
+    from scipy.signal import get_window
+
+    return get_window(WINDOW_FUNCTIONS.get(window, window), size, fftbins=True)
+
+
+def _window_scale(win: np.ndarray, scaling: str) -> float:
+    """Return the factor converting ``|rfft|`` of a windowed segment to a one-sided amplitude."""
+    if scaling == "amplitude":
+        return 2 / np.sum(win)
+    if scaling == "energy":
+        return 2 / np.sqrt(len(win) * np.sum(win ** 2))
+    raise ValueError(f"unknown scaling: {scaling}")
+
+
+def _stft_input(df: pd.DataFrame, segment_size: int, hop):
+    interval = _infer_sampling_interval(df)
+    hop = segment_size // 2 if hop is None else int(hop)
+    if hop < 1:
+        raise ValueError("hop must be at least 1")
+    numeric_cols = [col for col in df.select_dtypes(include=[float, int]).columns if col not in TIME_COLUMNS]
+    n_segments = (len(df) - segment_size) // hop + 1 if len(df) >= segment_size else 0
+    return interval, hop, numeric_cols, n_segments
+
+
+def compute_stft(df: pd.DataFrame, segment_size: int, hop: int = None, window: str = "hann", scaling: str = "amplitude",
+                 workers: int = None):
+    """Compute a windowed short-time Fourier transform with overlapping segments.
+
+    Segments are taken with a strided view of the channel matrix (no copy per
+    segment) and transformed with one batched FFT.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame containing numeric columns to transform. Time columns are skipped
+        and used only to infer the sampling interval.
+    segment_size : int
+        Number of samples per segment.
+    hop : int, optional
+        Number of samples between the starts of consecutive segments. Defaults to
+        ``segment_size // 2`` (50% overlap).
+    window : str, optional
+        Window function, a key of ``WINDOW_FUNCTIONS`` or a name accepted by
+        ``scipy.signal.get_window``.
+    scaling : {"amplitude", "energy"}, optional
+        ``"amplitude"`` corrects the coherent gain of the window so that the peak
+        of a sinusoid shows its amplitude. ``"energy"`` corrects the noise
+        bandwidth so that band energy (RMS) is preserved.
+    workers : int, optional
+        Number of threads for the FFT (``-1`` uses all cores). Single-threaded by default.
+
+    Returns
+    -------
+    tuple
+        ``(freqs, times, spec_dict, interval)`` with the same layout as
+        ``compute_fft_segments``. ``times`` are the segment start times.
+    """
+    freqs, times, spectra, interval = compute_stft_spectra(
+        df, segment_size, hop=hop, window=window, scaling=scaling, workers=workers
+    )
+    spec_dict = {col: np.abs(spectrum) for col, spectrum in spectra.items()}
+    return freqs, times, spec_dict, interval
+
+
+def compute_stft_spectra(df: pd.DataFrame, segment_size: int, hop: int = None, window: str = "hann",
+                         scaling: str = "amplitude", workers: int = None):
+    """Compute the scaled complex spectra behind ``compute_stft``.
+
+    ``np.abs`` of each spectrum is the corresponding array of ``compute_stft``.
+    Use ``rotate_spectra`` to derive rotated channels without another FFT.
+
+    Parameters
+    ----------
+    df, segment_size, hop, window, scaling, workers
+        As in ``compute_stft``.
+
+    Returns
+    -------
+    tuple
+        ``(freqs, times, spectra, interval)`` where ``spectra`` maps column names
+        to complex arrays of shape ``(len(freqs), len(times))``.
+    """
+    interval, hop, numeric_cols, n_segments = _stft_input(df, segment_size, hop)
+    if n_segments == 0:
+        return np.array([]), np.array([]), {}, interval
+
+    freqs = np.fft.rfftfreq(segment_size, d=interval)
+    times = np.arange(n_segments) * hop * interval
+    if not numeric_cols:
+        return freqs, times, {}, interval
+
+    win = _window(window, segment_size)
+    scale = _window_scale(win, scaling)
+
+    matrix = _channel_matrix(df, numeric_cols, (n_segments - 1) * hop + segment_size)
+    segments = _segment_view(matrix, segment_size, hop)
+    spectra = _rfft(segments * win, workers=workers)
+    spectra *= scale
+    spectra[..., 0] /= 2
+    if segment_size % 2 == 0:
+        spectra[..., -1] /= 2
+
+    return freqs, times, {col: spectra[i].T for i, col in enumerate(numeric_cols)}, interval
+
+
+def compute_welch_psd(df: pd.DataFrame, segment_size: int, hop: int = None, window: str = "hann", workers: int = None):
+    """Estimate the power spectral density with Welch's method.
+
+    The periodograms of the overlapping windowed segments are averaged. The
+    segments are transformed in blocks so that high overlap does not multiply
+    peak memory. The result matches ``scipy.signal.welch`` with
+    ``detrend=False`` and ``scaling="density"``.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame containing numeric columns. Time columns are skipped.
+    segment_size : int
+        Number of samples per segment.
+    hop : int, optional
+        Number of samples between segment starts. Defaults to ``segment_size // 2``.
+    window : str, optional
+        Window function, a key of ``WINDOW_FUNCTIONS`` or a scipy window name.
+    workers : int, optional
+        Number of threads for the FFT (``-1`` uses all cores). Single-threaded by default.
+
+    Returns
+    -------
+    tuple
+        ``(freqs, psd_df, interval)`` where ``psd_df`` holds the one-sided PSD
+        (unit²/Hz) of each column.
+    """
+    interval, hop, numeric_cols, n_segments = _stft_input(df, segment_size, hop)
+    if n_segments == 0 or not numeric_cols:
+        return np.array([]), pd.DataFrame(), interval
+
+    freqs = np.fft.rfftfreq(segment_size, d=interval)
+    win = _window(window, segment_size)
+    matrix = _channel_matrix(df, numeric_cols, (n_segments - 1) * hop + segment_size)
+    segments = _segment_view(matrix, segment_size, hop)
+
+    power = np.zeros((len(numeric_cols), len(freqs)))
+    block = max(1, WELCH_BLOCK_SAMPLES // (segment_size * len(numeric_cols)))
+    for start in range(0, n_segments, block):
+        spectra = _rfft(segments[:, start:start + block] * win, workers=workers)
+        power += np.sum(spectra.real ** 2 + spectra.imag ** 2, axis=1)
 
+    psd = power / n_segments * interval / np.sum(win ** 2)
+    # 片側スペクトルにするため DC とナイキスト以外を2倍する
+    psd[:, 1:] *= 2
+    if segment_size % 2 == 0:
+        psd[:, -1] /= 2
+
+    return freqs, pd.DataFrame(psd.T, columns=numeric_cols), interval
+
+
+def compute_spectrogram_chunked(chunks, segment_size: int, out_dir: str, columns=None, hop: int = None,
+                                window: str = "boxcar", scaling: str = "amplitude", interval: float = None,
+                                workers: int = None):
+    """Compute a spectrogram from chunked input into memory-mapped files.
+
+    The samples that do not complete a segment at the end of a chunk are
+    carried over to the next one, and with ``hop`` longer than the segment the
+    samples up to the next segment start are skipped across chunks, so the
+    result equals ``compute_stft`` over the concatenated input. Each channel's amplitude rows are appended to
+    ``spec_XXXX.f32`` as they are computed. Peak memory is bounded by the
+    chunk size, whatever the recording length.
+
+    The files are written into a temporary directory next to ``out_dir`` that
+    is moved into place once finished, so an interrupted run or a concurrent
+    writer never leaves a partial result there. When ``out_dir`` already
+    holds a finished result (``meta.json``), it is reopened without reading
+    the chunks.
+
+    Parameters
+    ----------
+    chunks : iterable of pd.DataFrame
+        Consecutive blocks of the signal, e.g. from ``file_loader.open_csv_chunks``.
+    segment_size : int
+        Number of samples per segment.
+    out_dir : str
+        Directory for the result files.
+    columns : list, optional
+        Channels to transform. Numeric non-time columns of the first chunk by default.
+    hop : int, optional
+        Samples between segment starts. Defaults to ``segment_size`` (no overlap).
+    window, scaling : str, optional
+        Window function and correction, as in ``compute_stft``.
+    interval : float, optional
+        Sampling interval in seconds. Inferred from the first chunk by default.
+    workers : int, optional
+        Number of threads for the FFT (``-1`` uses all cores). Single-threaded by default.
+
+    Returns
+    -------
+    tuple
+        ``(freqs, times, spec_dict, interval)`` as in ``compute_fft_segments``. The
+        arrays in ``spec_dict`` are read-only ``np.memmap`` views of shape
+        ``(len(freqs), len(times))``, so slices are read from disk on demand.
+    """
+    if os.path.exists(os.path.join(out_dir, "meta.json")):
+        return open_spectrogram(out_dir)
+
+    hop = segment_size if hop is None else int(hop)
+    if hop < 1:
+        raise ValueError("hop must be at least 1")
+    win = _window(window, segment_size)
+    scale = _window_scale(win, scaling)
+    n_freqs = segment_size // 2 + 1
+
+    tmp_dir = make_temp_dir(os.path.dirname(os.path.abspath(out_dir)))
+    files = []
+    carry = None
+    skip = 0
+    n_segments = 0
+    try:
+        for chunk in chunks:
+            if columns is None:
+                columns = [col for col in chunk.select_dtypes(include=[float, int]).columns if col not in TIME_COLUMNS]
+            if not files:
+                files = [open(os.path.join(tmp_dir, f"spec_{i:04d}.f32"), "wb") for i in range(len(columns))]
+            if interval is None:
+                interval = _infer_sampling_interval(chunk)
+            matrix = _channel_matrix(chunk, columns, len(chunk))
+            if skip:
+                # hop が区間より長い場合、次の区間の開始位置までのサンプルを読み飛ばす
+                skipped = min(skip, matrix.shape[1])
+                matrix = matrix[:, skipped:]
+                skip -= skipped
+            if carry is not None and carry.shape[1]:
+                # 前のチャンクで区間にならなかったサンプルを先頭に繋げる
+                matrix = np.concatenate([carry, matrix], axis=1)
+            count = (matrix.shape[1] - segment_size) // hop + 1 if matrix.shape[1] >= segment_size else 0
+            if count:
+                segments = _segment_view(matrix, segment_size, hop)[:, :count]
+                amplitude = np.abs(_rfft(segments * win, workers=workers)) * scale
+                amplitude[..., 0] /= 2
+                if segment_size % 2 == 0:
+                    amplitude[..., -1] /= 2
+                for f, values in zip(files, amplitude.astype(np.float32)):
+                    f.write(values.tobytes())
+                n_segments += count
+            carry = matrix[:, count * hop:].copy()
+            skip += max(0, count * hop - matrix.shape[1])
+        for f in files:
+            f.close()
+
+        meta = {
+            "columns": list(columns or []),
+            "segments": n_segments,
+            "freqs": n_freqs,
+            "segment_size": segment_size,
+            "hop": hop,
+            "interval": 1.0 if interval is None else interval,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+    except BaseException:
+        # 再実行などで中断された場合も書きかけのファイルを残さない
+        for f in files:
+            f.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    publish_dir(tmp_dir, out_dir)
+    return open_spectrogram(out_dir)
+
+
+def open_spectrogram(out_dir: str):
+    """Open a result written by ``compute_spectrogram_chunked``.
+
+    Returns
+    -------
+    tuple
+        ``(freqs, times, spec_dict, interval)`` with ``np.memmap`` views in ``spec_dict``.
+    """
+    meta_path = os.path.join(out_dir, "meta.json")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    # キャッシュの LRU 用にアクセス時刻を更新
+    os.utime(meta_path)
+
+    interval = meta["interval"]
+    freqs = np.fft.rfftfreq(meta["segment_size"], d=interval)
+    times = np.arange(meta["segments"]) * meta["hop"] * interval
+    spec_dict = {}
+    if meta["segments"]:
+        for i, col in enumerate(meta["columns"]):
+            spec = np.memmap(os.path.join(out_dir, f"spec_{i:04d}.f32"), dtype=np.float32, mode="r",
+                             shape=(meta["segments"], meta["freqs"]))
+            spec_dict[col] = spec.T
     return freqs, times, spec_dict, interval
 
+
+def compute_zoom_fft(df: pd.DataFrame, start_sec: float, sample_size: int, f_min: float, f_max: float,
+                     resolution: float = None, n_bins: int = None, window: str = "boxcar"):
+    """Compute the amplitude spectrum over a frequency band with the chirp-z transform.
+
+    Only the bins between ``f_min`` and ``f_max`` are evaluated
+    (``scipy.signal.ZoomFFT``), so a fine bin spacing in a narrow band does not
+    need a full-band transform padded to the same spacing. Note that the
+    physical resolution is still ``1 / (sample_size * interval)``; a finer bin
+    spacing interpolates the spectrum.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame containing acceleration columns and optionally a time column.
+    start_sec : float
+        Start time in seconds. Moved back when the window would run past the end.
+    sample_size : int
+        Number of samples to use.
+    f_min, f_max : float
+        Frequency band in Hz, within ``[0, 1 / (2 * interval)]``.
+    resolution : float, optional
+        Bin spacing in Hz. Ignored when ``n_bins`` is given.
+    n_bins : int, optional
+        Number of output bins including both band edges. Defaults to the bins of
+        a plain FFT of ``sample_size`` samples that fall in the band, capped at
+        ``MAX_ZOOM_FFT_BINS``.
+    window : str, optional
+        Window function, a key of ``WINDOW_FUNCTIONS`` or a scipy window name.
+        The amplitude is corrected for its coherent gain.
+
+    Returns
+    -------
+    tuple
+        ``(freqs, amp_df, interval)`` as in ``compute_fft``. ``amp_df.attrs`` holds
+        ``start_sec``, ``n_samples``, ``resolution`` and ``bin_spacing``.
+
+    Raises
+    ------
+    ValueError
+        If ``resolution`` or ``n_bins`` asks for more than ``MAX_ZOOM_FFT_BINS`` bins.
+    """
+    from scipy.signal import ZoomFFT
+
+    interval, start_index, end_index = _fft_window(df, start_sec, sample_size)
+    n = end_index - start_index
+    fs = 1 / interval
+    f_min, f_max = max(0.0, f_min), min(fs / 2, f_max)
+    if n <= 0 or f_max <= f_min:
+        return np.array([]), pd.DataFrame(), interval
+
+    if n_bins is None and not resolution:
+        n_bins = min(int(round((f_max - f_min) * n / fs)) + 1, MAX_ZOOM_FFT_BINS)
+    elif n_bins is None:
+        n_bins = int(round((f_max - f_min) / resolution)) + 1
+    n_bins = max(2, int(n_bins))
+    if n_bins > MAX_ZOOM_FFT_BINS:
+        raise ValueError(f"周波数ビン数 {n_bins} が上限 {MAX_ZOOM_FFT_BINS} を超えています。周波数の刻みを大きくしてください。")
+    freqs = np.linspace(f_min, f_max, n_bins)
+
+    win = _window(window, n)
+    zoom = ZoomFFT(n, [f_min, f_max], n_bins, fs=fs, endpoint=True)
+    columns = [col for col in df.select_dtypes(include=[float, int]).columns if col not in TIME_COLUMNS]
+    amplitude = np.empty((n_bins, len(columns)))
+    for i, col in enumerate(columns):
+        values = df[col].to_numpy()[start_index:end_index].astype(float, copy=False)
+        amplitude[:, i] = np.abs(zoom(values * win))
+    amplitude *= 2 / np.sum(win)
+    # DC とナイキスト周波数は片側スペクトルの2倍を戻す
+    amplitude[np.isclose(freqs, 0) | np.isclose(freqs, fs / 2)] /= 2
+
+    amp_df = pd.DataFrame(amplitude, columns=columns, copy=False)
+    amp_df.attrs.update({
+        "start_sec": start_index * interval,
+        "n_samples": n,
+        "resolution": 1 / (n * interval),
+        "bin_spacing": (f_max - f_min) / (n_bins - 1),
+    })
+    return freqs, amp_df, interval
+
+
+def cached_spectrum(func, df: pd.DataFrame, *args, **kwargs):
+    """Call a spectrum function through ``spectrum_cache``.
+
+    The key combines the function name, ``frame_fingerprint(df)`` (which covers
+    the column selection) and the remaining arguments such as start time,
+    sample size, window and hop, so reruns with unchanged inputs are served
+    from the cache.
+
+    Parameters
+    ----------
+    func : callable
+        ``compute_fft``, ``compute_fft_segments``, ``compute_stft`` or ``compute_welch_psd``.
+    df : pd.DataFrame
+        Input passed to ``func``.
+    *args, **kwargs
+        Remaining arguments of ``func``.
+
+    Returns
+    -------
+    tuple
+        The result of ``func``. Cached arrays are shared and must not be modified.
+    """
+    return _call_cached(spectrum_cache, func, df, args, kwargs)
+
+
+def cached_metrics(func, df: pd.DataFrame, *args, **kwargs):
+    """Call an acceleration metric function through ``metrics_cache``.
+
+    The key is built as in ``cached_spectrum``.
+
+    Parameters
+    ----------
+    func : callable
+        ``rolling_accel_metrics`` or ``sweep_rotation_angles``.
+    df : pd.DataFrame
+        Input passed to ``func``.
+    *args, **kwargs
+        Remaining arguments of ``func``.
+
+    Returns
+    -------
+    pd.DataFrame
+        The result of ``func``. Cached frames are shared and must not be modified.
+    """
+    return _call_cached(metrics_cache, func, df, args, kwargs)
+
+
+def _call_cached(cache: MemoryLRUCache, func, df: pd.DataFrame, args: tuple, kwargs: dict):
+    """Call ``func(df, *args, **kwargs)`` through ``cache``, keyed by its name, the data fingerprint and the arguments."""
+    # ワーカー数は結果に影響しないのでキーに含めない
+    params = tuple(sorted((name, value) for name, value in kwargs.items() if name != "workers"))
+    key = (func.__name__, frame_fingerprint(df), args, params)
+    return cache.get_or_compute(key, lambda: func(df, *args, **kwargs))
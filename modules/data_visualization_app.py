@@ -2,17 +2,33 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
-from modules.data_loader import load_data
+from modules.data_loader import load_data, frame_memo, load_spectrogram_on_disk, load_pyramid, is_excel_file, list_uploaded_sheets
+from modules.batch_loader import BATCH_KEY_COLUMN
 from modules.state_manager import initialize_session_state, merge_settings, load_user_settings, load_config
-from modules.ui_components import file_uploader, graph_type_selector, add_setting_buttons
+from modules.ui_components import file_uploader, excel_range_selector, graph_type_selector, add_setting_buttons
 from modules.filters import filter_dataframe
-from modules.plot import create_plot, create_fft_heatmap, create_fft_plot
+from modules.plot import figure_cache, figure_html, line_chart_columns, create_plot, create_fft_heatmap, create_fft_plot, create_angle_sweep_plot, create_rolling_metrics_plot, create_window_preview_plot
 from modules.utils import download_chart_html, show_dataframe
+from modules.downsampling import DEFAULT_MAX_POINTS, reduce_heatmap
 from modules.data_processing import (
     rotate_xy,
+    as_float,
     calc_accel_metrics,
+    sweep_rotation_angles,
+    rolling_accel_metrics,
     compute_fft_segments,
     compute_fft,
+    compute_fft_spectra,
+    compute_stft,
+    compute_stft_spectra,
+    rotate_spectra,
+    compute_welch_psd,
+    compute_zoom_fft,
+    WINDOW_FUNCTIONS,
+    cached_spectrum,
+    cached_metrics,
+    spectrum_cache,
+    metrics_cache,
     _infer_sampling_interval,
 )
 from modules.ui_customizer import customize_chart_settings
@@ -21,6 +37,48 @@ from modules.help_content import render_help_tab
 config = load_config()
 user_settings = load_user_settings()
 
+def raw_spectrum_input(accel_df):
+    """
+    Return the unrotated channels when the X/Y spectra can be derived by rotating cached spectra.
+
+    The FFT is linear, so the complex spectra of ``X_raw`` and ``Y_raw`` are
+    computed once and combined for every rotation angle.
+
+    Args:
+    accel_df (pd.DataFrame): Converted acceleration data.
+
+    Returns:
+    pd.DataFrame or None: ``X_raw``, ``Y_raw`` and, if present, ``Z`` and ``Time``. None when X or Y is not selected.
+    """
+    if "X_raw" not in accel_df.columns or "Y_raw" not in accel_df.columns:
+        return None
+    return accel_df[[col for col in ["X_raw", "Y_raw", "Z", "Time"] if col in accel_df.columns]]
+
+
+def load_accel_pyramid(accel_df, x_col, columns):
+    """
+    Return the line chart pyramid of converted acceleration data.
+
+    Columns that do not depend on the rotation angle are identified without
+    it, so their pyramid is built and written once. A pyramid of rotated X/Y
+    channels is rebuilt for each angle and only kept in memory.
+
+    Args:
+    accel_df (pd.DataFrame): Converted acceleration data.
+    x_col (str): Column used for the X axis.
+    columns (list): Columns drawn as lines.
+
+    Returns:
+    MinMaxPyramid or None: As returned by ``load_pyramid``.
+    """
+    identity = st.session_state.get("accel_df_key")
+    rotated = "X_raw" in accel_df.columns and "Y_raw" in accel_df.columns
+    if rotated and any(col in ("X", "Y") for col in [x_col, *columns]):
+        return load_pyramid(accel_df, x_col, columns, identity=identity, persist=False)
+    # 角度（識別子の最後の要素）を除く
+    return load_pyramid(accel_df, x_col, columns, identity=None if identity is None else identity[:-1])
+
+
 # グラフタイプと設定ファイル内のキーをマッピングする辞書
 chart_type_mapping = {
     "折れ線グラフ": "line_chart",
@@ -30,6 +88,12 @@ chart_type_mapping = {
     "ヒストグラム": "histogram"
 }
 
+# 任意の時間のFFTで選べる最大サンプル数（2のべき乗の指数）
+MAX_FFT_POWER = 22
+
+# ディスクに書き出したFFT結果の既定の表示区間数
+HEATMAP_VIEW_SEGMENTS = 2000
+
 # 目的選択肢のリスト（将来的に追加予定）
 purpose_options = ["加速度"]
 
@@ -61,7 +125,10 @@ def app():
 
     with tab1:
         # データのロード
-        df = load_data(file_uploader())
+        uploaded_file = file_uploader()
+        # Excelファイルはシートとセル範囲を選んでから読み込む
+        excel_options = excel_range_selector(list_uploaded_sheets(uploaded_file)) if is_excel_file(uploaded_file) else ()
+        df = load_data(uploaded_file, excel_options)
 
         if df is not None:
             # filter
@@ -89,6 +156,9 @@ def app():
                 st.session_state["selected_purpose"] = selected_purpose
 
                 if selected_purpose == "加速度":
+                    spectrum_cache.resize(int(st.session_state.get("fft_cache_max_mb", 256)) * 1024 * 1024)
+                    # FFTのスレッド数（-1で全コア）
+                    fft_workers = int(st.session_state.get("fft_workers", -1))
                     accel_cols = st.columns(3)
                     axis_options = ["使用しない"] + df.columns.to_list()
                     with accel_cols[0]:
@@ -131,9 +201,9 @@ def app():
 
                     accel_data = {}
                     if x_col != "使用しない":
-                        accel_data["X_raw"] = df[x_col].astype(float)
+                        accel_data["X_raw"] = as_float(df[x_col])
                     if y_col != "使用しない":
-                        accel_data["Y_raw"] = df[y_col].astype(float)
+                        accel_data["Y_raw"] = as_float(df[y_col])
                     if x_col != "使用しない" and y_col != "使用しない":
                         rot_df = rotate_xy(df, x_col, y_col, angle)
                         accel_data["X"] = rot_df["x_rot"]
@@ -144,12 +214,21 @@ def app():
                         if y_col != "使用しない":
                             accel_data["Y"] = accel_data["Y_raw"]
                     if z_col != "使用しない":
-                        accel_data["Z"] = df[z_col].astype(float)
+                        accel_data["Z"] = as_float(df[z_col])
 
                     accel_data["Time"] = time_series
                     accel_df = pd.DataFrame(accel_data)
 
                     st.session_state["accel_df"] = accel_df
+                    # フィルタをかけていなければ、読み込んだデータの識別子と変換の設定で変換後データを識別する
+                    origin_key = st.session_state.get("df_origin_key")
+                    if origin_key is None or df is not st.session_state["df_origin"]:
+                        st.session_state["accel_df_key"] = None
+                    else:
+                        accel_interval = st.session_state.get("accel_interval") if time_col == "使用しない" else None
+                        # 回転角度に依存しない列（X_raw, Y_raw, Z, Time）は角度を含まない識別子で扱う
+                        raw_key = origin_key + ("accel", x_col, y_col, z_col, time_col, unit, accel_interval)
+                        st.session_state["accel_df_key"] = raw_key + (angle,)
 
                     with st.expander("変換後データ"):
                         st.dataframe(accel_df)
@@ -160,6 +239,49 @@ def app():
 最大値: {metrics['max']:.5g}, 最小値: {metrics['min']:.5g}, \
 peak to peak: {metrics['p2p']:.5g}"
                             )
+                        # 移動窓ごとの評価値を時系列で表示する
+                        if st.checkbox("移動窓の評価値を表示する", key="accel_rolling_checkbox"):
+                            rolling_interval = _infer_sampling_interval(accel_df)
+                            rolling_cols = st.columns(3)
+                            with rolling_cols[0]:
+                                window_sec = st.number_input(
+                                    "窓の長さ(sec)",
+                                    min_value=float(rolling_interval),
+                                    value=max(float(rolling_interval), 1.0),
+                                    format="%.6g",
+                                    key="accel_rolling_window_input",
+                                )
+                            with rolling_cols[1]:
+                                overlap = st.checkbox("窓を1サンプルずつずらす", key="accel_rolling_overlap_checkbox")
+                            with rolling_cols[2]:
+                                rolling_metric = st.selectbox("評価値", ["rms", "max", "min", "p2p"], key="accel_rolling_metric_selectbox")
+                            window = max(1, int(round(window_sec / rolling_interval)))
+                            rolling_df = cached_metrics(
+                                rolling_accel_metrics,
+                                accel_df[[col for col in ["X", "Y", "Z", "Time"] if col in accel_df.columns]],
+                                window,
+                                step=1 if overlap else window,
+                            )
+                            st.plotly_chart(create_rolling_metrics_plot(rolling_df, rolling_metric))
+
+                    if "X_raw" in accel_df.columns and "Y_raw" in accel_df.columns:
+                        with st.expander("角度スイープ（主軸の探索）"):
+                            sweep_cols = st.columns(2)
+                            with sweep_cols[0]:
+                                sweep_step = st.number_input(
+                                    "角度の刻み(deg)", min_value=0.01, max_value=10.0, value=0.1, step=0.1, key="accel_sweep_step_input"
+                                )
+                            with sweep_cols[1]:
+                                sweep_metric = st.selectbox("評価値", ["rms", "max", "min", "p2p"], key="accel_sweep_metric_selectbox")
+                            # 回転角度に依存しない入力でキャッシュする
+                            sweep_df = cached_metrics(sweep_rotation_angles, accel_df[["X_raw", "Y_raw"]], "X_raw", "Y_raw", step=sweep_step)
+                            principal = sweep_df.attrs["principal_angle"]
+                            worst_angle = sweep_df[f"X_{sweep_metric}"].abs().idxmax()
+                            st.write(
+                                f"主軸（X軸の実効値が最大）: {principal:.2f}°, "
+                                f"X軸の{sweep_metric}が最大となる角度: {worst_angle:.2f}°"
+                            )
+                            st.plotly_chart(create_angle_sweep_plot(sweep_df, sweep_metric, principal))
 
                     # Toggle to show FFT result at arbitrary start time
                     fft_single_toggle = st.toggle(
@@ -187,24 +309,115 @@ peak to peak: {metrics['p2p']:.5g}"
                             )
                             st.session_state["fft_start_sec"] = start_sec
 
-                            sample_options = [2 ** i for i in range(6, 13)]
-                            sample_size = st.select_slider(
-                                "計算するサンプリング数",
-                                options=sample_options,
-                                value=st.session_state.get("fft_sample_size", 256),
-                                key="fft_sample_size_slider_single",
+                            # 2のべき乗に限らず任意の長さ（データ長まで）を指定できる
+                            sample_mode = st.radio(
+                                "サンプル数の指定",
+                                ["2のべき乗", "任意の長さ"],
+                                horizontal=True,
+                                key="fft_sample_mode_radio",
                             )
+                            stored_size = st.session_state.get("fft_sample_size", 256)
+                            if sample_mode == "2のべき乗":
+                                sample_options = [2 ** i for i in range(6, MAX_FFT_POWER + 1) if i == 6 or 2 ** i <= len(accel_df)]
+                                sample_size = st.select_slider(
+                                    "計算するサンプリング数",
+                                    options=sample_options,
+                                    value=stored_size if stored_size in sample_options else sample_options[min(2, len(sample_options) - 1)],
+                                    key="fft_sample_size_slider_single",
+                                )
+                            else:
+                                sample_size = int(st.number_input(
+                                    "計算するサンプリング数",
+                                    min_value=2,
+                                    max_value=max(2, len(accel_df)),
+                                    value=min(max(2, int(stored_size)), max(2, len(accel_df))),
+                                    step=1,
+                                    key="fft_sample_size_input",
+                                ))
                             st.session_state["fft_sample_size"] = sample_size
-
-                            freqs, amp_df, interval = compute_fft(
-                                accel_df[[col for col in ["X", "Y", "Z", "Time"] if col in accel_df.columns]],
-                                start_sec,
-                                sample_size,
-                            )
+                            # 全体の波形をピラミッドから描き、FFTの区間を重ねて表示する
+                            # 回転前の入力から描き、角度を変えてもピラミッドを作り直さない
+                            if "Time" in accel_df.columns:
+                                preview_cols = [col for col in ["X_raw", "Y_raw", "Z"] if col in accel_df.columns]
+                                pyramid = load_accel_pyramid(accel_df, "Time", preview_cols)
+                                if pyramid is not None:
+                                    preview_df = pyramid.query_frame(preview_cols, max_points=1000, x_col="Time")
+                                    st.plotly_chart(create_window_preview_plot(preview_df, "Time", start_sec, start_sec + sample_size * interval))
+                            # 周波数範囲を指定すると、その帯域だけをズームFFT（チャープZ変換）で計算する
+                            zoom = st.checkbox("周波数範囲を指定する（ズームFFT）", key="fft_zoom_checkbox")
+                            fft_input = accel_df[[col for col in ["X", "Y", "Z", "Time"] if col in accel_df.columns]]
+                            if zoom:
+                                nyquist = 0.5 / interval
+                                zoom_cols = st.columns(4)
+                                with zoom_cols[0]:
+                                    f_min = st.number_input("下限周波数(Hz)", min_value=0.0, max_value=nyquist, value=0.0, key="fft_zoom_min_input")
+                                with zoom_cols[1]:
+                                    f_max = st.number_input("上限周波数(Hz)", min_value=0.0, max_value=nyquist, value=nyquist, key="fft_zoom_max_input")
+                                with zoom_cols[2]:
+                                    # 細かすぎる刻みは出力点数が膨大になるため、最大のFFT長の分解能までとする
+                                    zoom_resolution = st.number_input(
+                                        "周波数の刻み(Hz)",
+                                        min_value=2 * nyquist / 2 ** MAX_FFT_POWER,
+                                        value=None,
+                                        format="%.6f",
+                                        placeholder="サンプル数から決まる分解能",
+                                        help="空欄の場合はサンプル数から決まる分解能を使います。",
+                                        key="fft_zoom_resolution_input",
+                                    )
+                                with zoom_cols[3]:
+                                    zoom_window = st.selectbox("窓関数", list(WINDOW_FUNCTIONS), index=0, key="fft_zoom_window_selectbox")
+                                if f_max <= f_min:
+                                    st.warning("上限周波数は下限周波数より大きくしてください。")
+                                    freqs = np.array([])
+                                else:
+                                    freqs, amp_df, interval = cached_spectrum(
+                                        compute_zoom_fft,
+                                        fft_input,
+                                        start_sec,
+                                        sample_size,
+                                        f_min,
+                                        f_max,
+                                        resolution=zoom_resolution,
+                                        window=zoom_window,
+                                    )
+                            else:
+                                pad = st.checkbox("高速なFFT長までゼロ詰めする", key="fft_pad_checkbox")
+                                raw_input = raw_spectrum_input(accel_df)
+                                if raw_input is not None:
+                                    # 回転前の複素スペクトルをキャッシュし、角度を変えてもFFTをやり直さない
+                                    freqs, spectra, interval, attrs = cached_spectrum(
+                                        compute_fft_spectra,
+                                        raw_input,
+                                        start_sec,
+                                        sample_size,
+                                        workers=fft_workers,
+                                        pad=pad,
+                                    )
+                                    amp_df = pd.DataFrame(rotate_spectra(spectra, angle), copy=False)
+                                    amp_df.attrs.update(attrs)
+                                else:
+                                    freqs, amp_df, interval = cached_spectrum(
+                                        compute_fft,
+                                        fft_input,
+                                        start_sec,
+                                        sample_size,
+                                        workers=fft_workers,
+                                        pad=pad,
+                                    )
                             if len(freqs) > 0:
                                 fft_fig = create_fft_plot(freqs, amp_df)
                                 st.plotly_chart(fft_fig)
                                 st.write(f"Sampling interval inferred as {interval} seconds.")
+                                st.write(
+                                    f"周波数分解能: {amp_df.attrs['resolution']:.6g} Hz "
+                                    f"（サンプル数 {amp_df.attrs['n_samples']}, "
+                                    + (f"FFT長 {amp_df.attrs['n_fft']}, " if "n_fft" in amp_df.attrs else f"出力点数 {len(freqs)}, ")
+                                    + f"ビン間隔 {amp_df.attrs['bin_spacing']:.6g} Hz）"
+                                )
+                                if abs(amp_df.attrs["start_sec"] - start_sec) > interval:
+                                    st.info(f"データの終端を超えるため、開始時間を {amp_df.attrs['start_sec']:.6g} 秒に移動しました。")
+                                cache_stats = spectrum_cache.stats()
+                                st.caption(f"FFT cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
             
             # グラフの種類を選択
             chart_type = graph_type_selector(st.session_state['data_type'])
@@ -212,7 +425,10 @@ peak to peak: {metrics['p2p']:.5g}"
             # グラフ設定の読み込み
             chart_key = chart_type_mapping.get(chart_type, "default_settings")
 
-            plot_df = st.session_state.get("accel_df") if st.session_state.get("selected_purpose") == "加速度" else st.session_state['df_origin']
+            if st.session_state.get("selected_purpose") == "加速度":
+                plot_df, plot_key = st.session_state.get("accel_df"), st.session_state.get("accel_df_key")
+            else:
+                plot_df, plot_key = st.session_state['df_origin'], st.session_state.get('df_origin_key')
 
             # X軸の選択
             if chart_type == 'ヒートマップ':
@@ -222,12 +438,13 @@ peak to peak: {metrics['p2p']:.5g}"
             
             st.session_state['graph_settings'][chart_key]['x_axis'] = x_axis
 
-            # Y軸の選択
+            # Y軸の選択（一括読み込みのファイル列は既定値から除く）
             y_axis = []
+            value_columns = [col for col in plot_df.columns if col != BATCH_KEY_COLUMN]
             if st.session_state['data_type'] == 'GRAPHTEC':
-                y_axis = st.multiselect("Y軸を選択", plot_df.columns, plot_df.columns.to_list()[3:-3], key="y_axis_selectbox")
+                y_axis = st.multiselect("Y軸を選択", plot_df.columns, value_columns[3:-3], key="y_axis_selectbox")
             elif st.session_state['data_type'] == 'NR600':
-                y_axis = st.multiselect("Y軸を選択", plot_df.columns, plot_df.columns.to_list()[1:], key="y_axis_selectbox")
+                y_axis = st.multiselect("Y軸を選択", plot_df.columns, value_columns[1:], key="y_axis_selectbox")
             elif chart_type == 'ヒートマップ':
                 y_axis_list = ['dataframe index', plot_df.columns[0]]
                 y_axis = st.selectbox("Y軸を選択", y_axis_list, key="y_axis_selectbox")
@@ -285,11 +502,21 @@ peak to peak: {metrics['p2p']:.5g}"
                     if st.session_state['graph_settings'][chart_key]['y_axis_title'] == '':
                         st.session_state['graph_settings'][chart_key]['y_axis_title'] = ", ".join(st.session_state['graph_settings'][chart_key]['y_axis'])
 
+            # 間引き表示する折れ線グラフは、読み込んだデータごとに作ったピラミッドから描く
+            graph_settings = st.session_state['graph_settings'][chart_key]
+            pyramid = None
+            if chart_type == '折れ線グラフ' and len(plot_df) > int(st.session_state.get("line_max_points", DEFAULT_MAX_POINTS)):
+                if st.session_state.get("selected_purpose") == "加速度":
+                    pyramid = load_accel_pyramid(plot_df, graph_settings['x_axis'], line_chart_columns(graph_settings))
+                else:
+                    pyramid = load_pyramid(plot_df, graph_settings['x_axis'], line_chart_columns(graph_settings), identity=plot_key)
+
             # グラフの作成と表示
-            fig, graph_title = create_plot(chart_type, plot_df, st.session_state['graph_settings'][chart_key])
+            data_key = None if plot_key is None else plot_key + (len(plot_df),)
+            fig, graph_title = create_plot(chart_type, plot_df, graph_settings, pyramid=pyramid, data_key=data_key)
             if fig:
                 st.plotly_chart(fig)
-                download_chart_html(fig, 'グラフのダウンロード', key='download_chart_html')
+                download_chart_html(fig, 'グラフのダウンロード', key='download_chart_html', html=figure_html(fig))
 
                 if st.session_state.get("selected_purpose") == "加速度":
                     fft_toggle = st.toggle(
@@ -298,29 +525,119 @@ peak to peak: {metrics['p2p']:.5g}"
 
                     if fft_toggle:
                         sample_options = [2 ** i for i in range(6, 13)]
+                        stored_size = st.session_state.get("fft_sample_size", 256)
                         sample_size = st.select_slider(
                             "計算するサンプリング数",
                             options=sample_options,
-                            value=st.session_state.get("fft_sample_size", 256),
+                            value=stored_size if stored_size in sample_options else 256,
                             key="fft_sample_size_slider",
                         )
                         st.session_state["fft_sample_size"] = sample_size
 
+                        # 解析方法の選択（区間ごとのFFT、窓関数付きSTFT、Welch法のPSD）
+                        fft_method = st.radio(
+                            "解析方法",
+                            ["区間FFT", "STFT（窓関数・オーバーラップ）", "Welch PSD"],
+                            horizontal=True,
+                            key="fft_method_radio",
+                        )
+                        if fft_method != "区間FFT":
+                            stft_cols = st.columns(3)
+                            with stft_cols[0]:
+                                window = st.selectbox("窓関数", list(WINDOW_FUNCTIONS), index=1, key="fft_window_selectbox")
+                            with stft_cols[1]:
+                                overlap = st.slider("オーバーラップ(%)", min_value=0, max_value=90, value=50, step=5, key="fft_overlap_slider")
+                            with stft_cols[2]:
+                                if fft_method == "Welch PSD":
+                                    log_y = st.checkbox("対数軸", value=True, key="fft_psd_log_checkbox")
+                                else:
+                                    scaling = st.radio("補正", ["振幅", "エネルギー"], horizontal=True, key="fft_scaling_radio")
+                            hop = max(1, round(sample_size * (1 - overlap / 100)))
+
                         accel_df = st.session_state.get("accel_df")
-                        if accel_df is not None:
-                            freqs, times, spec_dict, interval = compute_fft_segments(
+                        if accel_df is not None and fft_method == "Welch PSD":
+                            freqs, psd_df, interval = cached_spectrum(
+                                compute_welch_psd,
                                 accel_df[[col for col in ["X", "Y", "Z", "Time"] if col in accel_df.columns]],
                                 sample_size,
+                                hop=hop,
+                                window=window,
+                                workers=fft_workers,
                             )
+                            st.session_state["fft_heatmap_results"] = []
+                            if len(freqs) > 0:
+                                psd_fig = create_fft_plot(freqs, psd_df, title="パワースペクトル密度（Welch法）", yaxis_title="PSD(unit²/Hz)", log_y=log_y)
+                                st.plotly_chart(psd_fig)
+                                download_chart_html(psd_fig, "Welch_PSD", key="download_welch_psd", html=figure_html(psd_fig))
+                                st.write(f"Sampling interval inferred as {interval} seconds.")
+                        elif accel_df is not None:
+                            fft_input = accel_df[[col for col in ["X", "Y", "Z", "Time"] if col in accel_df.columns]]
+                            # 長時間データは結果をディスクに書き出し、表示する範囲だけ読み込む
+                            out_of_core = st.checkbox("結果をディスクに書き出す（長時間データ用）", key="fft_out_of_core_checkbox")
+                            if fft_method == "区間FFT":
+                                spectrum_params = dict(hop=sample_size, window="boxcar", scaling="amplitude")
+                            else:
+                                spectrum_params = dict(hop=hop, window=window, scaling="amplitude" if scaling == "振幅" else "energy")
+                            raw_input = raw_spectrum_input(accel_df)
+                            if out_of_core:
+                                freqs, times, spec_dict, interval = load_spectrogram_on_disk(fft_input, sample_size, workers=fft_workers, **spectrum_params)
+                            elif raw_input is not None:
+                                # 回転前の複素スペクトルから任意の角度のX/Yを合成する
+                                freqs, times, spectra, interval = cached_spectrum(
+                                    compute_stft_spectra, raw_input, sample_size, workers=fft_workers, **spectrum_params
+                                )
+                                spec_dict = rotate_spectra(spectra, st.session_state.get("accel_angle", 0.0)) if spectra else {}
+                            elif fft_method == "区間FFT":
+                                freqs, times, spec_dict, interval = cached_spectrum(compute_fft_segments, fft_input, sample_size, workers=fft_workers)
+                            else:
+                                freqs, times, spec_dict, interval = cached_spectrum(compute_stft, fft_input, sample_size, workers=fft_workers, **spectrum_params)
                             fft_results = []
                             if len(freqs) > 0 and len(times) > 0:
+                                view = slice(None)
+                                time_range = None
+                                if len(times) > 1:
+                                    # ディスク上の結果は既定で先頭の区間だけを表示する
+                                    default_end = times[min(len(times), HEATMAP_VIEW_SEGMENTS) - 1] if out_of_core else times[-1]
+                                    time_range = st.slider(
+                                        "表示する時間範囲(sec)",
+                                        min_value=float(times[0]),
+                                        max_value=float(times[-1]),
+                                        value=(float(times[0]), float(default_end)),
+                                        key="fft_view_range_slider",
+                                    )
+                                    view = slice(np.searchsorted(times, time_range[0]), np.searchsorted(times, time_range[1], side="right"))
+                                freq_range = st.slider(
+                                    "表示する周波数範囲(Hz)",
+                                    min_value=float(freqs[0]),
+                                    max_value=float(freqs[-1]),
+                                    value=(float(freqs[0]), float(freqs[-1])),
+                                    key="fft_freq_range_slider",
+                                )
+                                # 画面の解像度までまとめてから描く（拡大した範囲は元の解像度で読み直す）
+                                reduce_cols = st.columns(3)
+                                with reduce_cols[0]:
+                                    pooling = st.radio("縮約方法", ["最大値", "平均値"], horizontal=True, key="fft_heatmap_pooling_radio")
+                                with reduce_cols[1]:
+                                    log_freq = st.checkbox("周波数を対数軸にする", key="fft_heatmap_log_freq_checkbox")
+                                with reduce_cols[2]:
+                                    db = st.checkbox("dB表示", key="fft_heatmap_db_checkbox")
                                 st.write("FFT結果:")
                                 for col, spec in spec_dict.items():
                                     if col != "Time":
-                                        heatmap_fig = create_fft_heatmap(freqs, times, spec, col)
+                                        heat_freqs, heat_times, heat_matrix = reduce_heatmap(
+                                            freqs, times, spec,
+                                            max_rows=int(st.session_state.get("heatmap_max_rows", 512)),
+                                            max_cols=int(st.session_state.get("heatmap_max_cols", 1024)),
+                                            method="max" if pooling == "最大値" else "mean",
+                                            log_freq=log_freq, db=db, freq_range=freq_range, time_range=time_range,
+                                        )
+                                        heatmap_fig = create_fft_heatmap(heat_freqs, heat_times, heat_matrix, col, log_freq=log_freq,
+                                                                         colorbar_title="dB" if db else None)
                                         st.plotly_chart(heatmap_fig)
-                                        download_chart_html(heatmap_fig, f"{col}_FFT_Heatmap", key=f'download_fft_heatmap_{col}')
-                                        spec_df = pd.DataFrame(spec, index=freqs, columns=times)
+                                        download_chart_html(heatmap_fig, f"{col}_FFT_Heatmap", key=f'download_fft_heatmap_{col}', html=figure_html(heatmap_fig))
+                                        # ディスク上の結果は表示範囲のみ読み込まれる。キャッシュされた配列はコピーせずに包む
+                                        spec = spec[:, view]
+                                        spec_df = pd.DataFrame(spec, index=freqs, columns=times[view], copy=False)
                                         fft_results.append((col, spec_df))
                                 st.write(f"Sampling interval inferred as {interval} seconds.")
                             st.session_state["fft_heatmap_results"] = fft_results
@@ -347,6 +664,9 @@ peak to peak: {metrics['p2p']:.5g}"
         with st.expander('session state'):
             st.write(st.session_state)
 
+        with st.expander('cache'):
+            st.write({'data': frame_memo.stats(), 'fft': spectrum_cache.stats(), 'metrics': metrics_cache.stats(), 'figure': figure_cache.stats()})
+
         with st.expander('config'):
             st.write(config)
 
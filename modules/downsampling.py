@@ -0,0 +1,508 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from modules.cache import make_temp_dir, publish_dir
+
+# 1系列あたりの既定の表示点数
+DEFAULT_MAX_POINTS = 4000
+DOWNSAMPLE_METHODS = ("minmax", "lttb")
+
+
+def _numeric_values(values):
+    """
+    Return ``values`` as a float array. Datetimes become nanoseconds and other non-numeric values NaN.
+    """
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values.to_numpy(dtype="datetime64[ns]").view(np.int64).astype(float)
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def minmax_indices(y, n_out):
+    """
+    Select the positions of the minimum and maximum of equal-sized bins.
+
+    Peaks are kept exactly, so the envelope of the line is unchanged.
+
+    Args:
+    y (array-like): Values of one series.
+    n_out (int): Upper bound of the number of returned positions.
+
+    Returns:
+    np.ndarray: Sorted positions into ``y``.
+    """
+    y = _numeric_values(y)
+    n = len(y)
+    n_bins = max(1, n_out // 2)
+    if n <= n_out or n_bins * 2 >= n:
+        return np.arange(n)
+    bin_size = -(-n // n_bins)
+    n_bins = -(-n // bin_size)
+    padded_max = np.full(n_bins * bin_size, -np.inf)
+    padded_min = np.full(n_bins * bin_size, np.inf)
+    valid = ~np.isnan(y)
+    padded_max[:n] = np.where(valid, y, -np.inf)
+    padded_min[:n] = np.where(valid, y, np.inf)
+    offsets = np.arange(n_bins) * bin_size
+    max_pos = padded_max.reshape(n_bins, bin_size).argmax(axis=1) + offsets
+    min_pos = padded_min.reshape(n_bins, bin_size).argmin(axis=1) + offsets
+    # 欠損だけのビンは先頭位置になるため、データ長を超えないようにする
+    positions = np.unique(np.concatenate([min_pos, max_pos, [0, n - 1]]))
+    return positions[positions < n]
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Select positions with the Largest-Triangle-Three-Buckets algorithm.
+
+    Args:
+    x (array-like): X values of one series (numeric or datetime).
+    y (array-like): Y values of the series.
+    n_out (int): Number of returned positions.
+
+    Returns:
+    np.ndarray: Sorted positions into ``y``.
+    """
+    x = _numeric_values(x)
+    y = _numeric_values(y)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # 欠損値は三角形の面積を計算できないため0とみなす
+    y = np.nan_to_num(y)
+    x = np.where(np.isnan(x), np.arange(n), x)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    avg_x = np.add.reduceat(x[1:n - 1], starts - 1) / counts
+    avg_y = np.add.reduceat(y[1:n - 1], starts - 1) / counts
+
+    positions = np.empty(n_out, dtype=np.int64)
+    positions[0], positions[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        # 次のバケットの平均点（最後のバケットでは終点）
+        next_x, next_y = (avg_x[i + 1], avg_y[i + 1]) if i + 1 < len(starts) else (x[-1], y[-1])
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        positions[i + 1] = a
+    return positions
+
+
+def select_x_range(df, x_col, x_range):
+    """
+    Return the rows of ``df`` whose ``x_col`` lies within ``x_range``.
+
+    Args:
+    df (pd.DataFrame): Source data.
+    x_col (str): Column holding the X values.
+    x_range (tuple): ``(start, end)`` inclusive. None returns ``df`` unchanged.
+
+    Returns:
+    pd.DataFrame: The rows in range. A sorted X column is searched instead of scanned.
+    """
+    if x_range is None:
+        return df
+    start, end = x_range
+    x = df[x_col]
+    if x.is_monotonic_increasing:
+        lo = x.searchsorted(start, side="left")
+        hi = x.searchsorted(end, side="right")
+        return df.iloc[lo:hi]
+    return df[(x >= start) & (x <= end)]
+
+
+def downsample_frame(df, x_col, y_cols, max_points=DEFAULT_MAX_POINTS, method="minmax", x_range=None, group_col=None):
+    """
+    Reduce each series of a line chart to about ``max_points`` points.
+
+    Every series (and every group of ``group_col``) keeps its own positions, so
+    the result is returned in long form, as ``px.line`` builds it from wide data.
+
+    Args:
+    df (pd.DataFrame): Source data.
+    x_col (str): Column holding the X values.
+    y_cols (list): Columns drawn as lines.
+    max_points (int): Number of points kept per series.
+    method (str): ``"minmax"`` (keeps peaks) or ``"lttb"`` (keeps shape).
+    x_range (tuple): Only this range of X is drawn, at full detail when it holds few rows.
+    group_col (str): Column that splits the lines into groups, like ``color`` of ``px.line``.
+
+    Returns:
+    pd.DataFrame: Columns ``x_col``, ``group_col`` (if given), ``variable`` and ``value``.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    df = select_x_range(df, x_col, x_range)
+    y_cols = [y_cols] if isinstance(y_cols, str) else list(y_cols)
+
+    groups = [np.arange(len(df))]
+    if group_col is not None:
+        codes = pd.factorize(df[group_col], use_na_sentinel=False)[0]
+        order = np.argsort(codes, kind="stable")
+        groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+
+    id_cols = [x_col] if group_col in (None, x_col) else [x_col, group_col]
+    frames = []
+    for col in y_cols:
+        selected = []
+        for rows in groups:
+            y = df[col].iloc[rows]
+            if len(rows) <= max_points:
+                positions = np.arange(len(rows))
+            elif method == "lttb":
+                positions = lttb_indices(df[x_col].iloc[rows], y, max_points)
+            else:
+                positions = minmax_indices(y, max_points)
+            selected.append(rows[positions])
+        rows = np.sort(np.concatenate(selected)) if len(selected) > 1 else selected[0]
+        part = df.iloc[rows]
+        frame = part[id_cols].copy()
+        frame["variable"] = col
+        frame["value"] = part[col].to_numpy()
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=id_cols + ["variable", "value"])
+    return pd.concat(frames, ignore_index=True)
+
+
+# ピラミッドの各段で束ねるビンの数
+PYRAMID_FACTOR = 4
+# これより粗い段は作らない
+PYRAMID_MIN_BINS = 256
+PYRAMID_STATS = ("min_idx", "max_idx", "sum", "count")
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max/mean index of the series of a line chart.
+
+    Level ``k`` holds, for bins of ``factor ** (k + 1)`` samples, the positions of
+    the minimum and maximum and the sum and count of valid samples. A query
+    for any X range picks the coarsest level that still gives ``max_points``
+    points, so its cost is proportional to the output rather than the range.
+    The X column must be sorted.
+    """
+
+    def __init__(self, x, values, levels, factor=PYRAMID_FACTOR):
+        """
+        Args:
+        x (np.ndarray): Sorted X values.
+        values (dict): Column name to raw values.
+        levels (dict): Column name to a list of per-level dicts of ``PYRAMID_STATS`` arrays.
+        factor (int): Number of bins merged at each level.
+        """
+        self.x = x
+        self.values = values
+        self.levels = levels
+        self.factor = factor
+
+    @classmethod
+    def build(cls, x, values, factor=PYRAMID_FACTOR):
+        """
+        Build the index in one pass per level.
+
+        Args:
+        x (array-like): Sorted X values.
+        values (dict): Column name to raw values.
+        factor (int): Number of bins merged at each level.
+
+        Returns:
+        MinMaxPyramid: The index.
+        """
+        values = {col: _numeric_values(y) for col, y in values.items()}
+        levels = {col: _build_levels(y, factor) for col, y in values.items()}
+        return cls(np.asarray(x), values, levels, factor)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the X values, the raw values and the level arrays."""
+        arrays = [self.x, *self.values.values()]
+        arrays += [level[stat] for levels in self.levels.values() for level in levels for stat in PYRAMID_STATS]
+        return sum(np.asarray(array).nbytes for array in arrays)
+
+    def extend(self, x, values):
+        """
+        Index data whose first rows are the data of this index, such as a file being appended to.
+
+        The complete bins of this index are kept and only the bins after them are computed.
+
+        Args:
+        x (array-like): Sorted X values whose first rows are the X values of this index.
+        values (dict): Column name to raw values, continuing the values of this index.
+
+        Returns:
+        MinMaxPyramid: The index of the longer data.
+        """
+        values = {col: _numeric_values(y) for col, y in values.items()}
+        levels = {col: _build_levels(y, self.factor, self.levels.get(col, ())) for col, y in values.items()}
+        return type(self)(np.asarray(x), values, levels, self.factor)
+
+    def save(self, out_dir):
+        """
+        Write the level arrays as ``.npy`` files under ``out_dir``.
+
+        The files are written into a temporary directory that is moved into
+        place once complete, so readers never see a partial index.
+        """
+        tmp_dir = make_temp_dir(os.path.dirname(os.path.abspath(out_dir)))
+        try:
+            for i, levels in enumerate(self.levels.values()):
+                for k, level in enumerate(levels):
+                    for stat in PYRAMID_STATS:
+                        np.save(os.path.join(tmp_dir, f"{i}_{k}_{stat}.npy"), level[stat])
+            meta = {"columns": list(self.levels), "n_levels": [len(levels) for levels in self.levels.values()], "factor": self.factor}
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        publish_dir(tmp_dir, out_dir)
+
+    @classmethod
+    def open(cls, out_dir, x, values):
+        """
+        Open an index written by ``save`` with memory-mapped level arrays.
+
+        Args:
+        out_dir (str): Directory given to ``save``.
+        x (array-like): Sorted X values the index was built from.
+        values (dict): Column name to raw values the index was built from.
+
+        Returns:
+        MinMaxPyramid or None: None when ``out_dir`` holds no complete index.
+        """
+        meta_path = os.path.join(out_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        levels = {}
+        for i, (col, n_levels) in enumerate(zip(meta["columns"], meta["n_levels"])):
+            levels[col] = [
+                {stat: np.load(os.path.join(out_dir, f"{i}_{k}_{stat}.npy"), mmap_mode="r") for stat in PYRAMID_STATS}
+                for k in range(n_levels)
+            ]
+        values = {col: _numeric_values(values[col]) for col in meta["columns"]}
+        return cls(np.asarray(x), values, levels, meta["factor"])
+
+    def _bounds(self, x_range):
+        if x_range is None:
+            return 0, len(self.x)
+        start, end = np.asarray(x_range, dtype=self.x.dtype)
+        return int(np.searchsorted(self.x, start, side="left")), int(np.searchsorted(self.x, end, side="right"))
+
+    def _level_for(self, col, n_rows, n_bins):
+        """Return ``(level index, bin size)`` of the finest level giving at most ``n_bins`` bins, or None."""
+        for k in range(len(self.levels[col])):
+            size = self.factor ** (k + 1)
+            if n_rows // size <= n_bins:
+                return k, size
+        return None
+
+    def query(self, col, x_range=None, max_points=DEFAULT_MAX_POINTS):
+        """
+        Return the positions to draw for one column, as ``minmax_indices`` would.
+
+        Args:
+        col (str): Column name.
+        x_range (tuple): ``(start, end)`` of X, inclusive. The whole record when None.
+        max_points (int): Upper bound of the number of positions (plus the range ends).
+
+        Returns:
+        np.ndarray: Sorted positions into the original data.
+        """
+        lo, hi = self._bounds(x_range)
+        if hi - lo <= max_points:
+            return np.arange(lo, hi)
+        found = self._level_for(col, hi - lo, max(1, max_points // 2))
+        if found is None:
+            return lo + minmax_indices(self.values[col][lo:hi], max_points)
+        k, size = found
+        level = self.levels[col][k]
+        first, last = -(-lo // size), hi // size
+        # 完全に含まれるビンはピラミッドから、端の半端な区間は生データから求める
+        y = self.values[col]
+        parts = [np.asarray(level["min_idx"][first:last]), np.asarray(level["max_idx"][first:last]), [lo, hi - 1]]
+        for edge_lo, edge_hi in [(lo, min(hi, first * size)), (max(lo, last * size), hi)]:
+            if edge_hi > edge_lo:
+                edge = y[edge_lo:edge_hi]
+                if not np.isnan(edge).all():
+                    parts.append([edge_lo + int(np.nanargmin(edge)), edge_lo + int(np.nanargmax(edge))])
+        return np.unique(np.concatenate(parts).astype(np.int64))
+
+    def query_mean(self, col, x_range=None, max_points=DEFAULT_MAX_POINTS):
+        """
+        Return bin means of one column over an X range.
+
+        Args:
+        col (str): Column name.
+        x_range (tuple): ``(start, end)`` of X, inclusive. The whole record when None.
+        max_points (int): Upper bound of the number of bins.
+
+        Returns:
+        tuple: ``(positions, means)`` where ``positions`` are the first samples of the bins.
+        """
+        lo, hi = self._bounds(x_range)
+        found = self._level_for(col, hi - lo, max_points) if hi - lo > max_points else None
+        if found is None:
+            return np.arange(lo, hi), self.values[col][lo:hi]
+        k, size = found
+        level = self.levels[col][k]
+        first, last = -(-lo // size), hi // size
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.asarray(level["sum"][first:last]) / np.asarray(level["count"][first:last])
+        return np.arange(first, last) * size, means
+
+    def query_frame(self, columns, x_range=None, max_points=DEFAULT_MAX_POINTS, x_col="x"):
+        """
+        Return the points of several columns in the long form of ``downsample_frame``.
+        """
+        frames = []
+        for col in columns:
+            positions = self.query(col, x_range, max_points)
+            frames.append(pd.DataFrame({x_col: self.x[positions], "variable": col, "value": self.values[col][positions]}))
+        if not frames:
+            return pd.DataFrame(columns=[x_col, "variable", "value"])
+        return pd.concat(frames, ignore_index=True)
+
+
+def _build_levels(y, factor, previous=()):
+    """
+    Build the levels of ``y``. The bins of ``previous``, built from a prefix of ``y``, are kept.
+    """
+    levels = []
+    n = len(y)
+    k = lower_kept = 0
+    while n // factor ** (k + 1) >= PYRAMID_MIN_BINS:
+        n_bins = n // factor ** (k + 1)
+        kept = len(previous[k]["min_idx"]) if k < len(previous) else 0
+        # 完成済みのビンはそのまま使い、その後ろのビンだけを前の段から求める
+        start, stop = kept * factor, n_bins * factor
+        if k == 0:
+            min_idx = max_idx = np.arange(start, stop)
+            values = y[start:stop]
+            valid = ~np.isnan(values)
+            min_values, max_values = np.where(valid, values, np.inf), np.where(valid, values, -np.inf)
+            sums, counts = np.where(valid, values, 0.0), valid.astype(np.int64)
+        else:
+            lower = levels[k - 1]
+            min_idx, max_idx = lower["min_idx"][start:stop], lower["max_idx"][start:stop]
+            # 前の段で新しく求めたビンの値は引き継ぎ、再利用したビン（factor 個未満）の値だけを読み直す
+            # （すべて欠損のビンの位置は NaN を指すので、比較で選ばれないようにする）
+            head = lower_kept - start
+            head_min, head_max = y[min_idx[:head]], y[max_idx[:head]]
+            min_values = np.concatenate([np.where(np.isnan(head_min), np.inf, head_min), min_values[:stop - lower_kept]])
+            max_values = np.concatenate([np.where(np.isnan(head_max), -np.inf, head_max), max_values[:stop - lower_kept]])
+            sums, counts = lower["sum"][start:stop], lower["count"][start:stop]
+        m = n_bins - kept
+        offsets = np.arange(m) * factor
+        # 前の段の factor 個のビンを1つにまとめる（端数の最後のビンは次の段に含めない）
+        min_pick = min_values.reshape(m, factor).argmin(axis=1) + offsets
+        max_pick = max_values.reshape(m, factor).argmax(axis=1) + offsets
+        min_values, max_values = min_values[min_pick], max_values[max_pick]
+        level = {
+            "min_idx": min_idx[min_pick],
+            "max_idx": max_idx[max_pick],
+            "sum": sums.reshape(m, factor).sum(axis=1),
+            "count": counts.reshape(m, factor).sum(axis=1),
+        }
+        if kept:
+            level = {stat: np.concatenate([previous[k][stat][:kept], level[stat]]) for stat in PYRAMID_STATS}
+        levels.append(level)
+        lower_kept = kept
+        k += 1
+    return levels
+
+
+# ヒートマップを縮約するときに一度に読み込むセル数
+HEATMAP_BLOCK_CELLS = 1 << 24
+HEATMAP_POOLING = ("max", "mean")
+
+
+def _pool_edges(n, n_out):
+    """Return the start positions of at most ``n_out`` equal bins over ``n`` items."""
+    if n <= n_out:
+        return np.arange(n)
+    return np.arange(0, n, -(-n // n_out))
+
+
+def _pool(matrix, edges, axis, method):
+    if len(edges) == matrix.shape[axis]:
+        return np.asarray(matrix, dtype=float)
+    if method == "max":
+        return np.maximum.reduceat(matrix, edges, axis=axis).astype(float, copy=False)
+    counts = np.diff(np.append(edges, matrix.shape[axis]))
+    sums = np.add.reduceat(matrix, edges, axis=axis, dtype=float)
+    return sums / (counts[:, None] if axis == 0 else counts[None, :])
+
+
+def reduce_heatmap(freqs, times, amp_matrix, max_rows=512, max_cols=1024, method="max", log_freq=False,
+                   db=False, freq_range=None, time_range=None):
+    """
+    Pool a spectrogram down to a pixel grid before it is drawn.
+
+    Only the cells inside ``freq_range`` and ``time_range`` are read, so a
+    memory-mapped spectrogram can be zoomed at full resolution. The time axis
+    is read in blocks, so the input is never copied whole.
+
+    Args:
+    freqs (np.ndarray): Frequencies of the rows, in ascending order.
+    times (np.ndarray): Times of the columns, in ascending order.
+    amp_matrix (np.ndarray): Amplitudes of shape ``(len(freqs), len(times))``.
+    max_rows (int): Maximum number of frequency rows of the result.
+    max_cols (int): Maximum number of time columns of the result.
+    method (str): ``"max"`` keeps peaks, ``"mean"`` averages the pooled cells.
+    log_freq (bool): Pool the frequency axis into logarithmically spaced bins (0 Hz is dropped).
+    db (bool): Return ``20 * log10(amplitude)``.
+    freq_range (tuple): ``(low, high)`` in Hz, inclusive.
+    time_range (tuple): ``(start, end)`` in seconds, inclusive.
+
+    Returns:
+    tuple: ``(freqs, times, matrix)`` of the reduced grid. Pooled bins are labelled
+    with the mean frequency and the start time of the bin.
+    """
+    if method not in HEATMAP_POOLING:
+        raise ValueError(f"Unknown pooling method: {method}")
+    freqs, times = np.asarray(freqs, dtype=float), np.asarray(times, dtype=float)
+    f_lo, f_hi = (0, len(freqs)) if freq_range is None else (
+        np.searchsorted(freqs, freq_range[0], side="left"), np.searchsorted(freqs, freq_range[1], side="right"))
+    if log_freq:
+        f_lo = max(f_lo, int(np.searchsorted(freqs, 0, side="right")))
+    t_lo, t_hi = (0, len(times)) if time_range is None else (
+        np.searchsorted(times, time_range[0], side="left"), np.searchsorted(times, time_range[1], side="right"))
+    freqs, times = freqs[f_lo:f_hi], times[t_lo:t_hi]
+    if len(freqs) == 0 or len(times) == 0:
+        return freqs, times, np.empty((len(freqs), len(times)))
+
+    if log_freq and len(freqs) > max_rows:
+        bounds = np.geomspace(freqs[0], freqs[-1], max_rows + 1)[:-1]
+        row_edges = np.unique(np.searchsorted(freqs, bounds, side="left"))
+    else:
+        row_edges = _pool_edges(len(freqs), max_rows)
+    col_edges = _pool_edges(len(times), max_cols)
+    step = col_edges[1] - col_edges[0] if len(col_edges) > 1 else len(times)
+
+    # 時間方向はビン単位のブロックに分けて読み込む
+    block = step * max(1, HEATMAP_BLOCK_CELLS // max(1, len(freqs) * step))
+    parts = []
+    for start in range(0, len(times), block):
+        cells = amp_matrix[f_lo:f_hi, t_lo + start:t_lo + min(start + block, len(times))]
+        pooled = _pool(cells, col_edges[(col_edges >= start) & (col_edges < start + block)] - start, 1, method)
+        parts.append(_pool(pooled, row_edges, 0, method))
+    matrix = np.concatenate(parts, axis=1) if len(parts) > 1 else parts[0]
+
+    if len(row_edges) < len(freqs):
+        freqs = np.add.reduceat(freqs, row_edges) / np.diff(np.append(row_edges, len(freqs)))
+    times = times[col_edges]
+    if db:
+        with np.errstate(divide="ignore"):
+            matrix = 20 * np.log10(np.maximum(matrix, np.finfo(float).tiny))
+    return freqs, times, matrix
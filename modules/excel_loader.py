@@ -0,0 +1,105 @@
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.cell import range_boundaries
+
+# 一度に型変換する行数
+DEFAULT_BATCH_ROWS = 50000
+
+
+def _open_workbook(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    # read_only=True で行を逐次読み出す（ブック全体のオブジェクトモデルは作らない）
+    return load_workbook(source, read_only=True, data_only=True)
+
+
+def list_excel_sheets(source):
+    """
+    Return the sheet names of an Excel workbook.
+
+    Args:
+    source (str or file-like): Path or binary file object of the workbook.
+
+    Returns:
+    list: Sheet names in workbook order.
+    """
+    workbook = _open_workbook(source)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def _make_header(values):
+    """
+    Build unique column names from the header row in the same way as ``pd.read_excel``.
+    """
+    header = []
+    for i, value in enumerate(values):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        base, count = name, 1
+        while name in header:
+            name = f"{base}.{count}"
+            count += 1
+        header.append(name)
+    return header
+
+
+def load_excel_streaming(source, sheet_name=None, cell_range=None, header=True, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    Read a sheet of an Excel workbook with a read-only row iterator.
+
+    Rows are converted to typed columns every ``batch_rows`` rows, so only one
+    batch of Python row tuples is alive at a time.
+
+    Args:
+    source (str or file-like): Path or binary file object of the workbook.
+    sheet_name (str): Sheet to read. The first sheet is used when None.
+    cell_range (str): Cell range such as ``"A1:F1000"``. The whole sheet is read when None or empty.
+    header (bool): Whether the first row of the range holds the column names.
+    batch_rows (int): Number of rows converted at a time.
+
+    Returns:
+    pd.DataFrame: The sheet data.
+    """
+    workbook = _open_workbook(source)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        bounds = {}
+        if cell_range:
+            min_col, min_row, max_col, max_row = range_boundaries(cell_range.strip().upper())
+            bounds = {'min_col': min_col, 'min_row': min_row, 'max_col': max_col, 'max_row': max_row}
+        rows = worksheet.iter_rows(values_only=True, **bounds)
+
+        columns = None
+        if header:
+            first = next(rows, None)
+            if first is None:
+                return pd.DataFrame()
+            columns = _make_header(first)
+
+        frames = []
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                frames.append(_batch_to_frame(batch, columns))
+                batch = []
+        if batch or not frames:
+            frames.append(_batch_to_frame(batch, columns))
+    finally:
+        workbook.close()
+
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    # 全体が空の行は pd.read_excel と同様に末尾から除く
+    non_empty = df.notna().any(axis=1).to_numpy()
+    if len(df) and not non_empty[-1]:
+        df = df.iloc[:non_empty.nonzero()[0][-1] + 1 if non_empty.any() else 0]
+    return df
+
+
+def _batch_to_frame(batch, columns):
+    width = len(columns) if columns is not None else max((len(row) for row in batch), default=0)
+    # 行ごとに列数が異なる場合は欠損値で埋める
+    batch = [row + (None,) * (width - len(row)) if len(row) < width else row[:width] for row in batch]
+    return pd.DataFrame.from_records(batch, columns=columns if columns is not None else range(width))
@@ -1,9 +1,42 @@
+import codecs
+import contextlib
+import io
+import mmap
+import os
 import re
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+from modules.data_processing import compact_dtypes, MAX_CATEGORY_RATIO
+
 header_cache = {'header_line': None, 'data_type': None}  # ヘッダー行とデータタイプのキャッシュ
 
+# ヘッダー探索で読む最大行数（データ本体はデコードしない）
+HEADER_SCAN_LINES = 10000
+
+# エンコーディング判定でデコードする先頭サンプルのバイト数
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# エンコーディング判定で残りの部分を確認するブロックのバイト数
+ENCODING_BLOCK_BYTES = 1 << 20
+
+# BOMとエンコーディングの対応
+ENCODING_BOMS = [(codecs.BOM_UTF8, 'utf-8-sig')]
+
+# メモリ上のバイト列として扱える型（mmapはコピーせずにそのまま解析する）
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+# ストリーミング読み込み時にヘッダー探索のため先頭から読むバイト数
+HEADER_SCAN_BYTES = 1 << 20
+
+# ストリーミング読み込みのチャンクあたりのメモリ上限（バイト）
+DEFAULT_CHUNK_MEMORY = 64 * 1024 * 1024
+
+# 追記中のファイルを一度に読むバイト数
+TAIL_READ_BYTES = 16 * 1024 * 1024
+
 def extract_measurement_interval(lines):
     """
     Extract the measurement interval from the raw CSV lines.
@@ -22,183 +55,747 @@ def extract_measurement_interval(lines):
                 return interval_s
     return None
 
-def load_csv_with_dynamic_start(upload_file, encodings=['utf-8', 'cp932', 'shift_jis']):
+
+def iter_head_lines(raw, encoding, start=0, max_lines=HEADER_SCAN_LINES):
     """
-    Reads a CSV file and returns a pandas DataFrame.
-    
-    The function dynamically detects the header and data start line. It looks for the row where the first column
-    contains the word "測定値" and treats it as the header. The data starts from the second line after the header.
-    
+    Yield the first lines of a raw byte buffer without decoding the rest of it.
+
     Args:
-    upload_file (None): streamlit file uploader.
-    encoding (str): The encoding of the CSV file.
-    
-    Returns:
-    pd.DataFrame: A DataFrame containing the data from the CSV file.
+    raw (bytes): Raw file content.
+    encoding (str): Encoding used to decode each line.
+    start (int): Byte offset to start from.
+    max_lines (int): Maximum number of lines to yield.
+
+    Yields:
+    tuple: ``(byte_offset, line)`` for each line.
     """
-    lines = None
-    for encoding in encodings:
-        try:
-            upload_file.seek(0)  # ファイルポインタを先頭にリセット
-            lines = [line.decode(encoding) for line in upload_file]
+    offset = start
+    size = len(raw)
+    for _ in range(max_lines):
+        if offset >= size:
             break
-        except UnicodeDecodeError:
-            continue
-    
-    if lines is None:
-        raise ValueError("ファイルの読み込みに失敗しました。対応するエンコーディングが見つかりませんでした。")
+        end = raw.find(b'\n', offset)
+        end = size if end == -1 else end + 1
+        yield offset, raw[offset:end].decode(encoding)
+        offset = end
 
+def skip_lines(raw, offset, n=1):
+    """
+    Return the byte offset located ``n`` lines after ``offset``.
+    """
+    for _ in range(n):
+        end = raw.find(b'\n', offset)
+        if end == -1:
+            return len(raw)
+        offset = end + 1
+    return offset
 
-    # データタイプを見つける
-    header_line = None
-    data_type = None
-    for i, line in enumerate(lines):
+def split_header(line):
+    """
+    Split a header line into column names.
+
+    Empty names are replaced with ``replace<i>`` because streamlit fails on duplicated column names.
+    """
+    header = line.strip().split(',')
+    replacement = "replace"
+    return [replacement + str(i) if x.strip() == "" else x for i, x in enumerate(header)]
+
+def detect_csv_layout(raw, encoding):
+    """
+    Detect the logger format of a CSV file by scanning only its header section.
+
+    The returned layout holds the data type, the column names and the byte range
+    of the data rows, so the data body can be handed to a C-level reader as is.
+
+    Args:
+    raw (bytes): Raw file content.
+    encoding (str): The encoding of the CSV file.
+
+    Returns:
+    dict or None: Layout with the keys ``data_type``, ``header_line``, ``header``,
+    ``data_start``, ``data_end`` and ``measurement_interval``. None if the format is unknown.
+    """
+    head_lines = []
+    for offset, line in iter_head_lines(raw, encoding):
+        head_lines.append(line)
         if line.strip().startswith("測定値"):
-            header_line = i + 1
-            data_type = 'GRAPHTEC'
-            break
+            # ヘッダー行は「測定値」の次の行、データはヘッダー行の2行後から
+            header_offset = skip_lines(raw, offset)
+            header = raw[header_offset:skip_lines(raw, header_offset)].decode(encoding)
+            return {
+                'data_type': 'GRAPHTEC',
+                'header_line': len(head_lines),
+                'header': split_header(header),
+                'data_start': skip_lines(raw, header_offset, 2),
+                'data_end': len(raw),
+                'measurement_interval': extract_measurement_interval(head_lines),
+            }
         elif line.strip().startswith("#EndHeader"):
-            header_line = i
-            data_type = 'NR600'
-            break
-    
-    # データタイプが不明な場合
-    if data_type == None:
-        global header_cache
-        header_line = header_cache['header_line']
-        data_type = header_cache['data_type']
-
-        # キャッシュが有効な場合はそれを利用
-        if header_line is not None and data_type is not None:
-            st.info(f"前回の設定を使用しています: ヘッダー行 {header_line + 1}, データタイプ {data_type}")
-        else:
-
-            # GRAPHTECやNR600に当てはまらない場合、最初の文字列を含む行をheader_lineとするか確認
-            while header_line is None:
-                for i, line in enumerate(lines):
-                    if line.strip():
-                        if st.button(f"行 {i + 1} をヘッダーとして使用しますか？:\n{line.strip()}"):
-                            header_line = i
-                            if line.strip().startswith("index"):
-                                data_type = 'headerあり'
-                            else:
-                                data_type = 'headerあり'
-                            break
-                        elif st.button("ヘッダーを見つけるのを続けますか？ それともヘッダーなしとしますか？"):
-                            continue
-                        else:
-                            data_type = 'headerなし'
-                            break
-                if header_line is None and data_type == 'headerなし':
-                    break
-            
-            # ヘッダー行が見つからない場合、処理を継続するか確認
-            if header_line is None:
-                if st.button("ヘッダーが見つかりませんでした。処理を継続しますか？"):
-                    data_type = 'headerなし'
-                else:
-                    raise ValueError("ヘッダー行が見つかりませんでした。対応するフォーマットではない可能性があります。")
-            
-            # ヘッダー情報をキャッシュに保存
-            header_cache['header_line'] = header_line
-            header_cache['data_type'] = data_type
-    
+            # データの最終行は「#BeginMark」の手前まで
+            data_start = skip_lines(raw, offset)
+            mark = raw.find(b'\n#BeginMark', data_start - 1)
+            return {
+                'data_type': 'NR600',
+                'header_line': len(head_lines) - 1,
+                'header': split_header(line),
+                'data_start': data_start,
+                'data_end': len(raw) if mark == -1 else mark + 1,
+                'measurement_interval': None,
+            }
+    return None
+
+class _BufferReader(io.RawIOBase):
+    """
+    Raw stream over a memoryview, so pandas reads a byte range without copying it as a whole.
+    """
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        # mmapを閉じられるようにバッファの参照を解放する
+        self._view.release()
+        super().close()
+
+def read_csv_range(raw, start, end, encoding, header=None):
+    """
+    Parse a byte range of CSV data rows with the pandas C engine.
+
+    Args:
+    raw (bytes or mmap.mmap): Raw file content.
+    start (int): Byte offset of the first data row.
+    end (int): Byte offset just after the last data row.
+    encoding (str): The encoding of the CSV file.
+    header (list): Column names. Integer column names are used when None.
+
+    Returns:
+    pd.DataFrame: Typed DataFrame of the data rows.
+    """
+    names = range(len(header)) if header is not None else None
+    if start >= end:
+        df = pd.DataFrame(columns=names)
+    else:
+        with memoryview(raw) as view, io.BufferedReader(_BufferReader(view[start:end])) as reader:
+            df = pd.read_csv(
+                reader,
+                header=None,
+                names=names,
+                index_col=False,
+                encoding=encoding,
+                engine='c',
+            )
+    # 列名の重複を許容するため、読み込み後に列名を設定する
+    if header is not None:
+        df.columns = header
+    return df
+
+def parse_csv_layout(raw, layout, encoding):
+    """
+    Build the DataFrame for a detected layout.
+
+    Args:
+    raw (bytes): Raw file content.
+    layout (dict): Layout returned by ``detect_csv_layout``.
+    encoding (str): The encoding of the CSV file.
+
+    Returns:
+    tuple: ``(df, measurement_interval)``.
+    """
+    data_type = layout['data_type']
+    df = read_csv_range(raw, layout['data_start'], layout['data_end'], encoding, layout['header'])
+
     if data_type == 'GRAPHTEC':
-        # 測定間隔を抽出
-        measurement_interval = extract_measurement_interval(lines)
+        measurement_interval = layout['measurement_interval']
         if measurement_interval is None:
             raise ValueError("測定間隔が見つかりませんでした。")
-        
-        # データの開始行を設定（ヘッダー行の2行後）
-        data_start_line = header_line + 2
-        
-        # ヘッダーを抽出
-        header = lines[header_line].strip().split(',')
-        
-        # streamlitの問題に対処。列名が同じだったらエラーになるのを回避
-        replacement = "replace"
-        header = [replacement + str(i) if x.strip() == "" else x for i, x in enumerate(header)]
-        
-        # データを抽出
-        data_lines = lines[data_start_line:]
-        data = [line.strip().split(',') for line in data_lines]
-        
-        # DataFrameを作成
-        df = pd.DataFrame(data, columns=header)
-        
+
         # 経過時間を追加
         df['経過時間(sec)'] = df.index.astype('float') * measurement_interval
     elif data_type == 'NR600':
-        # データの開始行を設定
-        data_start_line = header_line + 1
-        data_end_line = len(lines)
-
-        # データの最終行を設定
-        for i, line in enumerate(lines[data_start_line:], start=data_start_line):
-            if line.strip().startswith("#BeginMark"):
-                data_end_line = i
-                break
-        
-        # ヘッダーを抽出
-        header = lines[header_line].strip().split(',')
-        
-        # streamlitの問題に対処。列名が同じだったらエラーになるのを回避
-        replacement = "replace"
-        header = [replacement + str(i) if x.strip() == "" else x for i, x in enumerate(header)]
-        
-        # データを抽出
-        data_lines = lines[data_start_line:data_end_line]
-        data = [line.strip().split(',') for line in data_lines]
-        
-        # DataFrameを作成
-        df = pd.DataFrame(data, columns=header)
-        
         # 列名のリネーム
         df = df.rename(columns={'#EndHeader': 'time(sec)'})
-        
+
         # 日時(μs)をfloatに変換し、測定間隔を計算
         df['日時(μs)'] = df['日時(μs)'].astype(float)
         measurement_interval = (df.at[1, '日時(μs)'] - df.at[0, '日時(μs)']) / 1000000
-        
+
         # 経過時間の追加
         df['time(sec)'] = df.index * measurement_interval
-        
+
         # 不要な列を削除
         del df['日時(μs)']
-    elif data_type == 'headerあり':
-        # データの開始行を設定（ヘッダー行の1行後）
-        data_start_line = header_line + 1
-        
-        # ヘッダーを抽出
-        header = lines[header_line].strip().split(',')
-        
-        # streamlitの問題に対処。列名が同じだったらエラーになるのを回避
-        replacement = "replace"
-        header = [replacement + str(i) if x.strip() == "" else x for i, x in enumerate(header)]
+    else:
+        # 測定間隔は不明
+        measurement_interval = None
+
+    return df, measurement_interval
+
+def _iter_blocks(source, start, block_size=ENCODING_BLOCK_BYTES):
+    """
+    Yield blocks of a byte buffer or a binary file starting at ``start``.
+    """
+    if isinstance(source, BUFFER_TYPES):
+        with memoryview(source) as view:
+            for offset in range(start, len(view), block_size):
+                with view[offset:offset + block_size] as block:
+                    yield block
+    else:
+        source.seek(start)
+        while True:
+            block = source.read(block_size)
+            if not block:
+                break
+            yield block
+
+def _verify_encoding(source, start, encoding, max_bytes=None):
+    """
+    Check that the remainder of a file can be decoded with ``encoding``.
+
+    Blocks are cut at line ends, which never fall inside a multibyte character,
+    so every piece is decoded on its own. ASCII pieces (the numeric data body of
+    logger files) are skipped without decoding, and the check stops at the first
+    piece that fails.
+    """
+    carry = b''
+    checked = 0
+    for block in _iter_blocks(source, start):
+        block = carry + block
+        cut = block.rfind(b'\n') + 1
+        piece, carry = block[:cut], block[cut:]
+        if not piece.isascii():
+            piece.decode(encoding)
+        checked += len(block) - len(carry)
+        if max_bytes is not None and checked >= max_bytes:
+            return
+    carry.decode(encoding)
+
+def detect_encoding(source, encodings=['utf-8', 'cp932', 'shift_jis'], sample_size=ENCODING_SAMPLE_BYTES,
+                    max_verify_bytes=None):
+    """
+    Detect the encoding of a CSV file so that it is decoded only once by the parser.
+
+    A BOM decides the encoding directly. Otherwise the candidates are tried in
+    order on a bounded prefix sample, and the rest of the file is verified
+    incrementally with ``_verify_encoding``.
+
+    Args:
+    source (bytes, mmap.mmap or file-like): Raw file content or a seekable binary file.
+    encodings (list): Candidate encodings in order of preference.
+    sample_size (int): Number of bytes decoded as the prefix sample.
+    max_verify_bytes (int): Maximum number of bytes checked after the prefix. The whole file is checked when None.
+
+    Returns:
+    str: The detected encoding.
+    """
+    if isinstance(source, BUFFER_TYPES):
+        prefix = bytes(source[:sample_size])
+    else:
+        source.seek(0)
+        prefix = source.read(sample_size)
+
+    for bom, encoding in ENCODING_BOMS:
+        if prefix.startswith(bom):
+            return encoding
+
+    # 途中で切れた文字をデコードしないよう、最後の改行までをサンプルとする
+    if len(prefix) == sample_size and b'\n' in prefix:
+        prefix = prefix[:prefix.rfind(b'\n') + 1]
+
+    try:
+        for encoding in encodings:
+            try:
+                prefix.decode(encoding)
+                _verify_encoding(source, len(prefix), encoding, max_verify_bytes)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+    finally:
+        if not isinstance(source, BUFFER_TYPES):
+            source.seek(0)
+    raise ValueError("ファイルの読み込みに失敗しました。対応するエンコーディングが見つかりませんでした。")
+
+def load_csv_with_dynamic_start(upload_file, encodings=['utf-8', 'cp932', 'shift_jis']):
+    """
+    Reads a CSV file and returns a pandas DataFrame.
+    
+    The function dynamically detects the header and data start line. It looks for the row where the first column
+    contains the word "測定値" and treats it as the header. The data starts from the second line after the header.
+    Only the header section is decoded in Python; the data rows are parsed by the pandas C engine
+    into typed columns.
+    
+    Args:
+    upload_file (None): streamlit file uploader, or a memory-mapped file (``mmap.mmap``) parsed in place.
+    encoding (str): The encoding of the CSV file.
+    
+    Returns:
+    pd.DataFrame: A DataFrame containing the data from the CSV file.
+    """
+    if isinstance(upload_file, BUFFER_TYPES):
+        raw = upload_file
+    else:
+        upload_file.seek(0)  # ファイルポインタを先頭にリセット
+        raw = upload_file.read()
+    encoding = detect_encoding(raw, encodings)
+
+    # データタイプを見つける
+    layout = detect_csv_layout(raw, encoding)
+    if layout is not None:
+        df, measurement_interval = parse_csv_layout(raw, layout, encoding)
+        return df, measurement_interval, layout['data_type']
+
+    # データタイプが不明な場合
+    global header_cache
+    header_line = header_cache['header_line']
+    data_type = header_cache['data_type']
+
+    # キャッシュが有効な場合はそれを利用
+    if header_line is not None and data_type is not None:
+        st.info(f"前回の設定を使用しています: ヘッダー行 {header_line + 1}, データタイプ {data_type}")
+    else:
+        lines = [line for _, line in iter_head_lines(raw, encoding)]
+
+        # GRAPHTECやNR600に当てはまらない場合、最初の文字列を含む行をheader_lineとするか確認
+        while header_line is None:
+            for i, line in enumerate(lines):
+                if line.strip():
+                    if st.button(f"行 {i + 1} をヘッダーとして使用しますか？:\n{line.strip()}"):
+                        header_line = i
+                        if line.strip().startswith("index"):
+                            data_type = 'headerあり'
+                        else:
+                            data_type = 'headerあり'
+                        break
+                    elif st.button("ヘッダーを見つけるのを続けますか？ それともヘッダーなしとしますか？"):
+                        continue
+                    else:
+                        data_type = 'headerなし'
+                        break
+            if header_line is None and data_type == 'headerなし':
+                break
         
-        # データを抽出
-        data_lines = lines[data_start_line:]
-        data = [line.strip().split(',') for line in data_lines]
+        # ヘッダー行が見つからない場合、処理を継続するか確認
+        if header_line is None:
+            if st.button("ヘッダーが見つかりませんでした。処理を継続しますか？"):
+                data_type = 'headerなし'
+            else:
+                raise ValueError("ヘッダー行が見つかりませんでした。対応するフォーマットではない可能性があります。")
         
-        # DataFrameを作成
-        df = pd.DataFrame(data, columns=header)
+        # ヘッダー情報をキャッシュに保存
+        header_cache['header_line'] = header_line
+        header_cache['data_type'] = data_type
+    
+    if data_type == 'headerあり':
+        # データの開始行を設定（ヘッダー行の1行後）
+        header_offset = skip_lines(raw, 0, header_line)
+        header = raw[header_offset:skip_lines(raw, header_offset)].decode(encoding)
+        df = read_csv_range(raw, skip_lines(raw, header_offset), len(raw), encoding, split_header(header))
         
         # 測定間隔は不明
         measurement_interval = None
     elif data_type == 'headerなし':
         # ヘッダーなしとしてデータを読み込む
-        data_lines = lines
-        data = [line.strip().split(',') for line in data_lines]
-        
-        # DataFrameを作成（ヘッダーなし）
-        df = pd.DataFrame(data)
+        df = read_csv_range(raw, 0, len(raw), encoding)
         
         # 測定間隔は不明
         measurement_interval = None
     else:
         # デフォルトの読み込み処理
-        upload_file.seek(0)  # ファイルポインタを先頭にリセット
-        df = pd.read_csv(upload_file, encoding=encodings[0])
+        df = pd.read_csv(io.BytesIO(raw), encoding=encoding)
         measurement_interval = None
     
     return df, measurement_interval, data_type
+
+def load_csv_from_path(path, encodings=['utf-8', 'cp932', 'shift_jis']):
+    """
+    Read a CSV file on the server through ``mmap``.
+
+    The parser works on the mapped pages directly, so the file is never copied
+    into memory as a whole.
+
+    Args:
+    path (str): Path of the CSV file.
+    encodings (list): Candidate encodings.
+
+    Returns:
+    tuple: ``(df, measurement_interval, data_type)`` as returned by ``load_csv_with_dynamic_start``.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("ファイルが空です。")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return load_csv_with_dynamic_start(mapped, encodings)
+
+def list_data_files(directory, extensions=('.csv', '.xlsx')):
+    """
+    List the data files directly under a server-side directory.
+
+    Args:
+    directory (str): Directory to list.
+    extensions (tuple): File extensions to include.
+
+    Returns:
+    list: File names sorted by name.
+    """
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(
+        entry.name for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.lower().endswith(extensions)
+    )
+
+class _DataRangeReader(io.RawIOBase):
+    """
+    Raw stream over the data rows of a logger file.
+
+    Reading starts at the current position of ``file`` and ends at the NR600
+    ``#BeginMark`` trailer when ``stop_at_mark`` is set.
+    """
+    marker = b'\n#BeginMark'
+
+    def __init__(self, file, stop_at_mark=False, block_size=1 << 20):
+        self._file = file
+        self._stop_at_mark = stop_at_mark
+        self._block_size = block_size
+        # 先頭行が「#BeginMark」の場合も検出できるよう改行を補う（空行はpandasが読み飛ばす）
+        self._buffer = b'\n'
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        keep = len(self.marker) - 1 if self._stop_at_mark else 0
+        while not self._eof and len(self._buffer) < len(b) + keep:
+            block = self._file.read(self._block_size)
+            if not block:
+                self._eof = True
+                break
+            self._buffer += block
+            if self._stop_at_mark:
+                mark = self._buffer.find(self.marker)
+                if mark != -1:
+                    self._buffer = self._buffer[:mark + 1]
+                    self._eof = True
+        # マーカーが分割されている可能性があるため、末尾の数バイトは次回に持ち越す
+        n = min(len(b), len(self._buffer) if self._eof else len(self._buffer) - keep)
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+def add_elapsed_time(chunk, data_type, measurement_interval):
+    """
+    Add the ``経過時間(sec)`` / ``time(sec)`` column to a block of data rows.
+
+    The row index of ``chunk`` must be its position in the full table, so blocks
+    parsed separately get the same elapsed time as a full parse.
+    """
+    if data_type == 'GRAPHTEC':
+        chunk['経過時間(sec)'] = chunk.index.astype('float') * measurement_interval
+    else:
+        chunk = chunk.rename(columns={'#EndHeader': 'time(sec)'})
+        chunk['time(sec)'] = chunk.index * measurement_interval
+        if '日時(μs)' in chunk.columns:
+            del chunk['日時(μs)']
+    return chunk
+
+def open_csv_chunks(source, chunk_rows=None, usecols=None, encodings=['utf-8', 'cp932', 'shift_jis'],
+                    memory_limit=DEFAULT_CHUNK_MEMORY):
+    """
+    Open a GRAPHTEC/NR600 CSV file as an iterator of typed DataFrame chunks.
+
+    Only the header section is read up front. The data rows are parsed chunk by
+    chunk, so peak memory is bounded by the chunk size rather than the file size.
+    Each chunk keeps the row index of the full table and carries the
+    ``経過時間(sec)`` / ``time(sec)`` column.
+
+    Args:
+    source (str or file-like): Path or binary file object.
+    chunk_rows (int): Number of rows per chunk. Derived from ``memory_limit`` when None.
+    usecols (list): Column names to read. All columns are read when None.
+    encodings (list): Candidate encodings.
+    memory_limit (int): Approximate memory ceiling of one chunk in bytes.
+
+    Returns:
+    tuple: ``(chunks, measurement_interval, data_type)`` where ``chunks`` is a generator of DataFrames.
+    """
+    is_path = isinstance(source, (str, os.PathLike))
+    # 形式の確認はヘッダー部分だけで行い、データを読むファイルは generator の中で開く
+    # （検証エラーや一度も回されなかった generator でファイルが開いたままにならないように）
+    with (open(source, 'rb') if is_path else contextlib.nullcontext(source)) as file:
+        encoding = detect_encoding(file, encodings)
+        file.seek(0)
+        prefix = file.read(HEADER_SCAN_BYTES)
+    # 途中で切れた行はデコードできないため、最後の改行までを使う
+    if len(prefix) == HEADER_SCAN_BYTES and b'\n' in prefix:
+        prefix = prefix[:prefix.rfind(b'\n') + 1]
+
+    layout = detect_csv_layout(prefix, encoding)
+    if layout is None:
+        raise ValueError("チャンク読み込みはGRAPHTEC/NR600形式のファイルのみ対応しています。")
+    data_type = layout['data_type']
+    header = layout['header']
+
+    if data_type == 'GRAPHTEC':
+        measurement_interval = layout['measurement_interval']
+        if measurement_interval is None:
+            raise ValueError("測定間隔が見つかりませんでした。")
+    else:
+        # 先頭2行の日時(μs)から測定間隔を計算
+        head = read_csv_range(prefix, layout['data_start'], skip_lines(prefix, layout['data_start'], 2), encoding, header)
+        measurement_interval = (float(head.at[1, '日時(μs)']) - float(head.at[0, '日時(μs)'])) / 1000000
+
+    if usecols is None:
+        usecols = header
+    if data_type == 'NR600' and '#EndHeader' not in usecols:
+        usecols = ['#EndHeader'] + list(usecols)
+    positions = [i for i, name in enumerate(header) if name in usecols]
+    names = [header[i] for i in positions]
+    if chunk_rows is None:
+        chunk_rows = max(1, memory_limit // (8 * (len(positions) + 1)))
+
+    def generate():
+        file = open(source, 'rb') if is_path else source
+        try:
+            file.seek(layout['data_start'])
+            reader = pd.read_csv(
+                io.BufferedReader(_DataRangeReader(file, stop_at_mark=(data_type == 'NR600'))),
+                header=None,
+                names=range(len(header)),
+                usecols=positions,
+                index_col=False,
+                encoding=encoding,
+                engine='c',
+                chunksize=chunk_rows,
+            )
+            for chunk in reader:
+                chunk.columns = names
+                yield add_elapsed_time(chunk, data_type, measurement_interval)
+        finally:
+            if is_path:
+                file.close()
+
+    return generate(), measurement_interval, data_type
+
+class CsvTailFollower:
+    """
+    Incrementally parse a GRAPHTEC/NR600 CSV file that is still being written.
+
+    The byte offset of the first unparsed row and the detected layout are kept
+    between calls of ``poll``, so each call parses only the complete rows
+    appended since the previous one. Parsed rows are appended to column buffers
+    whose capacity doubles as needed, so the cost of a refresh is proportional
+    to the number of new rows, and a large existing file is read in blocks of
+    ``TAIL_READ_BYTES``. Reading stops for good at the NR600 ``#BeginMark``
+    trailer, even if it comes before the two rows that give the interval.
+
+    With ``compact=True`` each new chunk is stored in the dtypes of
+    ``data_processing.compact_dtypes``: the dtype chosen for a float column by
+    the first chunk is kept, and text columns are kept as categorical codes.
+    """
+
+    def __init__(self, path, encodings=['utf-8', 'cp932', 'shift_jis'], compact=False):
+        self.path = path
+        self.encodings = encodings
+        self.compact = compact
+        self.reset()
+
+    def reset(self):
+        self.layout = None
+        self.encoding = None
+        self.measurement_interval = None
+        self.offset = 0
+        self.rows = 0
+        self.finished = False
+        self._columns = {}
+        self._categories = {}
+        self._capacity = 0
+
+    @property
+    def data_type(self):
+        return None if self.layout is None else self.layout['data_type']
+
+    def _detect_layout(self, f):
+        prefix = f.read(HEADER_SCAN_BYTES)
+        # 書き込み途中の行は使わない
+        prefix = prefix[:prefix.rfind(b'\n') + 1]
+        encoding = detect_encoding(prefix, self.encodings)
+        layout = detect_csv_layout(prefix, encoding)
+        # GRAPHTECはヘッダー行の後に単位行があるため、データ開始位置までの行がすべて書き込まれているか確認する
+        header_lines = layout['header_line'] + (2 if layout['data_type'] == 'GRAPHTEC' else 1) if layout else 0
+        if layout is None or prefix.count(b'\n', 0, layout['data_start']) < header_lines:
+            # ヘッダーがまだ書き込まれていない
+            if len(prefix) >= HEADER_SCAN_BYTES:
+                raise ValueError("GRAPHTEC/NR600形式のファイルではありません。")
+            return False
+        if layout['data_type'] == 'GRAPHTEC' and layout['measurement_interval'] is None:
+            raise ValueError("測定間隔が見つかりませんでした。")
+        self.layout = layout
+        self.encoding = encoding
+        self.measurement_interval = layout['measurement_interval']
+        self.offset = layout['data_start']
+        return True
+
+    def poll(self):
+        """
+        Parse the rows appended since the previous call.
+
+        Returns:
+        int: Number of new rows. The file is parsed again from the start when it shrank.
+        """
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            # ファイルが置き換えられた場合は最初から読み直す
+            self.reset()
+        if self.finished or size == self.offset:
+            return 0
+
+        new_rows = 0
+        block_bytes = TAIL_READ_BYTES
+        with open(self.path, 'rb') as f:
+            if self.layout is None and not self._detect_layout(f):
+                return 0
+            # 既に大きなファイルも一度に読み込まず、ブロックごとに解析する
+            while not self.finished:
+                f.seek(self.offset)
+                data = f.read(block_bytes)
+                end = data.rfind(b'\n') + 1
+                if end == 0:
+                    if len(data) < block_bytes:
+                        # 書き込み途中の行しか残っていない
+                        break
+                    # ブロックより長い行は読む量を増やして読み直す
+                    block_bytes *= 2
+                    continue
+                rows = self._parse(data[:end])
+                if rows is None:
+                    break
+                new_rows += rows
+                block_bytes = TAIL_READ_BYTES
+        return new_rows
+
+    def _parse(self, data):
+        """
+        Parse a block of complete rows starting at ``offset`` and advance the offset.
+
+        Returns:
+        int or None: Number of new rows, or None when more rows are needed first.
+        """
+        end = len(data)
+        mark = (b'\n' + data).find(b'\n#BeginMark')
+        if mark != -1:
+            end = mark
+            self.finished = True
+
+        chunk = read_csv_range(data, 0, end, self.encoding, self.layout['header'])
+        interval = self.measurement_interval
+        if interval is None:
+            # NR600は先頭2行の日時(μs)から測定間隔を求める
+            if len(chunk) >= 2:
+                interval = self.measurement_interval = (float(chunk.at[1, '日時(μs)']) - float(chunk.at[0, '日時(μs)'])) / 1000000
+            elif not self.finished:
+                return None
+            else:
+                # 2行が揃う前に終了した場合は、ある行だけで終える（測定間隔は不明のまま）
+                interval = 0.0
+
+        chunk.index = pd.RangeIndex(self.rows, self.rows + len(chunk))
+        chunk = add_elapsed_time(chunk, self.layout['data_type'], interval)
+        self._append(chunk)
+        self.offset += end
+        return len(chunk)
+
+    def _append(self, chunk):
+        n = len(chunk)
+        needed = self.rows + n
+        if needed > self._capacity:
+            self._capacity = max(needed, 2 * self._capacity, 1024)
+            for col, buffer in self._columns.items():
+                if isinstance(buffer, np.ndarray):
+                    grown = np.empty(self._capacity, dtype=buffer.dtype)
+                    grown[:self.rows] = buffer[:self.rows]
+                    self._columns[col] = grown
+        if self.compact:
+            # 追記された行だけを省メモリの型にする
+            chunk = compact_dtypes(chunk)
+        for col in chunk.columns:
+            series = chunk[col]
+            buffer = self._columns.get(col)
+            is_text = col in self._categories or isinstance(buffer, list) or not isinstance(series.dtype, np.dtype)
+            if is_text and self.compact:
+                # 文字列の列はカテゴリのコードとして持つ
+                if col not in self._categories:
+                    codes = np.full(self._capacity, -1, dtype=np.int32)
+                    if buffer is not None:
+                        # 数値として読んだ先頭の行（空欄のみなど）も文字列として扱う
+                        codes[:self.rows] = self._category_codes(col, pd.Series(buffer[:self.rows]).astype("str"))
+                    buffer = codes
+                buffer[self.rows:needed] = self._category_codes(col, series)
+                self._columns[col] = buffer
+                continue
+            if is_text:
+                # 文字列の列は一括読み込みと同じ str 型のチャンクを並べて持つ（frame() で連結する）
+                if buffer is None:
+                    buffer = [pd.array([None] * self.rows, dtype="str")] if self.rows else []
+                elif isinstance(buffer, np.ndarray):
+                    buffer = [pd.array(buffer[:self.rows].astype(object), dtype="str")]
+                buffer.append(series.array if series.dtype == "str" else pd.array(series.to_numpy(dtype=object), dtype="str"))
+                self._columns[col] = buffer
+                continue
+            values = series.to_numpy()
+            if self.compact and buffer is not None and buffer.dtype.kind == 'f' and values.dtype.kind == 'f':
+                # 最初のチャンクで決めた精度（測定値は float32、時間軸は float64）を保つ
+                values = values.astype(buffer.dtype, copy=False)
+            if buffer is None:
+                buffer = np.empty(self._capacity, dtype=values.dtype)
+                if buffer.dtype.kind == 'f':
+                    buffer[:self.rows] = np.nan
+            elif buffer.dtype != values.dtype:
+                # 途中で型が変わった列（整数→欠損値ありなど）は共通の型に揃える
+                numeric = buffer.dtype.kind in 'biuf' and values.dtype.kind in 'biuf'
+                buffer = buffer.astype(np.result_type(buffer.dtype, values.dtype) if numeric else object)
+            buffer[self.rows:needed] = values
+            self._columns[col] = buffer
+        self.rows = needed
+
+    def _category_codes(self, col, series):
+        """
+        Return the codes of ``series`` in the categories collected so far for ``col`` (-1 for missing values).
+        """
+        codes, uniques = pd.factorize(series)
+        categories = self._categories.setdefault(col, {})
+        if not len(uniques):
+            return np.full(len(codes), -1, dtype=np.int32)
+        mapping = np.array([categories.setdefault(value, len(categories)) for value in uniques], dtype=np.int32)
+        return np.where(codes >= 0, mapping[codes], -1).astype(np.int32)
+
+    def frame(self):
+        """
+        Return all rows parsed so far as a DataFrame backed by the column buffers.
+        """
+        columns = {}
+        for col, buffer in self._columns.items():
+            if col in self._categories:
+                categories = pd.Index(list(self._categories[col]), dtype="str")
+                column = pd.Categorical.from_codes(buffer[:self.rows], categories)
+                # 種類の多い列は compact_dtypes と同じく文字列のままにする
+                columns[col] = column.astype("str") if len(categories) > MAX_CATEGORY_RATIO * self.rows else column
+                continue
+            if isinstance(buffer, list):
+                if len(buffer) > 1:
+                    # 連結した配列を次回以降も使う
+                    buffer[:] = [pd.concat([pd.Series(part, copy=False) for part in buffer], ignore_index=True).array]
+                columns[col] = pd.Series(buffer[0], copy=False)
+                continue
+            values = buffer[:self.rows]
+            columns[col] = pd.Series(values, dtype=object, copy=False) if values.dtype == object else values
+        return pd.DataFrame(columns, copy=False)
@@ -22,7 +22,8 @@ def filter_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     if not modify:
         return st.session_state.get('df_origin', None)
 
-    df = df.copy()
+    # 列の置き換えとフィルタリングは新しいオブジェクトを作るので浅いコピーで十分
+    df = df.copy(deep=False)
 
     # Try to convert datetimes into a standard format (datetime, no timezone)
     for col in df.columns:
@@ -1,9 +1,246 @@
+import hashlib
+import json
+import weakref
+
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
+import numpy as np
+import pandas as pd
+
+from modules.cache import MemoryLRUCache, frame_fingerprint
+from modules.downsampling import DEFAULT_MAX_POINTS, downsample_frame
+
+# この点数以上を描くときは WebGL（Scattergl）に切り替える（ページ内の WebGL コンテキスト数には上限があるため小さな図は SVG のまま）
+DEFAULT_WEBGL_MIN_POINTS = 20000
+
+# 組み立て済みの図のキャッシュ（プロセス内の全セッションで共有）
+DEFAULT_FIGURE_CACHE_BYTES = 256 * 1024 * 1024
+figure_cache = MemoryLRUCache(DEFAULT_FIGURE_CACHE_BYTES)
+# 図から HTML 出力を引くための対応表（キャッシュから外れた図は自動的に消える）
+_prepared_figures = weakref.WeakValueDictionary()
+
+# 折れ線グラフの間引き方法の表示名
+DOWNSAMPLE_LABELS = {"min-max（ピークを保持）": "minmax", "LTTB（形状を保持）": "lttb", "間引かない": None}
+
+
+class PreparedFigure:
+    """
+    A built figure kept in ``figure_cache`` together with its HTML export.
+    """
+
+    def __init__(self, figure, caption=None):
+        self.figure = figure
+        self.caption = caption
+        # ダウンロード用の HTML は組み立て時に一度だけシリアライズする
+        self.html = figure.to_html(include_plotlyjs='cdn').encode()
+
+    @property
+    def nbytes(self):
+        # 図のデータは HTML に埋め込まれた JSON とほぼ同じ大きさになる
+        return 2 * len(self.html)
+
+
+def settings_digest(settings):
+    """
+    Return a canonical hash of a settings dict (key order does not matter).
+    """
+    text = json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def array_fingerprint(*arrays):
+    """
+    Return a hash of the contents of numpy arrays, used to key figures built from them.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(repr((array.shape, array.dtype.str)).encode('ascii'))
+        digest.update(array.view(np.uint8) if array.dtype != object else repr(array.tolist()).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_figure(name, data_key, settings, build):
+    """
+    Return a prepared figure, building it only when the data or the settings changed.
+
+    Args:
+    name (str): Name of the figure builder.
+    data_key: Fingerprint of the plotted data.
+    settings (dict): Every setting the figure depends on.
+    build (callable): Returns the figure, or ``(figure, caption)``.
+
+    Returns:
+    PreparedFigure: The cached figure. It must not be modified by the caller.
+    """
+    figure_cache.resize(int(st.session_state.get('figure_cache_max_mb', 256)) * 1024 * 1024)
+    key = (name, data_key, settings_digest(settings))
+    prepared = figure_cache.get(key)
+    if prepared is None:
+        result = build()
+        figure, caption = result if isinstance(result, tuple) else (result, None)
+        prepared = PreparedFigure(figure, caption)
+        figure_cache.put(key, prepared, prepared.nbytes)
+    _prepared_figures[id(prepared.figure)] = prepared
+    return prepared
+
+
+def figure_html(fig):
+    """
+    Return the HTML export of a figure, reusing the one serialized by ``cached_figure``.
+    """
+    prepared = _prepared_figures.get(id(fig))
+    if prepared is not None and prepared.figure is fig:
+        return prepared.html
+    return fig.to_html(include_plotlyjs='cdn').encode()
+
+
+def webgl_min_points():
+    return int(st.session_state.get("webgl_min_points", DEFAULT_WEBGL_MIN_POINTS))
+
+
+def trace_colors(n):
+    """
+    Return ``n`` trace colors: ``Light24`` first, then colors sampled from ``Turbo`` so they never run out.
+    """
+    colors = list(px.colors.qualitative.Light24)
+    if n <= len(colors):
+        return colors
+    extra = n - len(colors)
+    return colors + px.colors.sample_colorscale("Turbo", [i / max(1, extra - 1) for i in range(extra)])
+
+
+def use_webgl(n_points):
+    """
+    Return whether ``n_points`` points should be drawn with WebGL traces.
+    """
+    return n_points >= webgl_min_points()
+
+
+def build_line_traces(series, x_label="x", colors=None, secondary=()):
+    """
+    Build all line traces at once instead of adding them one by one.
+
+    Scattergl is used when the total number of points reaches ``webgl_min_points``.
+
+    Args:
+    series (list): ``(name, x, y)`` of each line.
+    x_label (str): X column name shown in the hover text, as ``px.line`` does.
+    colors (list): Trace colors. ``trace_colors`` is used when None.
+    secondary (iterable): Names of the lines drawn on the right Y axis.
+
+    Returns:
+    list: Scatter or Scattergl traces.
+    """
+    colors = colors or trace_colors(len(series))
+    trace_type = go.Scattergl if use_webgl(sum(len(y) for _, _, y in series)) else go.Scatter
+    secondary = set(secondary)
+    return [
+        trace_type(
+            x=np.asarray(x), y=np.asarray(y), mode='lines', name=name, legendgroup=name,
+            line=dict(color=colors[i]), yaxis='y2' if name in secondary else None,
+            hovertemplate=f"variable={name}<br>{x_label}=%{{x}}<br>value=%{{y}}<extra></extra>",
+        )
+        for i, (name, x, y) in enumerate(series)
+    ]
+
+
+def line_reduction_options(df, x_col, y_cols):
+    """
+    Show the downsampling controls of a line chart when it exceeds ``line_max_points``.
+
+    A range slider on the X column re-queries the selected range, so zooming in
+    shows the original samples again once the range holds few enough rows.
+
+    Args:
+    df (pd.DataFrame): Data to plot.
+    x_col (str): Column used for the X axis.
+    y_cols (list): Columns drawn as lines.
+
+    Returns:
+    dict or None: ``method``, ``x_range`` and ``max_points`` for ``reduce_line_data``, or None to draw ``df`` as it is.
+    """
+    max_points = int(st.session_state.get("line_max_points", DEFAULT_MAX_POINTS))
+    if len(df) <= max_points or x_col not in df.columns or not y_cols:
+        return None
+    method = DOWNSAMPLE_LABELS[st.radio("間引き表示", list(DOWNSAMPLE_LABELS), horizontal=True, key="line_downsample_radio")]
+    if method is None:
+        return None
+
+    x_range = None
+    x = df[x_col]
+    is_datetime = pd.api.types.is_datetime64_any_dtype(x.dtype)
+    if is_datetime or (pd.api.types.is_numeric_dtype(x.dtype) and not pd.api.types.is_bool_dtype(x.dtype)):
+        lo, hi = x.min(), x.max()
+        if pd.notna(lo) and pd.notna(hi) and lo < hi:
+            if is_datetime:
+                lo, hi, step = lo.to_pydatetime(), hi.to_pydatetime(), None
+            elif pd.api.types.is_integer_dtype(x.dtype):
+                lo, hi, step = int(lo), int(hi), 1
+            else:
+                lo, hi = float(lo), float(hi)
+                step = (hi - lo) / 1000
+            x_range = st.slider("表示範囲（X軸）", min_value=lo, max_value=hi, value=(lo, hi), step=step, key="line_x_range_slider")
+            if x_range == (lo, hi):
+                x_range = None
+    return {"method": method, "x_range": x_range, "max_points": max_points}
+
+
+def line_chart_columns(settings):
+    """
+    Return the columns drawn as lines by ``create_plot`` for the line chart settings.
+    """
+    if settings.get('use_secondary_y') and settings.get('secondary_y_axis'):
+        return list(settings['primary_y_axis']) + list(settings['secondary_y_axis'])
+    return [settings['y_axis']] if isinstance(settings['y_axis'], str) else list(settings['y_axis'])
+
+
+def reduce_line_data(df, x_col, y_cols, options, group_col=None, pyramid=None):
+    """
+    Downsample the series of a line chart with the options of ``line_reduction_options``.
+
+    Min-max reduction over a sorted X column is answered by ``pyramid`` when given.
+
+    Args:
+    df (pd.DataFrame): Data to plot.
+    x_col (str): Column used for the X axis.
+    y_cols (list): Columns drawn as lines.
+    options (dict): Result of ``line_reduction_options``. None draws ``df`` as it is.
+    group_col (str): Column passed as ``color`` to ``px.line``.
+    pyramid (MinMaxPyramid): Index of ``y_cols`` over ``x_col`` (see ``data_loader.load_pyramid``).
+
+    Returns:
+    tuple: ``(reduced, caption)`` where ``reduced`` is long-form data from
+    ``downsample_frame`` (None when not reduced) and ``caption`` describes the reduction.
+    """
+    if options is None:
+        return None, None
+    method, x_range, max_points = options["method"], options["x_range"], options["max_points"]
+    # 並んだX軸の min-max はピラミッドに問い合わせ、表示範囲の行数によらず出力点数に比例する時間で求める
+    use_pyramid = pyramid is not None and all(col in pyramid.levels for col in y_cols) and len(pyramid.x) == len(df)
+    if method == "minmax" and group_col is None and x_col not in y_cols and use_pyramid:
+        reduced = pyramid.query_frame(y_cols, x_range, max_points, x_col=x_col)
+    else:
+        reduced = downsample_frame(df, x_col, y_cols, max_points=max_points, method=method, x_range=x_range, group_col=group_col)
+    return reduced, f"{len(df) * len(y_cols):,}点中 {len(reduced):,}点を表示しています。"
+
 
 # グラフ生成関数の定義
-def create_plot(chart_type, df, settings):
+def create_plot(chart_type, df, settings, pyramid=None, data_key=None):
+    """
+    Create the chart selected in the main panel.
+
+    Args:
+    chart_type (str): Chart type shown in ``graph_type_selector``.
+    df (pd.DataFrame): Data to plot.
+    settings (dict): Graph settings of the chart type.
+    pyramid (MinMaxPyramid): Index of the line columns over the X axis, used to downsample line charts.
+    data_key (tuple): Identity of ``df`` used as the figure cache key. The data fingerprint is used when None.
+
+    Returns:
+    tuple: ``(fig, graph_title)``, or ``(None, None)`` for an unknown chart type.
+    """
 
     colors = px.colors.qualitative.Light24
 
@@ -12,43 +249,91 @@ def create_plot(chart_type, df, settings):
         color = st.selectbox("凡例の列を選択", [None] + df.columns.tolist(), key="color_selectbox") if add_color else None
 
         if chart_type == "折れ線グラフ":
-            if settings['use_secondary_y'] and settings['secondary_y_axis']:
-                fig = go.Figure()
-                for i, y in enumerate(settings['primary_y_axis']):
-                    fig.add_trace(go.Scatter(x=df[settings['x_axis']], y=df[y], mode='lines', name=y, marker=dict(color=colors[i])))
-                for j, y in enumerate(settings['secondary_y_axis']):
-                    fig.add_trace(go.Scatter(x=df[settings['x_axis']], y=df[y], mode='lines', name=y, yaxis='y2', marker=dict(color=colors[i+j+1])))
-                fig.update_layout(
-                    yaxis2=dict(title=settings['secondary_y_axis_title'], overlaying='y', side='right'),
-                    title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
-                    xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
-                    yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
-                    xaxis=dict(
-                        tickfont=dict(size=settings['x_axis_value_size'])
-                    ),
-                    yaxis=dict(
-                        tickfont=dict(size=settings['y_axis_value_size'])
+            line_cols = line_chart_columns(settings)
+        else:
+            line_cols = [settings['y_axis']] if isinstance(settings['y_axis'], str) else list(settings['y_axis'])
+        reduction = line_reduction_options(df, settings['x_axis'], line_cols) if chart_type == "折れ線グラフ" else None
+
+        def build():
+            caption = None
+            if chart_type == "折れ線グラフ":
+                if settings['use_secondary_y'] and settings['secondary_y_axis']:
+                    reduced, caption = reduce_line_data(df, settings['x_axis'], line_cols, reduction, pyramid=pyramid)
+
+                    def series(y):
+                        if reduced is None:
+                            return y, df[settings['x_axis']], df[y]
+                        part = reduced[reduced['variable'] == y]
+                        return y, part[settings['x_axis']], part['value']
+
+                    lines = [series(y) for y in line_cols]
+                    fig = go.Figure(data=build_line_traces(lines, settings['x_axis'], secondary=settings['secondary_y_axis']))
+                    fig.update_layout(
+                        yaxis2=dict(title=settings['secondary_y_axis_title'], overlaying='y', side='right'),
+                        title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
+                        xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
+                        yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
+                        xaxis=dict(
+                            tickfont=dict(size=settings['x_axis_value_size'])
+                        ),
+                        yaxis=dict(
+                            tickfont=dict(size=settings['y_axis_value_size'])
+                        )
                     )
-                )
-            else:
-                fig = px.line(df, x=settings['x_axis'], y=settings['y_axis'], color=color, title=settings['graph_title'], color_discrete_sequence=colors)
-        elif chart_type == "棒グラフ":
-            fig = px.bar(df, x=settings['x_axis'], y=settings['y_axis'], color=color, title=settings['graph_title'], color_discrete_sequence=colors)
-        elif chart_type == "散布図":
-            fig = px.scatter(df, x=settings['x_axis'], y=settings['y_axis'], color=color, title=settings['graph_title'], color_discrete_sequence=colors)
+                else:
+                    reduced, caption = reduce_line_data(df, settings['x_axis'], line_cols, reduction, group_col=color, pyramid=pyramid)
+                    if color is None:
+                        # 系列ごとのトレースをまとめて作る（px.line の横持ちと同じ凡例・ホバー表示）
+                        if reduced is None:
+                            lines = [(y, df[settings['x_axis']], df[y]) for y in line_cols]
+                        else:
+                            lines = [(y, part[settings['x_axis']], part['value']) for y, part in reduced.groupby('variable', sort=False)]
+                        fig = go.Figure(data=build_line_traces(lines, settings['x_axis']))
+                        fig.update_layout(legend_title_text='variable')
+                    else:
+                        data = df if reduced is None else reduced
+                        render_mode = 'webgl' if use_webgl(len(data) * (len(line_cols) if reduced is None else 1)) else 'svg'
+                        group_colors = trace_colors(data[color].nunique())
+                        if reduced is None:
+                            fig = px.line(df, x=settings['x_axis'], y=line_cols, color=color, title=settings['graph_title'],
+                                          color_discrete_sequence=group_colors, render_mode=render_mode)
+                        else:
+                            # 間引いた系列は縦持ちのまま描く（横持ちの px.line と同じ凡例になる）
+                            fig = px.line(
+                                reduced, x=settings['x_axis'], y='value', color=color, line_group='variable',
+                                hover_data=['variable'], title=settings['graph_title'], color_discrete_sequence=group_colors,
+                                render_mode=render_mode,
+                            )
+            elif chart_type == "棒グラフ":
+                fig = px.bar(df, x=settings['x_axis'], y=settings['y_axis'], color=color, title=settings['graph_title'], color_discrete_sequence=colors)
+            elif chart_type == "散布図":
+                n_series = 1 if isinstance(settings['y_axis'], str) else len(settings['y_axis'])
+                fig = px.scatter(df, x=settings['x_axis'], y=settings['y_axis'], color=color, title=settings['graph_title'],
+                                 color_discrete_sequence=colors, render_mode='webgl' if use_webgl(len(df) * n_series) else 'svg')
 
-        fig.update_layout(
-            title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
-            xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
-            yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
-            xaxis=dict(
-                tickfont=dict(size=settings['x_axis_value_size'])
-            ),
-            yaxis=dict(
-                tickfont=dict(size=settings['y_axis_value_size'])
+            fig.update_layout(
+                title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
+                xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
+                yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
+                xaxis=dict(
+                    tickfont=dict(size=settings['x_axis_value_size'])
+                ),
+                yaxis=dict(
+                    tickfont=dict(size=settings['y_axis_value_size'])
+                )
             )
+            return fig, caption
+
+        # 描画する列とグラフ設定が前回と同じなら組み立て済みの図を使う
+        plotted = [col for col in dict.fromkeys([settings['x_axis'], *line_cols, color]) if col in df.columns]
+        prepared = cached_figure(
+            "create_plot", frame_fingerprint(df[plotted]) if data_key is None else data_key,
+            dict(settings, chart_type=chart_type, color=color, reduction=reduction, webgl_min_points=webgl_min_points()),
+            build,
         )
-        return fig, settings['graph_title']
+        if prepared.caption:
+            st.caption(prepared.caption)
+        return prepared.figure, settings['graph_title']
 
     elif chart_type == "ヒストグラム":
         numeric_columns = df.select_dtypes(include='number').columns.tolist()
@@ -60,74 +345,129 @@ def create_plot(chart_type, df, settings):
         add_color = st.checkbox("凡例を追加する（color）", key="histogram_add_color_checkbox")
         color = st.selectbox("凡例の列を選択", [None] + df.columns.tolist(), key="histogram_color_selectbox") if add_color else None
 
-        fig = px.histogram(df, x=column, color=color, title=settings['graph_title'], color_discrete_sequence=colors)
-        fig.update_layout(
-            title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
-            xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
-            yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
-            xaxis=dict(
-                tickfont=dict(size=settings['x_axis_value_size'])
-            ),
-            yaxis=dict(
-                tickfont=dict(size=settings['y_axis_value_size'])
+        def build():
+            fig = px.histogram(df, x=column, color=color, title=settings['graph_title'], color_discrete_sequence=colors)
+            fig.update_layout(
+                title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
+                xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
+                yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
+                xaxis=dict(
+                    tickfont=dict(size=settings['x_axis_value_size'])
+                ),
+                yaxis=dict(
+                    tickfont=dict(size=settings['y_axis_value_size'])
+                )
             )
+            return fig
+
+        plotted = [col for col in dict.fromkeys([column, color]) if col in df.columns]
+        prepared = cached_figure(
+            "create_plot", frame_fingerprint(df[plotted]) if data_key is None else data_key,
+            dict(settings, chart_type=chart_type, column=column, color=color), build,
         )
-        return fig, settings['graph_title']
+        return prepared.figure, settings['graph_title']
     
     elif chart_type == 'ヒートマップ':
-        # FFTヒートマップの作成
-        heatmap = go.Heatmap(z=df.values, 
-                            x=df.columns, 
-                            y=df.index, 
-                            colorscale='Viridis')
+        def build():
+            # FFTヒートマップの作成
+            heatmap = go.Heatmap(z=df.values, 
+                                x=df.columns, 
+                                y=df.index, 
+                                colorscale='Viridis')
 
-        # グラフレイアウトの作成
-        layout = go.Layout(
-            title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
-            xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
-            yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
-            xaxis=dict(
-                tickfont=dict(size=settings['x_axis_value_size'])
-            ),
-            yaxis=dict(
-                tickfont=dict(size=settings['y_axis_value_size'])
+            # グラフレイアウトの作成
+            layout = go.Layout(
+                title={'text': settings['graph_title'], 'x': 0.5, 'xanchor': 'center', 'font': {'size': settings['title_font_size']}},
+                xaxis_title={'text': settings['x_axis_title'], 'font': {'size': settings['x_axis_title_font_size']}},
+                yaxis_title={'text': settings['y_axis_title'], 'font': {'size': settings['y_axis_title_font_size']}},
+                xaxis=dict(
+                    tickfont=dict(size=settings['x_axis_value_size'])
+                ),
+                yaxis=dict(
+                    tickfont=dict(size=settings['y_axis_value_size'])
+                )
             )
-        )
-        # 図の作成
-        fig = go.Figure(data=[heatmap], layout=layout)
-        return fig, settings['graph_title']
+            # 図の作成
+            fig = go.Figure(data=[heatmap], layout=layout)
+            return fig
+
+        prepared = cached_figure("create_plot", frame_fingerprint(df) if data_key is None else data_key, dict(settings, chart_type=chart_type), build)
+        return prepared.figure, settings['graph_title']
 
     return None, None
 
 
-def create_fft_plot(freqs, amp_df):
+def create_fft_plot(freqs, amp_df, title="FFT結果", yaxis_title="加速度", log_y=False):
     """Create a line plot of FFT results."""
-    colors = px.colors.qualitative.Light24
-    fig = go.Figure()
-    for i, col in enumerate(amp_df.columns):
-        fig.add_trace(
-            go.Scatter(x=freqs, y=amp_df[col], mode="lines", name=col, marker=dict(color=colors[i]))
+    def build():
+        fig = go.Figure(data=build_line_traces([(col, freqs, amp_df[col]) for col in amp_df.columns], "周波数(Hz)"))
+        fig.update_layout(
+            title={"text": title, "x": 0.5, "xanchor": "center"},
+            xaxis_title="周波数(Hz)",
+            yaxis_title=yaxis_title,
+            xaxis=dict(tickfont=dict(size=12)),
+            yaxis=dict(tickfont=dict(size=12), type="log" if log_y else "linear"),
         )
+        return fig
+
+    data_key = (frame_fingerprint(amp_df), array_fingerprint(freqs))
+    settings = {"title": title, "yaxis_title": yaxis_title, "log_y": log_y, "webgl_min_points": webgl_min_points()}
+    return cached_figure("create_fft_plot", data_key, settings, build).figure
+
+
+def create_window_preview_plot(preview_df, x_col, start, end):
+    """Create an overview of the whole record with the FFT window highlighted."""
+    fig = px.line(preview_df, x=x_col, y="value", color="variable", color_discrete_sequence=px.colors.qualitative.Light24)
+    fig.add_vrect(x0=start, x1=end, fillcolor="orange", opacity=0.3, line_width=0)
+    fig.update_layout(height=200, margin=dict(l=10, r=10, t=10, b=10), xaxis_title=None, yaxis_title=None, legend_title_text=None)
+    return fig
+
+
+def create_rolling_metrics_plot(rolling_df, metric="rms"):
+    """Create a time-series plot of a rolling acceleration metric for each axis."""
+    metric_cols = [col for col in rolling_df.columns if col.endswith(f"_{metric}")]
+    lines = [(col[: -len(metric) - 1], rolling_df.index, rolling_df[col]) for col in metric_cols]
+    fig = go.Figure(data=build_line_traces(lines, "時間(sec)"))
     fig.update_layout(
-        title={"text": "FFT結果", "x": 0.5, "xanchor": "center"},
-        xaxis_title="周波数(Hz)",
-        yaxis_title="加速度",
+        title={"text": f"移動窓の{metric}", "x": 0.5, "xanchor": "center"},
+        xaxis_title="時間(sec)",
+        yaxis_title=metric,
         xaxis=dict(tickfont=dict(size=12)),
         yaxis=dict(tickfont=dict(size=12)),
     )
     return fig
 
 
-def create_fft_heatmap(freqs, times, amp_matrix, axis_label=""):
-    """Create a heatmap showing FFT amplitude over time."""
-    heatmap = go.Heatmap(z=amp_matrix, x=times, y=freqs, colorscale="Viridis")
-    title = "FFTヒートマップ" if axis_label == "" else f"{axis_label} FFTヒートマップ"
-    layout = go.Layout(
-        title={"text": title, "x": 0.5, "xanchor": "center"},
-        xaxis_title="時間(sec)",
-        yaxis_title="周波数(Hz)",
+def create_angle_sweep_plot(sweep_df, metric="rms", principal_angle=None):
+    """Create a line plot of an acceleration metric against the XY rotation angle."""
+    lines = [(axis, sweep_df.index, sweep_df[f"{axis}_{metric}"]) for axis in ["X", "Y"]]
+    fig = go.Figure(data=build_line_traces(lines, "回転角度(deg)"))
+    if principal_angle is not None:
+        fig.add_vline(x=principal_angle, line_dash="dash", annotation_text=f"主軸 {principal_angle:.1f}°")
+    fig.update_layout(
+        title={"text": "回転角度ごとの評価値", "x": 0.5, "xanchor": "center"},
+        xaxis_title="回転角度(deg)",
+        yaxis_title=metric,
         xaxis=dict(tickfont=dict(size=12)),
         yaxis=dict(tickfont=dict(size=12)),
     )
-    fig = go.Figure(data=[heatmap], layout=layout)
     return fig
+
+
+def create_fft_heatmap(freqs, times, amp_matrix, axis_label="", log_freq=False, colorbar_title=None):
+    """Create a heatmap showing FFT amplitude over time."""
+    def build():
+        heatmap = go.Heatmap(z=amp_matrix, x=times, y=freqs, colorscale="Viridis", colorbar=dict(title=colorbar_title))
+        title = "FFTヒートマップ" if axis_label == "" else f"{axis_label} FFTヒートマップ"
+        layout = go.Layout(
+            title={"text": title, "x": 0.5, "xanchor": "center"},
+            xaxis_title="時間(sec)",
+            yaxis_title="周波数(Hz)",
+            xaxis=dict(tickfont=dict(size=12)),
+            yaxis=dict(tickfont=dict(size=12), type="log" if log_freq else "linear"),
+        )
+        return go.Figure(data=[heatmap], layout=layout)
+
+    data_key = array_fingerprint(freqs, times, amp_matrix)
+    settings = {"axis_label": axis_label, "log_freq": log_freq, "colorbar_title": colorbar_title}
+    return cached_figure("create_fft_heatmap", data_key, settings, build).figure
@@ -39,19 +39,35 @@ def load_config():
     with pkg_resources.open_text('config', 'config.json') as f:
         return json.load(f)
     
-def get_user_settings_path():
+def get_user_documents_dir():
     # Windows の場合、ユーザーのドキュメントフォルダに保存する
     if os.name == 'nt':
         user_documents = os.path.join(os.path.expanduser('~'), 'Documents')
     else:
         # 他のシステム (Linux, macOS) の場合はホームディレクトリに保存する
         user_documents = os.path.expanduser('~')
-        
+    return user_documents
+
+def get_user_settings_path():
     # ユーザー設定ファイルの完全なパスを指定
-    user_settings_path = os.path.join(user_documents, 'user_settings.json')
+    user_settings_path = os.path.join(get_user_documents_dir(), 'user_settings.json')
     
     return user_settings_path
 
+def get_cache_dir():
+    # 環境変数 DATA_VISUALIZATION_CACHE_DIR が設定されていればそれを使い、
+    # なければユーザー設定ファイルと同じ場所にキャッシュフォルダを作る
+    cache_dir = os.environ.get('DATA_VISUALIZATION_CACHE_DIR') or os.path.join(get_user_documents_dir(), 'data_visualization_cache')
+
+    return cache_dir
+
+def get_data_dir():
+    # サーバー側のデータフォルダ。環境変数 DATA_VISUALIZATION_DATA_DIR が優先され、
+    # なければ設定ファイルの data_directory を使う（空の場合はフォルダ読み込みを無効にする）
+    data_dir = os.environ.get('DATA_VISUALIZATION_DATA_DIR') or st.session_state.get('data_directory', '')
+
+    return data_dir
+
 def save_user_settings(settings):
     user_settings_path = get_user_settings_path()
     
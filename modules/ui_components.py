@@ -1,11 +1,91 @@
 # modules/ui_components.py
+import os
+
 import streamlit as st
 
-from modules.state_manager import reset_session_state_to_default, apply_user_settings, save_user_settings
+from modules.state_manager import reset_session_state_to_default, apply_user_settings, save_user_settings, get_data_dir
+from modules.file_loader import list_data_files
 
 def file_uploader():
+    # サーバー側のデータフォルダが設定されている場合は読み込み元を選択できるようにする
+    data_dir = get_data_dir()
+    if data_dir:
+        source = st.radio("データの読み込み元", ["ファイルアップロード", "サーバーのフォルダ", "サーバーのフォルダ（一括）"], horizontal=True, key="data_source_radio")
+        if source == "サーバーのフォルダ":
+            return server_file_selector(data_dir)
+        elif source == "サーバーのフォルダ（一括）":
+            return server_batch_selector(data_dir)
     return st.file_uploader("ファイルをアップロード", type=["csv", "xlsx"])
 
+def server_file_selector(data_dir):
+    """
+    Select a CSV or Excel file in the server-side data directory.
+
+    Returns:
+        str or None: Path of the selected file.
+    """
+    file_names = list_data_files(data_dir)
+    if not file_names:
+        st.warning(f"{data_dir} にCSVまたはExcelファイルがありません。")
+        return None
+    file_name = st.selectbox("ファイルを選択", [None] + file_names, key="server_file_selectbox")
+    if file_name is None:
+        return None
+    path = os.path.join(data_dir, file_name)
+    if file_name.lower().endswith('.csv'):
+        live_follow_controls(path)
+    return path
+
+def live_follow_controls(path):
+    """
+    Toggle the live mode that reads only the rows appended to a growing CSV file.
+
+    While the mode is on, the file size is checked every few seconds and the app
+    reruns when the file has grown.
+    """
+    live = st.toggle("ライブ更新（追記された行のみ読み込む）", key="live_follow_toggle")
+    if live:
+        interval = st.number_input("更新間隔(sec)", min_value=1.0, value=5.0, step=1.0, key="live_refresh_interval")
+        st.fragment(_watch_file_size, run_every=interval)(path)
+    return live
+
+def _watch_file_size(path):
+    size = os.path.getsize(path)
+    previous = st.session_state.get('live_watch_size')
+    st.session_state['live_watch_size'] = size
+    if previous is not None and size != previous:
+        st.rerun(scope="app")
+
+def server_batch_selector(data_dir):
+    """
+    Select several CSV files in the server-side data directory for batch loading.
+
+    Returns:
+        list or None: Paths of the selected files.
+    """
+    file_names = [name for name in list_data_files(data_dir) if name.lower().endswith('.csv')]
+    if not file_names:
+        st.warning(f"{data_dir} にCSVファイルがありません。")
+        return None
+    selected = st.multiselect("ファイルを選択（複数可）", file_names, key="server_batch_multiselect")
+    if not selected:
+        return None
+    return [os.path.join(data_dir, file_name) for file_name in selected]
+
+def excel_range_selector(sheet_names):
+    """
+    Select the sheet and an optional cell range of an Excel file.
+
+    Args:
+        sheet_names (list): Sheet names from ``data_loader.list_uploaded_sheets``.
+
+    Returns:
+        tuple: ``(sheet_name, cell_range)``. ``cell_range`` is None when the whole sheet is read.
+    """
+    sheet_name = st.selectbox("シートを選択", sheet_names, key="excel_sheet_selectbox")
+    cell_range = st.text_input("セル範囲（例: A1:F1000、空欄でシート全体）", value="", key="excel_range_input").strip()
+    return sheet_name, cell_range or None
+
 def graph_type_selector(data_type):
     if data_type == 'GRAPHTEC':
         chart_types = ["折れ線グラフ"]
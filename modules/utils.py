@@ -98,20 +98,23 @@ def filter_dataframe(df: pd.DataFrame, key='origin') -> pd.DataFrame:
     return df
 
 # chartをhtmlファイルでダウンロード
-def download_chart_html(fig, title, key='download_chart_html'):
+def download_chart_html(fig, title, key='download_chart_html', html=None):
     '''
     download a plotly chart as a htmlfile
     
     Args:
         fig : plotly chart
         title : filename str
+        html : pre-serialized html bytes (serialized from fig when None)
     Returns:
          :
      
     '''
-    html_buff=io.StringIO()
-    fig.write_html(html_buff, include_plotlyjs='cdn')
-    html_bytes = html_buff.getvalue().encode()
+    if html is None:
+        html_buff=io.StringIO()
+        fig.write_html(html_buff, include_plotlyjs='cdn')
+        html = html_buff.getvalue().encode()
+    html_bytes = html
     st.download_button(
         label = 'Download Chart',
         data = html_bytes,
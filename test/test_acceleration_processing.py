@@ -1,11 +1,12 @@
 import unittest
 import os
 import sys
+import numpy as np
 import pandas as pd
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from modules.data_processing import rotate_xy, calc_accel_metrics
+from modules.data_processing import rotate_xy, calc_accel_metrics, compact_dtypes, sweep_rotation_angles, principal_angle, rolling_accel_metrics, cached_metrics, metrics_cache, spectrum_cache
 
 class TestAccelerationProcessing(unittest.TestCase):
     def test_rotate_xy(self):
@@ -20,6 +21,69 @@ class TestAccelerationProcessing(unittest.TestCase):
         self.assertEqual(metrics['max'], 1)
         self.assertEqual(metrics['min'], -1)
         self.assertEqual(metrics['p2p'], 2)
+    def test_compact_dtypes(self):
+        n = 100
+        df = pd.DataFrame({
+            '番号': np.arange(n),
+            'CH1': np.sin(np.arange(n) * 0.1),
+            'Alarm': ['L'] * n,
+            '日付 時間': [f'2024/01/01 00:00:{i:02d}' for i in range(n)],
+            '経過時間(sec)': np.arange(n) * 0.5,
+        })
+        compact = compact_dtypes(df)
+        self.assertEqual(compact['CH1'].dtype, np.float32)
+        self.assertEqual(compact['番号'].dtype, np.int8)
+        self.assertIsInstance(compact['Alarm'].dtype, pd.CategoricalDtype)
+        self.assertEqual(compact['日付 時間'].dtype, df['日付 時間'].dtype)
+        self.assertEqual(compact['経過時間(sec)'].dtype, np.float64)
+        # 名前で指定していない時間軸も単調増加する列として元の精度のまま保持する
+        timed = compact_dtypes(df.assign(t_ms=7200000.0 + np.arange(n) * 0.001))
+        self.assertEqual(timed['t_ms'].dtype, np.float64)
+        self.assertLess(compact.memory_usage(deep=True).sum(), df.memory_usage(deep=True).sum())
+        np.testing.assert_allclose(compact['CH1'], df['CH1'], rtol=1e-6)
+
+        rotated = rotate_xy(compact, 'CH1', 'CH1', 30)
+        self.assertEqual(rotated['x_rot'].dtype, np.float32)
+        np.testing.assert_allclose(rotated['x_rot'], rotate_xy(df, 'CH1', 'CH1', 30)['x_rot'], rtol=1e-5, atol=1e-6)
+    def test_sweep_rotation_angles(self):
+        rng = np.random.default_rng(0)
+        major, minor = 3 * rng.standard_normal(2000), rng.standard_normal(2000)
+        angle = np.deg2rad(40)
+        df = pd.DataFrame({'x': major * np.cos(angle) - minor * np.sin(angle), 'y': major * np.sin(angle) + minor * np.cos(angle)})
+        sweep = sweep_rotation_angles(df, 'x', 'y', step=0.5)
+        self.assertEqual(len(sweep), 361)
+        self.assertAlmostEqual(sweep.attrs['principal_angle'], principal_angle(df, 'x', 'y'))
+        self.assertAlmostEqual(sweep.attrs['principal_angle'], -40, delta=2)
+        for angle_deg in [-90, -12.5, 0, 37]:
+            rotated = rotate_xy(df, 'x', 'y', angle_deg)
+            row = sweep.loc[angle_deg]
+            for axis, col in [('X', 'x_rot'), ('Y', 'y_rot')]:
+                metrics = calc_accel_metrics(rotated[col])
+                for name in ['rms', 'max', 'min', 'p2p']:
+                    self.assertAlmostEqual(row[f'{axis}_{name}'], metrics[name], places=9)
+    def test_rolling_accel_metrics(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({'X': rng.standard_normal(500), 'Y': rng.standard_normal(500), 'Time': np.arange(500) * 0.01})
+        df.loc[100:104, 'X'] = np.nan
+        for window in [1, 7, 64, 500]:
+            result = rolling_accel_metrics(df, window)
+            self.assertEqual(len(result), 501 - window)
+            for col in ['X', 'Y']:
+                rolling = df[col].rolling(window, min_periods=1)
+                expected_rms = np.sqrt((df[col] ** 2).rolling(window, min_periods=1).mean())
+                np.testing.assert_allclose(result[f'{col}_rms'], expected_rms.iloc[window - 1:], atol=1e-12)
+                np.testing.assert_array_equal(result[f'{col}_max'], rolling.max().iloc[window - 1:])
+                np.testing.assert_array_equal(result[f'{col}_p2p'], (rolling.max() - rolling.min()).iloc[window - 1:])
+        result = rolling_accel_metrics(df, 50, step=50)
+        np.testing.assert_allclose(result.index, np.arange(49, 500, 50) * 0.01)
+        self.assertAlmostEqual(result['Y_min'].iloc[0], df['Y'].iloc[:50].min())
+        # 評価値はFFT結果とは別のキャッシュに置く
+        metrics_cache.clear()
+        spectrum_entries = len(spectrum_cache)
+        cached = cached_metrics(rolling_accel_metrics, df, 50, step=50)
+        self.assertIs(cached_metrics(rolling_accel_metrics, df.copy(), 50, step=50), cached)
+        pd.testing.assert_frame_equal(cached, result)
+        self.assertEqual((len(metrics_cache), len(spectrum_cache)), (1, spectrum_entries))
 
 if __name__ == '__main__':
     unittest.main()
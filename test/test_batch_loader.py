@@ -0,0 +1,37 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from modules.batch_loader import load_logger_batch, BATCH_KEY_COLUMN
+from test_file_loader import make_graphtec_csv, make_nr600_csv
+
+class TestBatchLoader(unittest.TestCase):
+    def test_load_logger_batch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for name, raw in [('run1.csv', make_graphtec_csv(10)), ('run2.csv', make_graphtec_csv(5)),
+                              ('run3.csv', make_nr600_csv(8)), ('memo.csv', b'a,b\n1,2\n')]:
+                path = os.path.join(tmp_dir, name)
+                with open(path, 'wb') as f:
+                    f.write(raw)
+                paths.append(path)
+
+            df, file_info, throughput = load_logger_batch(paths, max_workers=2)
+            # ファイル数より多いワーカーは起動しない
+            single = load_logger_batch(paths[:1], max_workers=4)[2]
+
+        self.assertEqual(len(df), 23)
+        self.assertEqual(df[BATCH_KEY_COLUMN].value_counts()['run1.csv'], 10)
+        self.assertEqual(file_info['data_type'].to_list()[:3], ['GRAPHTEC', 'GRAPHTEC', 'NR600'])
+        self.assertIsNotNone(file_info['error'].iloc[3])
+        self.assertEqual(throughput['files'], 4)
+        self.assertEqual(throughput['workers'], 2)
+        self.assertEqual(single['workers'], 1)
+        self.assertGreater(throughput['mb_per_sec'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
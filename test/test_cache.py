@@ -0,0 +1,110 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.cache import DiskFrameCache, MemoryLRUCache, file_digest, frame_fingerprint
+
+class TestDiskFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        df = pd.DataFrame({
+            '日付 時間': ['2024/01/01 00:00:00', None, '2024/01/01 00:00:02'],
+            'CH1': [1.5, np.nan, 3.0],
+            '番号': [1, 2, 3],
+        })
+        cache = DiskFrameCache(self.cache_dir)
+        key = file_digest(b'raw content', 'csv')
+        self.assertIsNone(cache.get(key))
+        self.assertTrue(cache.put(key, df, {'data_type': 'GRAPHTEC', 'measurement_interval': 0.5}))
+
+        cached_df, metadata = cache.get(key)
+        self.assertEqual(metadata, {'data_type': 'GRAPHTEC', 'measurement_interval': 0.5})
+        self.assertEqual(cached_df.columns.to_list(), df.columns.to_list())
+        np.testing.assert_array_equal(cached_df['CH1'].to_numpy(), df['CH1'].to_numpy())
+        self.assertEqual(cached_df['番号'].dtype, np.int64)
+        self.assertTrue(cached_df['日付 時間'].isna().iloc[1])
+        self.assertEqual(cached_df['日付 時間'].iloc[2], '2024/01/01 00:00:02')
+
+    def test_digest_depends_on_content_and_options(self):
+        self.assertEqual(file_digest(b'abc', 'csv'), file_digest(b'abc', 'csv'))
+        self.assertNotEqual(file_digest(b'abc', 'csv'), file_digest(b'abd', 'csv'))
+        self.assertNotEqual(file_digest(b'abc', 'csv'), file_digest(b'abc', 'xlsx'))
+
+    def test_lru_eviction(self):
+        df = pd.DataFrame({'CH1': np.zeros(1000)})
+        cache = DiskFrameCache(self.cache_dir, max_bytes=20000)
+        cache.put('a', df, {})
+        cache.put('b', df, {})
+        # 'a' を参照して 'b' を最も古いエントリにする
+        time.sleep(0.01)
+        cache.get('a')
+        cache.put('c', df, {})
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_evict_removes_stale_partial_entries(self):
+        cache = DiskFrameCache(self.cache_dir)
+        cache.put('a', pd.DataFrame({'CH1': np.zeros(10)}), {})
+        # 同じ場所に置かれた他のキャッシュ（スペクトログラムなど）は残す
+        for name in ['.tmp-old', '.tmp-writing', 'pyramid', 'spectrogram']:
+            os.makedirs(os.path.join(self.cache_dir, name))
+        old = time.time() - 2 * 3600
+        for name in ['.tmp-old', 'pyramid', 'spectrogram']:
+            os.utime(os.path.join(self.cache_dir, name), (old, old))
+        cache.put('b', pd.DataFrame({'CH1': np.ones(10)}), {})
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['.tmp-writing', 'a', 'b', 'pyramid', 'spectrogram'])
+        self.assertEqual(cache.get('b')[0]['CH1'].iloc[0], 1.0)
+
+class TestMemoryLRUCache(unittest.TestCase):
+    def test_lru_eviction_under_budget(self):
+        cache = MemoryLRUCache(max_bytes=3 * 8000)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, np.zeros(1000))
+        cache.get('a')
+        cache.put('d', np.zeros(1000))
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.total_bytes, 3 * 8000)
+
+    def test_get_or_compute_counts_hits(self):
+        cache = MemoryLRUCache()
+        calls = []
+        compute = lambda: calls.append(1) or pd.DataFrame({'x': [1, 2]})
+        first = cache.get_or_compute('sample', compute)
+        second = cache.get_or_compute('sample', compute)
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+        cache.invalidate('sample')
+        self.assertNotIn('sample', cache)
+
+    def test_oversized_value_is_not_stored(self):
+        cache = MemoryLRUCache(max_bytes=100)
+        cache.put('big', np.zeros(1000))
+        self.assertEqual(len(cache), 0)
+
+    def test_frame_fingerprint(self):
+        df = pd.DataFrame({'X': np.arange(10000, dtype=float), 'Time': np.arange(10000) * 0.001})
+        fingerprint = frame_fingerprint(df)
+        self.assertEqual(fingerprint, frame_fingerprint(df.copy()))
+        changed = df.copy()
+        changed.loc[1234, 'X'] += 0.5
+        self.assertNotEqual(fingerprint, frame_fingerprint(changed))
+        self.assertNotEqual(fingerprint, frame_fingerprint(df[['X']]))
+        self.assertNotEqual(fingerprint, frame_fingerprint(df.astype({'X': np.float32})))
+
+if __name__ == '__main__':
+    unittest.main()
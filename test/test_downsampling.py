@@ -0,0 +1,125 @@
+import unittest
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.downsampling import downsample_frame, lttb_indices, minmax_indices, MinMaxPyramid, reduce_heatmap
+
+
+class TestDownsampling(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 10000
+        self.df = pd.DataFrame({
+            't': np.arange(n) * 0.01,
+            'a': rng.standard_normal(n).cumsum(),
+            'b': np.sin(np.arange(n) * 0.05),
+            'g': np.repeat(['x', 'y'], n // 2),
+        })
+
+    def test_minmax_keeps_peaks(self):
+        y = self.df['a'].copy()
+        y.iloc[1234] = np.nan
+        positions = minmax_indices(y, 200)
+        self.assertLessEqual(len(positions), 202)
+        self.assertEqual(positions[0], 0)
+        self.assertEqual(positions[-1], len(y) - 1)
+        self.assertIn(int(np.nanargmax(y)), positions)
+        self.assertIn(int(np.nanargmin(y)), positions)
+        np.testing.assert_array_equal(minmax_indices(y.iloc[:100], 200), np.arange(100))
+
+    def test_lttb(self):
+        positions = lttb_indices(self.df['t'], self.df['b'], 500)
+        self.assertEqual(len(positions), 500)
+        self.assertTrue(np.all(np.diff(positions) > 0))
+        self.assertEqual(positions[-1], len(self.df) - 1)
+        # 正弦波の山と谷は残る
+        self.assertGreater(self.df['b'].iloc[positions].max(), 0.999)
+        self.assertLess(self.df['b'].iloc[positions].min(), -0.999)
+
+    def test_downsample_frame(self):
+        reduced = downsample_frame(self.df, 't', ['a', 'b'], max_points=400)
+        self.assertEqual(reduced.columns.tolist(), ['t', 'variable', 'value'])
+        for col in ['a', 'b']:
+            part = reduced[reduced['variable'] == col]
+            self.assertLessEqual(len(part), 402)
+            self.assertEqual(part['value'].max(), self.df[col].max())
+            np.testing.assert_array_equal(part['value'], self.df.set_index('t').loc[part['t'], col])
+
+        # 拡大した範囲は間引かずに返す
+        zoomed = downsample_frame(self.df, 't', ['a'], max_points=400, x_range=(10.0, 12.0))
+        np.testing.assert_allclose(zoomed['t'], self.df['t'].iloc[1000:1201])
+
+        grouped = downsample_frame(self.df, 't', ['a'], max_points=400, method='lttb', group_col='g')
+        self.assertEqual(grouped.columns.tolist(), ['t', 'g', 'variable', 'value'])
+        self.assertEqual(grouped.groupby('g').size().tolist(), [400, 400])
+
+    def test_pyramid(self):
+        rng = np.random.default_rng(1)
+        n = 100003
+        x = np.arange(n) * 0.001
+        y = rng.standard_normal(n).cumsum()
+        y[500:600] = np.nan
+        pyramid = MinMaxPyramid.build(x, {'a': y})
+        level_bytes = sum(level[stat].nbytes for level in pyramid.levels['a'] for stat in level)
+        self.assertEqual(pyramid.nbytes, x.nbytes + y.nbytes + level_bytes)
+        with tempfile.TemporaryDirectory() as out_dir:
+            pyramid.save(out_dir)
+            reopened = MinMaxPyramid.open(out_dir, x, {'a': y})
+            for x_range in [None, (0.3, 77.7), (10.0, 10.5)]:
+                lo, hi = (0, n) if x_range is None else (np.searchsorted(x, x_range[0]), np.searchsorted(x, x_range[1], side='right'))
+                positions = reopened.query('a', x_range, max_points=1000)
+                self.assertLessEqual(len(positions), 1004)
+                self.assertEqual((positions[0], positions[-1]), (lo, hi - 1))
+                self.assertEqual(np.nanmax(y[positions]), np.nanmax(y[lo:hi]))
+                self.assertEqual(np.nanmin(y[positions]), np.nanmin(y[lo:hi]))
+            self.assertIsInstance(reopened.levels['a'][0]['sum'], np.memmap)
+
+            positions, means = reopened.query_mean('a', (20.0, 90.0), max_points=500)
+            size = positions[1] - positions[0]
+            self.assertLessEqual(len(means), 500)
+            self.assertAlmostEqual(means[3], y[positions[3]:positions[3] + size].mean())
+
+            frame = reopened.query_frame(['a'], (10.0, 10.5), x_col='t')
+            np.testing.assert_allclose(frame['t'], x[10000:10501])
+            del reopened, frame
+
+        # 追記されたデータは増えた分だけ計算しても一括で作った場合と同じになる
+        head = MinMaxPyramid.build(x[:70001], {'a': y[:70001]})
+        extended = head.extend(x, {'a': y})
+        for level, expected in zip(extended.levels['a'], pyramid.levels['a'], strict=True):
+            for stat in ('min_idx', 'max_idx', 'sum', 'count'):
+                np.testing.assert_array_equal(level[stat], expected[stat])
+
+    def test_reduce_heatmap(self):
+        rng = np.random.default_rng(2)
+        freqs, times = np.arange(257) * 2.0, np.arange(3001) * 0.5
+        amp = rng.random((257, 3001))
+        amp[100, 2000] = 50
+
+        heat_freqs, heat_times, matrix = reduce_heatmap(freqs, times, amp, max_rows=64, max_cols=200)
+        self.assertLessEqual(matrix.shape[0], 64)
+        self.assertLessEqual(matrix.shape[1], 200)
+        self.assertEqual(matrix.shape, (len(heat_freqs), len(heat_times)))
+        self.assertEqual(matrix.max(), 50)
+
+        _, _, mean = reduce_heatmap(freqs, times, amp, max_rows=64, max_cols=200, method='mean')
+        self.assertAlmostEqual(mean[0, 0], amp[:5, :16].mean())
+
+        # 拡大した範囲は元の解像度のまま返す
+        heat_freqs, heat_times, matrix = reduce_heatmap(freqs, times, amp, freq_range=(100, 300), time_range=(900, 1100))
+        np.testing.assert_array_equal(matrix, amp[50:151, 1800:2201])
+        np.testing.assert_array_equal(heat_times, times[1800:2201])
+
+        heat_freqs, _, matrix = reduce_heatmap(freqs, times, amp, max_rows=32, log_freq=True, db=True)
+        self.assertGreater(heat_freqs[0], 0)
+        self.assertTrue(np.all(np.diff(np.log(heat_freqs[1:])) > 0))
+        self.assertAlmostEqual(matrix.max(), 20 * np.log10(50))
+
+
+if __name__ == '__main__':
+    unittest.main()
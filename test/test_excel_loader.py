@@ -0,0 +1,54 @@
+import unittest
+import io
+import os
+import sys
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.excel_loader import list_excel_sheets, load_excel_streaming
+
+def make_workbook():
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = '概要'
+    worksheet.append(['項目', '値'])
+    worksheet.append(['測定間隔', 0.5])
+    worksheet = workbook.create_sheet('データ')
+    worksheet.append(['経過時間(sec)', 'CH1', 'CH2', None, 'CH1'])
+    for i in range(25):
+        worksheet.append([i * 0.5, float(i), i * 2.0, None if i % 2 else 'OK', -i])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+class TestExcelLoader(unittest.TestCase):
+    def setUp(self):
+        self.workbook = make_workbook()
+
+    def test_list_sheets(self):
+        self.assertEqual(list_excel_sheets(self.workbook), ['概要', 'データ'])
+
+    def test_matches_read_excel(self):
+        expected = pd.read_excel(self.workbook, sheet_name='データ')
+        df = load_excel_streaming(self.workbook, sheet_name='データ', batch_rows=10)
+        pd.testing.assert_frame_equal(df, expected)
+
+    def test_default_sheet(self):
+        df = load_excel_streaming(self.workbook)
+        self.assertEqual(df.columns.tolist(), ['項目', '値'])
+        self.assertEqual(df['値'].iloc[0], 0.5)
+
+    def test_cell_range(self):
+        df = load_excel_streaming(self.workbook, sheet_name='データ', cell_range='b1:c11')
+        self.assertEqual(df.columns.tolist(), ['CH1', 'CH2'])
+        self.assertEqual(len(df), 10)
+        self.assertEqual(df['CH2'].iloc[-1], 18.0)
+
+        df = load_excel_streaming(self.workbook, sheet_name='データ', cell_range='B2:C3', header=False)
+        self.assertEqual(df.values.tolist(), [[0.0, 0.0], [1.0, 2.0]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,14 @@
 import unittest
 import os
 import sys
+import tempfile
 import numpy as np
 import pandas as pd
+from unittest import mock
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from modules.data_processing import compute_fft, compute_fft_segments
+from modules.data_processing import compute_fft, compute_fft_segments, compute_stft, compute_welch_psd, cached_spectrum, spectrum_cache, compute_spectrogram_chunked, compute_zoom_fft, compute_fft_spectra, compute_stft_spectra, rotate_spectra
+from modules.data_processing import rotate_xy
+from modules import data_processing
 
 class TestFFT(unittest.TestCase):
     def test_compute_fft_peak(self):
@@ -20,6 +24,63 @@ class TestFFT(unittest.TestCase):
         self.assertAlmostEqual(freqs[np.argmax(amp_df['Y'])], 20, places=6)
         self.assertAlmostEqual(freqs[np.argmax(amp_df['Z'])], 30, places=6)
 
+    def test_compute_fft_arbitrary_length(self):
+        t = np.arange(1000) * 0.01
+        df = pd.DataFrame({'X': 2 * np.sin(2*np.pi*5*t), 'Time': t})
+        freqs, amp_df, _ = compute_fft(df, 0.0, 1000)
+        self.assertEqual(amp_df.columns.tolist(), ['X'])
+        self.assertEqual(len(freqs), 501)
+        self.assertAlmostEqual(amp_df['X'].max(), 2, places=6)
+        self.assertAlmostEqual(amp_df.attrs['resolution'], 0.1)
+
+        freqs, amp_df, _ = compute_fft(df, 9.0, 997, pad=True)
+        self.assertEqual(amp_df.attrs['n_samples'], 997)
+        self.assertGreaterEqual(amp_df.attrs['n_fft'], 997)
+        self.assertAlmostEqual(amp_df.attrs['start_sec'], 0.03)
+        self.assertEqual(len(freqs), amp_df.attrs['n_fft'] // 2 + 1)
+        self.assertAlmostEqual(freqs[np.argmax(amp_df['X'])], 5, delta=amp_df.attrs['bin_spacing'])
+
+    def test_compute_zoom_fft(self):
+        fs = 1000
+        t = np.arange(100000) / fs
+        df = pd.DataFrame({'X': 2 * np.sin(2*np.pi*50.013*t), 'Time': t})
+        freqs, amp_df, _ = compute_zoom_fft(df, 0.0, 100000, 45, 55, resolution=0.001, window='Hann')
+        self.assertEqual(len(freqs), 10001)
+        self.assertAlmostEqual(amp_df.attrs['bin_spacing'], 0.001)
+        self.assertAlmostEqual(freqs[np.argmax(amp_df['X'])], 50.013, places=6)
+        freqs, amp_df, _ = compute_zoom_fft(df, 0.0, 100000, 45, 55, resolution=0.001, window='Flat-top')
+        self.assertAlmostEqual(amp_df['X'].max(), 2, delta=0.005)
+
+        # 全帯域を通常の分解能で計算すると compute_fft と一致する
+        freqs, amp_df, _ = compute_zoom_fft(df.iloc[:2000], 0.0, 2000, 0, 500)
+        expected_freqs, expected, _ = compute_fft(df.iloc[:2000], 0.0, 2000)
+        np.testing.assert_allclose(freqs, expected_freqs)
+        np.testing.assert_allclose(amp_df['X'], expected['X'], atol=1e-9)
+
+        # 出力点数が上限を超える刻みは計算せずにエラーにする
+        with self.assertRaises(ValueError):
+            compute_zoom_fft(df, 0.0, 100000, 0, 500, resolution=1e-6)
+        freqs, amp_df, _ = compute_zoom_fft(df, 0.0, 100000, 600, 700)
+        self.assertEqual(len(freqs), 0)
+
+    def test_rotate_spectra_matches_rotated_fft(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(2000) * 0.001
+        raw = pd.DataFrame({'X_raw': rng.standard_normal(2000), 'Y_raw': np.sin(2*np.pi*50*t), 'Time': t})
+        freqs, spectra, _, _ = compute_fft_spectra(raw, 0.0, 1000)
+        _, _, stft_spectra, _ = compute_stft_spectra(raw, 128, hop=64, window='hann')
+        for angle in [0, 30, -135]:
+            xy = rotate_xy(raw, 'X_raw', 'Y_raw', angle)
+            rotated = pd.DataFrame({'X': xy['x_rot'], 'Y': xy['y_rot'], 'Time': t})
+            _, expected, _ = compute_fft(rotated, 0.0, 1000)
+            amplitudes = rotate_spectra(spectra, angle)
+            self.assertEqual(list(amplitudes), ['X', 'Y'])
+            np.testing.assert_allclose(amplitudes['X'], expected['X'], atol=1e-12)
+            np.testing.assert_allclose(amplitudes['Y'], expected['Y'], atol=1e-12)
+            _, _, expected_stft, _ = compute_stft(rotated, 128, hop=64, window='hann')
+            amplitudes = rotate_spectra(stft_spectra, angle)
+            np.testing.assert_allclose(amplitudes['Y'], expected_stft['Y'], atol=1e-12)
+
     def test_compute_fft_segments_shape(self):
         t = np.linspace(0, 1, 128, endpoint=False)
         df = pd.DataFrame({'X': np.sin(2*np.pi*10*t), 'Time': t})
@@ -27,5 +88,125 @@ class TestFFT(unittest.TestCase):
         self.assertEqual(spec_dict['X'].shape, (17, 4))
         self.assertAlmostEqual(times[-1], 0.75, places=6)
 
+    def test_compute_fft_segments_matches_loop(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(1000) * 0.001
+        df = pd.DataFrame({'X': rng.standard_normal(1000), 'Y': np.sin(2*np.pi*50*t), 'Time': t})
+        freqs, times, spec_dict, _ = compute_fft_segments(df, 64)
+        self.assertEqual(sorted(spec_dict), ['X', 'Y'])
+        self.assertEqual(spec_dict['X'].shape, (33, 15))
+        for col in ['X', 'Y']:
+            for i in range(len(times)):
+                amplitude = np.abs(np.fft.rfft(df[col].values[i*64:(i+1)*64])) * 2 / 64
+                amplitude[0] /= 2
+                amplitude[-1] /= 2
+                np.testing.assert_allclose(spec_dict[col][:, i], amplitude, atol=1e-12)
+
+    def test_workers_give_same_result(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({f'CH{i}': rng.standard_normal(4096) for i in range(12)})
+        _, _, single, _ = compute_fft_segments(df, 256)
+        _, _, threaded, _ = compute_fft_segments(df, 256, workers=4)
+        for col in df.columns:
+            np.testing.assert_allclose(threaded[col], single[col])
+
+    def test_compute_fft_batches_channels(self):
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({f'CH{i}': rng.standard_normal(1000) for i in range(5)})
+        df['CH1'] = df['CH1'].astype(np.float32)
+        df['CH4'] = np.arange(1000)
+        # 列のまとまりを小さくして複数回に分けて変換させる
+        with mock.patch.object(data_processing, 'FFT_BLOCK_SAMPLES', 2000):
+            _, amp_df, _ = compute_fft(df, 0.0, 999, workers=4)
+        for col in df.columns:
+            expected = np.abs(np.fft.rfft(df[col].to_numpy(dtype=float)[:999])) * 2 / 999
+            expected[0] /= 2
+            np.testing.assert_allclose(amp_df[col], expected, rtol=1e-4, atol=1e-4)
+        _, spectra, _, _ = compute_fft_spectra(df[['CH1']], 0.0, 999)
+        self.assertEqual(spectra['CH1'].dtype, np.complex64)
+
+    def test_compute_stft_amplitude_correction(self):
+        fs = 1000
+        t = np.arange(4096) / fs
+        df = pd.DataFrame({'X': 3 * np.sin(2*np.pi*125*t), 'Time': t})
+        freqs, times, spec_dict, _ = compute_stft(df, 256, hop=64, window='Flat-top')
+        self.assertEqual(spec_dict['X'].shape, (129, 61))
+        self.assertAlmostEqual(times[1], 0.064, places=6)
+        self.assertAlmostEqual(freqs[np.argmax(spec_dict['X'][:, 0])], 125, places=6)
+        np.testing.assert_allclose(spec_dict['X'].max(axis=0), 3, rtol=1e-3)
+
+    def test_compute_welch_psd_matches_scipy(self):
+        from scipy import signal
+        rng = np.random.default_rng(0)
+        t = np.arange(5000) * 0.001
+        df = pd.DataFrame({'X': rng.standard_normal(5000), 'Time': t})
+        freqs, psd_df, _ = compute_welch_psd(df, 256, hop=32, window='Hann')
+        expected_freqs, expected = signal.welch(df['X'].values, fs=1000, window='hann', nperseg=256, noverlap=224, detrend=False)
+        np.testing.assert_allclose(freqs, expected_freqs)
+        np.testing.assert_allclose(psd_df['X'], expected)
+
+    def test_cached_spectrum(self):
+        t = np.arange(512) * 0.01
+        df = pd.DataFrame({'X': np.sin(2*np.pi*5*t), 'Time': t})
+        spectrum_cache.clear()
+        hits = spectrum_cache.hits
+        first = cached_spectrum(compute_fft, df, 0.0, 256)
+        second = cached_spectrum(compute_fft, df.copy(), 0.0, 256)
+        self.assertIs(first, second)
+        self.assertEqual(spectrum_cache.hits, hits + 1)
+        other = cached_spectrum(compute_fft, df, 1.0, 256)
+        self.assertIsNot(first, other)
+        self.assertEqual(len(spectrum_cache), 2)
+
+    def test_compute_spectrogram_chunked(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(10000) * 0.001
+        df = pd.DataFrame({'X': rng.standard_normal(10000), 'Y': np.sin(2*np.pi*50*t), 'Time': t})
+        chunks = (df.iloc[i:i + 777] for i in range(0, len(df), 777))
+        with tempfile.TemporaryDirectory() as out_dir:
+            freqs, times, spec_dict, interval = compute_spectrogram_chunked(chunks, 128, out_dir, hop=48, window='hann')
+            expected = compute_stft(df, 128, hop=48, window='hann')
+            self.assertAlmostEqual(interval, 0.001)
+            np.testing.assert_allclose(times, expected[1])
+            for col in ['X', 'Y']:
+                self.assertIsInstance(spec_dict[col].base, np.memmap)
+                np.testing.assert_allclose(spec_dict[col], expected[2][col], rtol=1e-5, atol=1e-6)
+            # 書き出し済みの結果は入力を読まずに開き直す
+            reopened = compute_spectrogram_chunked(iter(()), 128, out_dir)
+            np.testing.assert_array_equal(reopened[2]['X'], spec_dict['X'])
+            del spec_dict, reopened
+
+    def test_spectrogram_chunked_hop_longer_than_segment(self):
+        rng = np.random.default_rng(1)
+        t = np.arange(5000) * 0.001
+        df = pd.DataFrame({'X': rng.standard_normal(5000), 'Time': t})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 区間の間を飛ばすサンプルがチャンクの境界やチャンク全体にまたがる場合
+            for chunk_rows, segment_size, hop in [(700, 256, 400), (300, 128, 1000)]:
+                chunks = (df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows))
+                out_dir = os.path.join(tmp_dir, f'{chunk_rows}_{hop}')
+                _, times, spec_dict, _ = compute_spectrogram_chunked(chunks, segment_size, out_dir, hop=hop, window='hann')
+                expected = compute_stft(df, segment_size, hop=hop)
+                np.testing.assert_allclose(times, expected[1])
+                np.testing.assert_allclose(spec_dict['X'], expected[2]['X'], rtol=1e-5, atol=1e-6)
+                del spec_dict
+
+    def test_interrupted_spectrogram_leaves_nothing(self):
+        df = pd.DataFrame({'X': np.zeros(1000), 'Time': np.arange(1000) * 0.001})
+
+        def chunks():
+            yield df.iloc[:500]
+            raise KeyboardInterrupt
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            out_dir = os.path.join(cache_dir, 'key')
+            with self.assertRaises(KeyboardInterrupt):
+                compute_spectrogram_chunked(chunks(), 128, out_dir)
+            self.assertEqual(os.listdir(cache_dir), [])
+            freqs, times, spec_dict, _ = compute_spectrogram_chunked(iter([df]), 128, out_dir)
+            self.assertEqual(len(times), 7)
+            self.assertEqual(os.listdir(cache_dir), ['key'])
+            del spec_dict
+
 if __name__ == '__main__':
     unittest.main()
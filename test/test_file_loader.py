@@ -0,0 +1,177 @@
+import unittest
+import io
+import os
+import sys
+import tempfile
+import gc
+import warnings
+import numpy as np
+import pandas as pd
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.file_loader import load_csv_with_dynamic_start, open_csv_chunks, detect_encoding, load_csv_from_path, list_data_files, CsvTailFollower
+from modules.data_processing import calc_channel_stats_chunked, compact_dtypes
+from modules import file_loader
+
+def make_graphtec_csv(n_rows, n_channels=3):
+    lines = [
+        "Model,GL840",
+        "測定間隔,0.5s",
+        "測定値",
+        "番号,日付 時間,ms," + ",".join(f"CH{i + 1}" for i in range(n_channels)) + ",Alarm1-10,AlarmOut",
+        "NO.,Time,ms," + ",".join("degC" for _ in range(n_channels)) + ",A1-10,A-O",
+    ]
+    for i in range(n_rows):
+        values = ",".join(f"{i + c * 0.5:+.2f}" for c in range(n_channels))
+        lines.append(f"{i + 1},2024/01/01 00:00:00,0,{values},LLLLLLLLLL,L")
+    return ("\r\n".join(lines) + "\r\n").encode('cp932')
+
+def make_nr600_csv(n_rows):
+    lines = ["#BeginHeader", "機種,NR-600", "#EndHeader,日時(μs),CH1,CH2"]
+    for i in range(n_rows):
+        lines.append(f"{i},{i * 1000},{i * 0.1:.3f},{-i * 0.1:.3f}")
+    lines += ["#BeginMark", "1,marker"]
+    return ("\r\n".join(lines) + "\r\n").encode('utf-8')
+
+class TestFileLoader(unittest.TestCase):
+    def test_graphtec(self):
+        df, interval, data_type = load_csv_with_dynamic_start(io.BytesIO(make_graphtec_csv(10)))
+        self.assertEqual(data_type, 'GRAPHTEC')
+        self.assertEqual(interval, 0.5)
+        self.assertEqual(len(df), 10)
+        self.assertEqual(df.columns.to_list()[3:6], ['CH1', 'CH2', 'CH3'])
+        self.assertEqual(df['CH2'].dtype, np.float64)
+        self.assertAlmostEqual(df['CH2'].iloc[3], 3.5)
+        self.assertAlmostEqual(df['経過時間(sec)'].iloc[-1], 4.5)
+
+    def test_nr600_stops_at_begin_mark(self):
+        df, interval, data_type = load_csv_with_dynamic_start(io.BytesIO(make_nr600_csv(5)))
+        self.assertEqual(data_type, 'NR600')
+        self.assertAlmostEqual(interval, 0.001)
+        self.assertEqual(df.columns.to_list(), ['time(sec)', 'CH1', 'CH2'])
+        self.assertEqual(len(df), 5)
+        self.assertAlmostEqual(df['time(sec)'].iloc[-1], 0.004)
+
+    def test_chunks_match_full_parse(self):
+        for raw in [make_graphtec_csv(50), make_nr600_csv(50)]:
+            df, interval, data_type = load_csv_with_dynamic_start(io.BytesIO(raw))
+            chunks, chunk_interval, chunk_type = open_csv_chunks(io.BytesIO(raw), chunk_rows=7)
+            chunk_list = list(chunks)
+            self.assertEqual(len(chunk_list), 8)
+            self.assertEqual((chunk_interval, chunk_type), (interval, data_type))
+            pd.testing.assert_frame_equal(pd.concat(chunk_list), df)
+
+    def test_chunks_from_path_close_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'run.csv')
+            with open(path, 'wb') as f:
+                f.write(make_graphtec_csv(20))
+            bad_path = os.path.join(tmp_dir, 'other.csv')
+            with open(bad_path, 'w', encoding='utf-8') as f:
+                f.write("a,b\n1,2\n")
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always', ResourceWarning)
+                with self.assertRaises(ValueError):
+                    open_csv_chunks(bad_path)
+                chunks, _, _ = open_csv_chunks(path, chunk_rows=7)
+                del chunks
+                chunks, _, _ = open_csv_chunks(path, chunk_rows=7)
+                self.assertEqual(sum(len(chunk) for chunk in chunks), 20)
+                gc.collect()
+            self.assertEqual([w for w in caught if issubclass(w.category, ResourceWarning)], [])
+
+    def test_chunked_stats(self):
+        raw = make_graphtec_csv(100)
+        df, _, _ = load_csv_with_dynamic_start(io.BytesIO(raw))
+        chunks, _, _ = open_csv_chunks(io.BytesIO(raw), chunk_rows=16, usecols=['CH1', 'CH3'])
+        stats = calc_channel_stats_chunked(chunks, ['CH1', 'CH3'])
+        self.assertAlmostEqual(stats.at['CH1', 'mean'], df['CH1'].mean())
+        self.assertAlmostEqual(stats.at['CH3', 'std'], df['CH3'].std(ddof=0))
+        self.assertAlmostEqual(stats.at['CH3', 'p2p'], df['CH3'].max() - df['CH3'].min())
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding(make_graphtec_csv(10)), 'cp932')
+        self.assertEqual(detect_encoding(make_nr600_csv(10)), 'utf-8')
+        self.assertEqual(detect_encoding(b'\xef\xbb\xbfa,b\n1,2\n'), 'utf-8-sig')
+        # 先頭サンプルがASCIIのみでも、後半の日本語で判定する
+        raw = b'a,b\n' * 100 + 'コメント,終了\n'.encode('cp932')
+        self.assertEqual(detect_encoding(raw, sample_size=64), 'cp932')
+        self.assertEqual(detect_encoding(io.BytesIO(raw), sample_size=64), 'cp932')
+
+    def test_load_from_path_with_mmap(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, raw in [('run1.csv', make_graphtec_csv(20)), ('run2.csv', make_nr600_csv(20))]:
+                with open(os.path.join(tmp_dir, name), 'wb') as f:
+                    f.write(raw)
+            with open(os.path.join(tmp_dir, 'memo.txt'), 'w') as f:
+                f.write('memo')
+            self.assertEqual(list_data_files(tmp_dir), ['run1.csv', 'run2.csv'])
+
+            df, interval, data_type = load_csv_from_path(os.path.join(tmp_dir, 'run1.csv'))
+            expected, _, _ = load_csv_with_dynamic_start(io.BytesIO(make_graphtec_csv(20)))
+            self.assertEqual((interval, data_type), (0.5, 'GRAPHTEC'))
+            pd.testing.assert_frame_equal(df, expected)
+
+    def test_tail_follower_reads_appended_rows(self):
+        for raw in [make_graphtec_csv(300), make_nr600_csv(300)]:
+            expected, interval, data_type = load_csv_with_dynamic_start(io.BytesIO(raw))
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'live.csv')
+                open(path, 'wb').close()
+                follower = CsvTailFollower(path)
+                total = 0
+                # 行の途中で区切りながら追記する
+                for start in range(0, len(raw), 997):
+                    with open(path, 'ab') as f:
+                        f.write(raw[start:start + 997])
+                    total += follower.poll()
+                self.assertEqual(total, 300)
+                self.assertEqual(follower.poll(), 0)
+            self.assertEqual((follower.measurement_interval, follower.data_type), (interval, data_type))
+            self.assertEqual(follower.finished, data_type == 'NR600')
+            pd.testing.assert_frame_equal(follower.frame(), expected)
+
+    def test_tail_follower_reads_existing_file_in_blocks(self):
+        raw = make_graphtec_csv(300)
+        expected = load_csv_with_dynamic_start(io.BytesIO(raw))[0]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'live.csv')
+            with open(path, 'wb') as f:
+                f.write(raw)
+            # 1行より小さいブロックでも読み進められる
+            with mock.patch.object(file_loader, 'TAIL_READ_BYTES', 16):
+                follower = CsvTailFollower(path)
+                self.assertEqual(follower.poll(), 300)
+            pd.testing.assert_frame_equal(follower.frame(), expected)
+
+    def test_tail_follower_finishes_at_early_trailer(self):
+        for n_rows in [0, 1]:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'live.csv')
+                with open(path, 'wb') as f:
+                    f.write(make_nr600_csv(n_rows))
+                follower = CsvTailFollower(path)
+                self.assertEqual(follower.poll(), n_rows)
+                self.assertTrue(follower.finished)
+                self.assertEqual(follower.poll(), 0)
+                self.assertEqual(len(follower.frame()), n_rows)
+
+    def test_tail_follower_compact(self):
+        for raw in [make_graphtec_csv(300), make_nr600_csv(300)]:
+            expected = compact_dtypes(load_csv_with_dynamic_start(io.BytesIO(raw))[0])
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'live.csv')
+                open(path, 'wb').close()
+                follower = CsvTailFollower(path, compact=True)
+                for start in range(0, len(raw), 2003):
+                    with open(path, 'ab') as f:
+                        f.write(raw[start:start + 2003])
+                    follower.poll()
+                pd.testing.assert_frame_equal(follower.frame(), expected, check_categorical=False)
+        self.assertEqual(expected['CH2'].dtype, np.float32)
+        self.assertEqual(expected['time(sec)'].dtype, np.float64)
+
+if __name__ == '__main__':
+    unittest.main()
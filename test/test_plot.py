@@ -0,0 +1,36 @@
+import unittest
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.cache import frame_fingerprint
+from modules.plot import figure_cache, cached_figure, settings_digest, figure_html, create_fft_plot
+
+class TestFigureCache(unittest.TestCase):
+    def test_settings_digest(self):
+        self.assertEqual(settings_digest({'a': 1, 'b': [1, 2]}), settings_digest({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(settings_digest({'a': 1}), settings_digest({'a': 2}))
+    def test_cached_figure(self):
+        df = pd.DataFrame({'x': np.arange(100), 'y': np.sin(np.arange(100) * 0.1)})
+        calls = []
+        def build():
+            calls.append(1)
+            return create_fft_plot(df['x'].to_numpy(), df[['y']], title=f"build {len(calls)}"), "caption"
+        before = figure_cache.stats()
+        first = cached_figure("test", frame_fingerprint(df), {'title': 'a'}, build)
+        second = cached_figure("test", frame_fingerprint(df.copy()), {'title': 'a'}, build)
+        self.assertIs(first, second)
+        self.assertEqual(first.caption, "caption")
+        self.assertEqual(len(calls), 1)
+        cached_figure("test", frame_fingerprint(df), {'title': 'b'}, build)
+        self.assertEqual(len(calls), 2)
+        after = figure_cache.stats()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(figure_html(first.figure), first.html)
+        self.assertIn(b'build 1', first.html)
+
+if __name__ == '__main__':
+    unittest.main()